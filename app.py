@@ -2,17 +2,55 @@
 import os
 import re
 import json
+import io
+import threading
+import time
+import zipfile
 from datetime import datetime
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, Iterator, List, Tuple, Optional
 
 import pandas as pd
-import requests
 import streamlit as st
 
+from assignment_index import AssignmentIndex
+from auto_marker import PROVISIONAL_COLLECTION, AutoMarker
+from cache_backends import CacheBackend, SharedCache, make_backend
+from essay_similarity import rank_essays
+from gradebook import FORMATS as GRADEBOOK_FORMATS, export_gradebook
+from near_duplicates import NearDuplicateIndex
+from perf_utils import memory_report, record_timing, timed, timing_report
+from prefetch import Prefetcher
+from reconcile import csv_chunks
+from reference_store import Reference, ReferenceStore
+from regrade import key_hash, regrade, save_keys
+from report_cards import build_report_cards, render_report_cards
+from save_index import SaveIndex
+from sheets_utils import fetch_sheet_csv, frame_memory_report, parse_sheet_csv
+from snapshot_utils import SnapshotStore
+from submission_search import SubmissionIndex
+from text_fold import canonical_answer
+from webhook_utils import CircuitOpenError, WebhookBusyError, WebhookClient
+
 # ---------------- Firebase ----------------
-from firebase_utils import get_firestore_client, save_row_to_firestore
+from firebase_utils import (
+    firestore_health,
+    firestore_stats,
+    get_firestore_client,
+    save_row_to_firestore,
+    warmup_firestore,
+)
+
 
-db = get_firestore_client()
+@st.cache_resource(show_spinner=False)
+def firestore_resource():
+    """One Firestore client (and gRPC channel pool) per process, warmed up at boot."""
+    client = get_firestore_client()
+    if client is not None:
+        warmup_firestore()
+    return client
+
+
+db = firestore_resource()
 
 # ---------------- IDs / Config ----------------
 # Students Google Sheet (tab now "Sheet1" unless you override in secrets)
@@ -21,12 +59,55 @@ STUDENTS_SHEET_TAB  = st.secrets.get("STUDENTS_SHEET_TAB", "Sheet1")
 SCORES_SHEET_ID     = st.secrets.get("SCORES_SHEET_ID")
 SCORES_SHEET_TAB    = st.secrets.get("SCORES_SHEET_TAB", "Scores")
 
+# Columns the dashboard actually reads from each sheet
+STUDENT_COLUMNS = ("studentcode", "name", "level", "email", "status")
+SCORES_COLUMNS  = ("studentcode", "name", "assignment", "score", "comments", "date", "level")
+
 # Apps Script webhook (fallbacks included)
 WEBHOOK_URL   = st.secrets.get(
     "G_SHEETS_WEBHOOK_URL",
     "https://script.google.com/macros/s/AKfycbzKWo9IblWZEgD_d7sku6cGzKofis_XQj3NXGMYpf_uRqu9rGe4AvOcB15E3bb2e6O4/exec",
 )
 WEBHOOK_TOKEN = st.secrets.get("G_SHEETS_WEBHOOK_TOKEN", "Xenomexpress7727/")
+# Client-side limits that keep us inside the Apps Script quotas
+WEBHOOK_RATE_PER_MIN    = int(st.secrets.get("WEBHOOK_RATE_PER_MIN", 90))
+WEBHOOK_MAX_CONCURRENCY = int(st.secrets.get("WEBHOOK_MAX_CONCURRENCY", 8))
+WEBHOOK_MAX_WAIT        = float(st.secrets.get("WEBHOOK_MAX_WAIT", 20))  # seconds a save may wait to be sent
+
+# Cache shared between replicas: "memory", "sqlite", "memcache" or "memcache-local"
+CACHE_BACKEND         = st.secrets.get("CACHE_BACKEND", os.environ.get("CACHE_BACKEND", "memory"))
+CACHE_SQLITE_PATH     = st.secrets.get("CACHE_SQLITE_PATH", ".cache/shared.sqlite")
+CACHE_MEMCACHE_SERVER = st.secrets.get("CACHE_MEMCACHE_SERVER", "")
+SHEETS_TTL      = 300
+SUBMISSIONS_TTL = 60
+
+# Sheet snapshots served while Google is re-checked in the background
+SNAPSHOT_DIR = ".cache/sheets"
+
+# Rows already saved, so re-saving an unchanged mark costs no write
+SAVE_INDEX_PATH = ".cache/saved_rows.sqlite"
+
+# Background auto-marking of new objective posts (seconds between posts)
+# Off by default: turn it on for exactly one replica, or every replica marks every post
+AUTO_MARK          = str(st.secrets.get("AUTO_MARK", "off")).strip().lower() in ("1", "on", "true", "yes")
+AUTO_MARK_INTERVAL = float(st.secrets.get("AUTO_MARK_INTERVAL", 0.5))
+
+# Marking queue: how many upcoming students are loaded in the background
+QUEUE_PREFETCH = int(st.secrets.get("QUEUE_PREFETCH", 3))
+
+# Report cards: rendered into this folder on a pool of worker processes
+REPORTS_DIR     = ".cache/reports"
+REPORT_WORKERS  = int(st.secrets.get("REPORT_WORKERS", 0)) or None  # None = one per CPU
+SCORES_BACKUP_CSV = "scores_backup.csv"
+
+# Gradebook exports are written here, then offered for download
+EXPORTS_DIR = ".cache/exports"
+
+# Full-text index of every submission, kept up to date by a listener
+SEARCH_INDEX_PATH = ".cache/search.sqlite"
+
+# Student picker shows at most this many matches per page
+PICKER_PAGE_SIZE = 200
 
 # Answers dictionary JSON paths (first existing will be used)
 ANSWERS_JSON_PATHS = [
@@ -64,21 +145,66 @@ def natural_key(s: str):
     return [int(t) if t.isdigit() else t.lower() for t in re.findall(r"\d+|\D+", str(s))]
 
 
-@st.cache_data(show_spinner=False, ttl=300)
-def load_sheet_csv(sheet_id: str, tab: str) -> pd.DataFrame:
-    """Load a specific Google Sheet tab as CSV (no auth)."""
-    url = (
-        f"https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq"
-        f"?tqx=out:csv&sheet={requests.utils.quote(tab)}"
-        "&tq=select%20*%20limit%20100000"
-    )
-    df = pd.read_csv(url, dtype=str)
-    df.columns = df.columns.str.strip().str.lower()
-    return df
+@st.cache_resource(show_spinner=False)
+def shared_cache_backend() -> CacheBackend:
+    """Backend shared by every session (and, unless "memory", every replica)."""
+    return make_backend(CACHE_BACKEND, CACHE_SQLITE_PATH, CACHE_MEMCACHE_SERVER)
 
 
-@st.cache_data(show_spinner=False)
-def load_answers_dictionary() -> Dict[str, Any]:
+def shared_cache(namespace: str) -> SharedCache:
+    return SharedCache(shared_cache_backend(), namespace)
+
+
+@st.cache_resource(show_spinner=False)
+def sheet_snapshots() -> SnapshotStore:
+    """Process-wide on-disk snapshots of the sheets behind :func:`load_sheet_csv`."""
+    return SnapshotStore(SNAPSHOT_DIR, max_age=SHEETS_TTL, on_change=sheet_changed)
+
+
+def sheet_changed(key: str) -> None:
+    """Drop the parsed frames derived from an older download of a sheet."""
+    load_sheet_csv.clear()
+    load_scores.clear()
+
+
+@st.cache_data(show_spinner=False, ttl=SHEETS_TTL)
+def load_sheet_csv(sheet_id: str, tab: str, columns: Optional[Tuple[str, ...]] = None) -> pd.DataFrame:
+    """Load a specific Google Sheet tab as CSV (no auth).
+
+    ``columns`` limits the download to the named columns; the projection
+    happens in the gviz query so unused columns never leave Google.  The
+    last download is served from an on-disk snapshot and refreshed in the
+    background, so only the very first load waits on Google.  Every
+    download is shared through the shared cache, and a replica without a
+    snapshot starts from it instead of hitting Google; revalidations always
+    download afresh.
+    """
+    key = sheet_key(sheet_id, tab, columns)
+    downloads = shared_cache("sheets")
+
+    def fetch() -> bytes:
+        raw = fetch_sheet_csv(sheet_id, tab, columns)
+        downloads.set(key, raw, ttl=SHEETS_TTL)
+        return raw
+
+    return sheet_snapshots().load(key, fetch=fetch, parse=parse_sheet_csv, cached=lambda: downloads.get(key))
+
+
+def sheet_key(sheet_id: str, tab: str, columns: Optional[Tuple[str, ...]] = None) -> str:
+    """Key of a sheet download in the shared cache and the snapshot store."""
+    return f"{sheet_id}/{tab}/{','.join(columns or ())}"
+
+
+def forget_scores_sheet() -> None:
+    """Drop every cached copy of the Scores sheet after a save changed it."""
+    load_scores.clear()
+    if SCORES_SHEET_ID:
+        key = sheet_key(SCORES_SHEET_ID, SCORES_SHEET_TAB, SCORES_COLUMNS)
+        shared_cache("sheets").delete(key)
+        sheet_snapshots().invalidate(key)
+
+
+def read_answers_dictionary() -> Dict[str, Any]:
     for p in ANSWERS_JSON_PATHS:
         if os.path.exists(p):
             with open(p, "r", encoding="utf-8") as f:
@@ -86,6 +212,59 @@ def load_answers_dictionary() -> Dict[str, Any]:
     return {}
 
 
+def answers_dictionary_version() -> str:
+    """Path, mtime and size of the answers dictionary in use, so an edit makes new cache keys."""
+    for p in ANSWERS_JSON_PATHS:
+        if os.path.exists(p):
+            stat = os.stat(p)
+            return f"{p}:{stat.st_mtime_ns}:{stat.st_size}"
+    return ""
+
+
+def cached_answers_dictionary(answers: SharedCache) -> Dict[str, Any]:
+    """The answers dictionary through the shared cache, read again as soon as the file changes."""
+    return answers.get_or_load(
+        f"answers_dictionary:{answers_dictionary_version()}", read_answers_dictionary, ttl=SHEETS_TTL
+    )
+
+
+@st.cache_data(show_spinner=False, ttl=SHEETS_TTL)
+def _load_answers_dictionary(version: str) -> Dict[str, Any]:
+    return cached_answers_dictionary(shared_cache("answers"))
+
+
+def load_answers_dictionary() -> Dict[str, Any]:
+    return _load_answers_dictionary(answers_dictionary_version())
+
+
+@st.cache_data(show_spinner=False, ttl=SHEETS_TTL)
+def load_scores() -> pd.DataFrame:
+    """Saved scores: the Scores sheet when configured, else the local backup CSV."""
+    if SCORES_SHEET_ID:
+        return load_sheet_csv(SCORES_SHEET_ID, SCORES_SHEET_TAB, SCORES_COLUMNS)
+    if os.path.exists(SCORES_BACKUP_CSV):
+        with open(SCORES_BACKUP_CSV, "rb") as f:
+            return parse_sheet_csv(f.read())
+    return pd.DataFrame(columns=list(SCORES_COLUMNS))
+
+
+def score_chunks(chunk_size: int = 20000) -> Iterator[pd.DataFrame]:
+    """Saved scores streamed in chunks, from the same sources as :func:`load_scores`.
+
+    The sheet download goes through the shared cache under the same key
+    as :func:`load_sheet_csv`, so it is not fetched twice.
+    """
+    if SCORES_SHEET_ID:
+        key = sheet_key(SCORES_SHEET_ID, SCORES_SHEET_TAB, SCORES_COLUMNS)
+        raw = shared_cache("sheets").get_or_load(
+            key, lambda: fetch_sheet_csv(SCORES_SHEET_ID, SCORES_SHEET_TAB, SCORES_COLUMNS), ttl=SHEETS_TTL
+        )
+        return csv_chunks(raw, chunk_size)
+    if os.path.exists(SCORES_BACKUP_CSV):
+        return csv_chunks(SCORES_BACKUP_CSV, chunk_size)
+    return iter(())
+
+
 def find_col(df: pd.DataFrame, candidates: List[str], default: str = "") -> str:
     norm = {c: c.lower().strip().replace(" ", "").replace("_", "") for c in df.columns}
     want = [c.lower().strip().replace(" ", "").replace("_", "") for c in candidates]
@@ -102,6 +281,24 @@ def list_json_assignments(ans_dict: Dict[str, Any]) -> List[str]:
     return sorted(list(ans_dict.keys()), key=natural_key)
 
 
+@st.cache_resource(show_spinner=False)
+def reference_store() -> ReferenceStore:
+    """References built once per process and shared by every session."""
+    return ReferenceStore(build_reference_text_from_json)
+
+
+def chosen_reference() -> Reference:
+    """The shared reference for this session's ``ref_assignment``."""
+    key = st.session_state.get("ref_assignment", "")
+    return reference_store().get(key, load_answers_dictionary().get(key))
+
+
+@st.cache_resource(show_spinner=False)
+def assignment_index(keys: Tuple[str, ...]) -> AssignmentIndex:
+    """Name index over the answers dictionary keys, rebuilt only when they change."""
+    return AssignmentIndex(keys)
+
+
 def build_reference_text_from_json(
     row_obj: Dict[str, Any]
 ) -> Tuple[str, str, str, Dict[int, str]]:
@@ -156,6 +353,22 @@ def filter_any(df: pd.DataFrame, q: str) -> pd.DataFrame:
     return df[mask.any(axis=1)]
 
 
+def build_student_labels(df: pd.DataFrame, code_col: str, name_col: str, level_col: str) -> pd.Series:
+    """Return picker labels indexed like ``df``, built with vectorised string ops."""
+    def col(c: str) -> pd.Series:
+        if c not in df.columns:
+            return pd.Series("", index=df.index, dtype="string")
+        return df[c].astype("string").fillna("")
+
+    return col(code_col) + " — " + col(name_col) + " (" + col(level_col) + ")"
+
+
+def picker_page(labels: pd.Series, page: int, page_size: int = PICKER_PAGE_SIZE) -> Dict[Any, str]:
+    """Return ``{row id: label}`` for one page of ``labels`` (pages start at 1)."""
+    start = (max(int(page), 1) - 1) * page_size
+    return labels.iloc[start:start + page_size].to_dict()
+
+
 def extract_text_from_doc(doc: Dict[str, Any]) -> str:
     preferred = ["content", "text", "answer", "body", "draft", "message"]
     for k in preferred:
@@ -182,78 +395,100 @@ def extract_text_from_doc(doc: Dict[str, Any]) -> str:
     return "\n".join(strings).strip()
 
 
-def fetch_submissions(level: str, student_code: str) -> List[Dict[str, Any]]:
+def submission_ts_ms(doc: Dict[str, Any]) -> int:
+    """Best-effort extraction of timestamp in milliseconds."""
+    ts: Optional[Any] = doc.get("timestamp")
+    try:
+        if isinstance(ts, (int, float)):
+            return int(ts if ts > 10_000_000_000 else ts * 1000)
+        if isinstance(ts, datetime):
+            return int(ts.timestamp() * 1000)
+        if hasattr(ts, "to_datetime") and callable(ts.to_datetime):
+            return int(ts.to_datetime().timestamp() * 1000)
+        if hasattr(ts, "seconds") and hasattr(ts, "nanoseconds"):
+            return int(int(ts.seconds) * 1000 + int(ts.nanoseconds) / 1_000_000)
+        if hasattr(ts, "timestamp") and callable(ts.timestamp):
+            return int(ts.timestamp() * 1000)
+        if isinstance(ts, dict):
+            if "_seconds" in ts:
+                seconds = int(ts.get("_seconds", 0))
+                nanos = int(ts.get("_nanoseconds", 0))
+                return int(seconds * 1000 + nanos / 1_000_000)
+            for key in ("iso", "time", "date", "datetime"):
+                if key in ts and isinstance(ts[key], str):
+                    try:
+                        return int(datetime.fromisoformat(ts[key]).timestamp() * 1000)
+                    except Exception:
+                        pass
+        if isinstance(ts, str):
+            try:
+                return int(datetime.fromisoformat(ts).timestamp() * 1000)
+            except Exception:
+                pass
+    except Exception:
+        pass
+    return 0
+
+
+def normalize_submission(d: Dict[str, Any], doc_id: str, level: str) -> Dict[str, Any]:
+    """Attach common metadata like path, level, timestamp and details."""
+    d = dict(d)
+
+    def pick(keys: List[str], default: str = "") -> Any:
+        for k in keys:
+            if k in d and d[k] not in (None, ""):
+                return d[k]
+        return default
+
+    d["id"] = doc_id
+    d["student_name"] = pick(["student_name", "name", "student", "studentName"])
+    d["student_code"] = pick(["student_code", "code", "studentcode"])
+    d["chapter"] = pick(["chapter", "chapter_name", "unit"])
+    d["assignment"] = pick(["assignment", "assignment_name", "task", "topic"])
+    d["level"] = pick(["level", "student_level"], level)
+    d["_ts_ms"] = submission_ts_ms(d)
+    d["_path"] = f"submissions/{level}/posts/{doc_id}"
+    return d
+
+
+def fetch_submissions(level: str, student_code: str, strict: bool = False) -> List[Dict[str, Any]]:
+    """A student's posts, newest first.
+
+    A failed read returns what was read so far, or raises with ``strict``
+    (for callers that cache the result).
+    """
     if not db or not level or not student_code:
         return []
     items: List[Dict[str, Any]] = []
 
-    def _ts_ms(doc: Dict[str, Any]) -> int:
-        """Best-effort extraction of timestamp in milliseconds."""
-        ts: Optional[Any] = doc.get("timestamp")
-        try:
-            if isinstance(ts, (int, float)):
-                return int(ts if ts > 10_000_000_000 else ts * 1000)
-            if isinstance(ts, datetime):
-                return int(ts.timestamp() * 1000)
-            if hasattr(ts, "to_datetime") and callable(ts.to_datetime):
-                return int(ts.to_datetime().timestamp() * 1000)
-            if hasattr(ts, "seconds") and hasattr(ts, "nanoseconds"):
-                return int(int(ts.seconds) * 1000 + int(ts.nanoseconds) / 1_000_000)
-            if hasattr(ts, "timestamp") and callable(ts.timestamp):
-                return int(ts.timestamp() * 1000)
-            if isinstance(ts, dict):
-                if "_seconds" in ts:
-                    seconds = int(ts.get("_seconds", 0))
-                    nanos = int(ts.get("_nanoseconds", 0))
-                    return int(seconds * 1000 + nanos / 1_000_000)
-                for key in ("iso", "time", "date", "datetime"):
-                    if key in ts and isinstance(ts[key], str):
-                        try:
-                            return int(datetime.fromisoformat(ts[key]).timestamp() * 1000)
-                        except Exception:
-                            pass
-            if isinstance(ts, str):
-                try:
-                    return int(datetime.fromisoformat(ts).timestamp() * 1000)
-                except Exception:
-                    pass
-        except Exception:
-            pass
-        return 0
-
-    def _normalize_row(d: Dict[str, Any], doc_id: str) -> Dict[str, Any]:
-        """Attach common metadata like path, level, timestamp and details."""
-        d = dict(d)
-
-        def pick(keys: List[str], default: str = "") -> Any:
-            for k in keys:
-                if k in d and d[k] not in (None, ""):
-                    return d[k]
-            return default
-
-        d["id"] = doc_id
-        d["student_name"] = pick(["student_name", "name", "student", "studentName"])
-        d["student_code"] = pick(["student_code", "code", "studentcode"])
-        d["chapter"] = pick(["chapter", "chapter_name", "unit"])
-        d["assignment"] = pick(["assignment", "assignment_name", "task", "topic"])
-        d["level"] = pick(["level", "student_level"], level)
-        d["_ts_ms"] = _ts_ms(d)
-        d["_path"] = f"submissions/{level}/posts/{doc_id}"
-        return d
-
     try:
         lessons_ref = db.collection("submissions").document(level).collection("posts")
         lessons_ref = lessons_ref.where("student_code", "==", student_code)
         for snap in lessons_ref.stream():
             d = snap.to_dict() or {}
-            items.append(_normalize_row(d, snap.id))
+            items.append(normalize_submission(d, snap.id, level))
     except Exception:
-        pass
+        if strict:
+            raise
 
     items.sort(key=lambda d: d.get("_ts_ms", 0), reverse=True)
     return items
 
 
+def fetch_level_submissions(level: str) -> List[Dict[str, Any]]:
+    """Every post under ``submissions/{level}/posts``, newest first."""
+    if not db or not level:
+        return []
+    items: List[Dict[str, Any]] = []
+    try:
+        for snap in db.collection("submissions").document(level).collection("posts").stream():
+            items.append(normalize_submission(snap.to_dict() or {}, snap.id, level))
+    except Exception:
+        pass
+    items.sort(key=lambda d: d.get("_ts_ms", 0), reverse=True)
+    return items
+
+
 # ---------- PRE-NORMALIZER: turn "Teil 3/4" local numbers into global 1..N ----------
 
 def globalize_objective_numbers(student_text: str) -> str:
@@ -312,6 +547,37 @@ def globalize_objective_numbers(student_text: str) -> str:
     return "\n".join(lines)
 
 
+# ---------- NEAR-DUPLICATES: copying checks across a level's posts ----------
+
+MIN_OBJECTIVE_ANSWERS = 5  # shorter answer strings match by chance
+
+
+@st.cache_resource(show_spinner=False)
+def duplicate_index(level: str) -> NearDuplicateIndex:
+    """Process-wide MinHash/LSH index of one level's posts, kept up to date by a listener."""
+    index = NearDuplicateIndex()
+    if db:
+        index.watch(db, level, duplicate_entries)
+    return index
+
+
+def duplicate_entries(level: str, post_id: str, data: Dict[str, Any]) -> List[Tuple[str, str, Tuple[str, str], Dict[str, Any]]]:
+    """``(key, text, group, post)`` to index for one raw post.
+
+    Every post is indexed twice, grouped by assignment: its full text
+    (``"text"``) and its globalized objective answers (``"objective"``,
+    only when there are at least ``MIN_OBJECTIVE_ANSWERS``).
+    """
+    d = normalize_submission(data, post_id, level)
+    assignment = str(d.get("assignment", "")).strip().lower()
+    text = extract_text_from_doc(d)
+    entries = [(f"{d['_path']}#text", text, (assignment, "text"), d)]
+    answers = globalize_objective_numbers(text)
+    if len(answers.splitlines()) >= MIN_OBJECTIVE_ANSWERS:
+        entries.append((f"{d['_path']}#objective", answers, (assignment, "objective"), d))
+    return entries
+
+
 # ===================== AI MARKING (OBJECTIVES ONLY, WITH GLOBALIZATION) =====================
 
 # --- Feedback + scoring utilities to guarantee 40–60 words and correct diffs ---
@@ -320,26 +586,6 @@ def _count_words(s: str) -> int:
     return len(re.findall(r"\b[\wÄÖÜäöüß]+(?:'[A-Za-z]+)?\b", s or ""))
 
 
-def _canonical_token(s: str) -> str:
-    s = (s or "").strip()
-    if not s:
-        return ""
-    if re.fullmatch(r"[a-dA-D]", s):
-        return s.upper()
-    s = (
-        s.lower()
-        .replace("ä", "ae")
-        .replace("ö", "oe")
-        .replace("ü", "ue")
-        .replace("ß", "ss")
-    )
-    if s in {"t", "true", "ja", "j", "y", "yes"}:
-        return "true"
-    if s in {"f", "false", "nein", "n", "no"}:
-        return "false"
-    return re.sub(r"[^\w]+", "", s)
-
-
 def _parse_ref_map(ref_text: str) -> Dict[int, str]:
     m: Dict[int, str] = {}
     for line in (ref_text or "").splitlines():
@@ -372,7 +618,7 @@ def _compute_objective_diffs(student_text: str, ref_text: str) -> Tuple[int, int
     for n in sorted(ref_map.keys()):
         ref_tok = ref_map[n]
         stu_tok_raw = stu_map.get(n, "")
-        if _canonical_token(stu_tok_raw) == _canonical_token(ref_tok):
+        if canonical_answer(stu_tok_raw) == canonical_answer(ref_tok):
             correct += 1
         else:
             wrong.append((n, ref_tok, stu_tok_raw))
@@ -415,32 +661,6 @@ def objective_mark(student_answer: str, ref_answers: Dict[int, str]) -> Tuple[in
     - Accepts synonyms for True/False and Ja/Nein.
     """
 
-    def canonical_word(s: str) -> str:
-        s = (s or "").strip()
-        if not s:
-            return ""
-        # Letter option? Keep A-D uppercase
-        if re.fullmatch(r"[a-dA-D]", s):
-            return s.upper()
-
-        # Lowercase words, normalize umlauts to ASCII
-        s = s.lower()
-        s = (
-            s.replace("ä", "ae")
-            .replace("ö", "oe")
-            .replace("ü", "ue")
-            .replace("ß", "ss")
-        )
-        # Common boolean/YN synonyms
-        if s in {"t", "true", "ja", "j", "y", "yes"}:
-            return "true"
-        if s in {"f", "false", "nein", "n", "no"}:
-            return "false"
-
-        # Remove non-word characters
-        s = re.sub(r"[^\w]+", "", s)
-        return s
-
     def parse_pairs_freeform_with_teil_offsets(text: str) -> Dict[int, str]:
         """
         Parse "1 A", "1: B", "1)C", "Q1=B", "1. Uhr", and also compact streams.
@@ -477,11 +697,11 @@ def objective_mark(student_answer: str, ref_answers: Dict[int, str]) -> Tuple[in
         return res
 
     # Build canonical reference map
-    ref_canon: Dict[int, str] = {int(idx): canonical_word(str(ans)) for idx, ans in (ref_answers or {}).items()}
+    ref_canon: Dict[int, str] = {int(idx): canonical_answer(str(ans)) for idx, ans in (ref_answers or {}).items()}
 
     # Parse student's freeform text WITH section offsets
     stu_raw = parse_pairs_freeform_with_teil_offsets(student_answer or "")
-    stu_canon: Dict[int, str] = {qn: canonical_word(tok) for qn, tok in stu_raw.items()}
+    stu_canon: Dict[int, str] = {qn: canonical_answer(tok) for qn, tok in stu_raw.items()}
 
     total = len(ref_canon) or 1
     correct = 0
@@ -510,14 +730,224 @@ def objective_mark(student_answer: str, ref_answers: Dict[int, str]) -> Tuple[in
     return score, feedback
 
 
+# ===================== AUTO-MARKING (BACKGROUND, PROVISIONAL) =====================
+
+def auto_mark_post(post: Dict[str, Any], ans_dict: Dict[str, Any], index: AssignmentIndex) -> Optional[Dict[str, Any]]:
+    """Provisional mark for a normalized post, or ``None`` unless it has an objective reference."""
+    key = index.resolve(str(post.get("assignment", "")), str(post.get("chapter", "")), str(post.get("level", "")))
+    if not key or key not in ans_dict:
+        return None
+    _, link, fmt, answers = build_reference_text_from_json(ans_dict[key])
+    if fmt != "objective" or not answers:
+        return None
+    score, feedback = objective_mark(extract_text_from_doc(post), answers)
+    return {
+        "assignment": key,
+        "score": score,
+        "feedback": feedback,
+        "link": link if score >= 60 else "",
+        "answers_hash": key_hash(answers),
+        "student_code": post.get("student_code", ""),
+        "student_name": post.get("student_name", ""),
+    }
 
-def save_row_to_scores(row: dict) -> dict:
+
+def provisional_mark_fn():
+    """``mark(level, post_id, data)`` for raw posts, safe to call from background threads."""
+    answers = shared_cache("answers")
+    indexes: Dict[Tuple[str, ...], AssignmentIndex] = {}
+
+    def mark(level: str, post_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        ans_dict = cached_answers_dictionary(answers)
+        keys = tuple(ans_dict)
+        if keys not in indexes:
+            indexes.clear()
+            indexes[keys] = AssignmentIndex(keys)
+        return auto_mark_post(normalize_submission(data, post_id, level), ans_dict, indexes[keys])
+
+    return mark
+
+
+@st.cache_resource(show_spinner=False)
+def auto_marker() -> Optional[AutoMarker]:
+    """The process's one listener marking new objective posts; see :meth:`AutoMarker.watch_levels`."""
+    if not db:
+        return None
+    return AutoMarker(
+        db, (), provisional_mark_fn(), min_interval=AUTO_MARK_INTERVAL,
+        posted_at=lambda data: submission_ts_ms(data) / 1000,
+    ).start()
+
+
+def objective_keys(ans_dict: Dict[str, Any]) -> Dict[str, Dict[int, str]]:
+    """Answers map of every objective assignment, as the auto-marker uses it."""
+    keys = {}
+    for key, row in ans_dict.items():
+        _, _, fmt, answers = build_reference_text_from_json(row)
+        if fmt == "objective" and answers:
+            keys[key] = answers
+    return keys
+
+
+def load_student_provisionals(level: str, student_code: str) -> Dict[str, Dict[str, Any]]:
+    """Provisional auto-marks of one student's posts, by post id (one query)."""
+    if not db or not level or not student_code:
+        return {}
     try:
-        r = requests.post(
-            WEBHOOK_URL,
-            json={"token": WEBHOOK_TOKEN, "row": row},
-            timeout=15,
+        query = (
+            db.collection(PROVISIONAL_COLLECTION)
+            .where("level", "==", level)
+            .where("student_code", "==", student_code)
         )
+        return {d["post_id"]: d for d in (s.to_dict() or {} for s in query.stream()) if d.get("post_id")}
+    except Exception:
+        return {}
+
+
+# ===================== MARKING QUEUE (PREFETCH) =====================
+
+def prepare_student(
+    level: str,
+    subs: List[Dict[str, Any]],
+    index: AssignmentIndex,
+    provisional: Dict[str, Dict[str, Any]],
+    previous: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Everything the submission viewer needs for one student.
+
+    Texts and reference matches of posts that are unchanged since
+    ``previous`` (an earlier result for the same student, e.g. prefetched)
+    are taken from it instead of being computed again.
+    """
+    known: Dict[Any, Tuple[Dict[str, Any], str, Any]] = {}
+    if previous and previous.get("keys") == index.keys:
+        known = {
+            d.get("_path"): (d, text, ref)
+            for d, text, ref in zip(previous["submissions"], previous["texts"], previous["refs"])
+        }
+    texts, refs = [], []
+    for d in subs:
+        hit = known.get(d.get("_path"))
+        if hit is not None and hit[0] == d:
+            texts.append(hit[1])
+            refs.append(hit[2])
+        else:
+            texts.append(extract_text_from_doc(d))
+            refs.append(index.match(str(d.get("assignment", "")), str(d.get("chapter", "")), level))
+    return {"submissions": subs, "texts": texts, "refs": refs, "provisional": provisional, "keys": index.keys}
+
+
+def student_queue(df: pd.DataFrame, code_col: str, name_col: str, level_col: str) -> List[Dict[str, str]]:
+    """Queue items for the (filtered) students, in sheet order."""
+    return [
+        {"code": str(r.get(code_col, "")).strip(), "name": str(r.get(name_col, "")).strip(),
+         "level": str(r.get(level_col, "")).strip(), "post": ""}
+        for r in df.to_dict("records")
+    ]
+
+
+def unmarked_queue(
+    posts: List[Dict[str, Any]], scores: pd.DataFrame, index: AssignmentIndex
+) -> List[Dict[str, str]]:
+    """Queue items for posts whose (student, reference) has no saved score, oldest first."""
+    marked = set()
+    for code, assignment in zip(scores.get("studentcode", []), scores.get("assignment", [])):
+        name = str(assignment)
+        marked.add((str(code).strip().lower(), index.resolve(name) or name))
+    items = []
+    for d in sorted(posts, key=lambda d: d.get("_ts_ms", 0)):
+        code = str(d.get("student_code", "")).strip()
+        ref = index.resolve(str(d.get("assignment", "")), str(d.get("chapter", "")), str(d.get("level", "")))
+        if code and (code.lower(), ref or str(d.get("assignment", ""))) not in marked:
+            items.append(
+                {"code": code, "name": str(d.get("student_name", "")), "level": str(d.get("level", "")),
+                 "post": d.get("_path", "")}
+            )
+    return items
+
+
+@st.cache_resource(show_spinner=False)
+def student_prefetcher() -> Prefetcher:
+    """Process-wide prefetcher of :func:`prepare_student` keyed by ``(level, code)``.
+
+    The viewer still reads the student's posts and marks itself; a
+    prefetched result only saves it the text extraction and reference
+    matching of posts that did not change meanwhile.
+    """
+    answers = shared_cache("answers")
+    indexes: Dict[Tuple[str, ...], AssignmentIndex] = {}
+
+    def load(key: Tuple[str, str]) -> Dict[str, Any]:
+        level, code = key
+        ans_dict = cached_answers_dictionary(answers)
+        keys = tuple(ans_dict)
+        if keys not in indexes:
+            indexes.clear()
+            indexes[keys] = AssignmentIndex(keys)
+        # strict: a failed read raises, so the prefetcher does not keep it
+        return prepare_student(level, fetch_submissions(level, code, strict=True), indexes[keys], {})
+
+    return Prefetcher(load, ttl=SUBMISSIONS_TTL)
+
+
+# ===================== SUBMISSION SEARCH =====================
+
+def search_entry(level: str, post_id: str, data: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Text and metadata of one raw post, as stored in the search index."""
+    post = normalize_submission(data, post_id, level)
+    meta = {k: str(post.get(k, "") or "") for k in ("level", "student_code", "student_name", "assignment", "chapter")}
+    meta["ts_ms"] = post["_ts_ms"]
+    return extract_text_from_doc(post), meta
+
+
+@st.cache_resource(show_spinner=False)
+def open_search_indexes() -> Dict[Tuple[str, ...], SubmissionIndex]:
+    """Search indexes opened so far, so diagnostics can report them without opening one."""
+    return {}
+
+
+@st.cache_resource(show_spinner=False)
+def submission_index(levels: Tuple[str, ...]) -> SubmissionIndex:
+    """Process-wide full-text index of every post of ``levels``, updated as posts change.
+
+    Opened by the first search, which subscribes to every level.
+    """
+    index = SubmissionIndex(SEARCH_INDEX_PATH)
+    if db:
+        index.watch(db, levels, search_entry)
+    open_search_indexes()[levels] = index
+    return index
+
+
+@st.cache_resource(show_spinner=False)
+def webhook_client() -> WebhookClient:
+    """Process-wide webhook client so every session shares one rate limit."""
+    return WebhookClient(
+        WEBHOOK_URL,
+        rate_per_min=WEBHOOK_RATE_PER_MIN,
+        max_concurrency=WEBHOOK_MAX_CONCURRENCY,
+        max_total=WEBHOOK_MAX_WAIT,
+    )
+
+
+WEBHOOK_CLIENT = webhook_client()
+
+
+@st.cache_resource(show_spinner=False)
+def save_index() -> SaveIndex:
+    """Process-wide index of saved rows used by :func:`save_row`."""
+    return SaveIndex(SAVE_INDEX_PATH)
+
+
+def save_row_to_scores(row: dict) -> dict:
+    try:
+        # The script appends every row: the sheet is the history of marks.
+        payload: Dict[str, Any] = {"token": WEBHOOK_TOKEN, "row": row}
+        # Rate limited, retried on 429 and connection errors (the script
+        # appends, so never after it may have run), waiting at most
+        # WEBHOOK_MAX_WAIT to send and short-circuited while the script is failing;
+        # see webhook_utils.WebhookClient.
+        r = WEBHOOK_CLIENT.post(payload, timeout=15)
 
         raw = r.text  # keep a copy for troubleshooting
 
@@ -555,11 +985,15 @@ def save_row_to_scores(row: dict) -> dict:
             return {"ok": False, "why": "validation", "raw": raw}
         return {"ok": True, "raw": raw, "message": "Saved to Scores sheet"}
 
+    except CircuitOpenError as e:
+        return {"ok": False, "why": "circuit_open", "error": str(e)}
+    except WebhookBusyError as e:  # nothing was sent, so saving again is safe
+        return {"ok": False, "why": "busy", "error": str(e)}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
 
-def save_row(row: dict, to_sheet: bool = True, to_firestore: bool = False) -> dict:
+def save_row(row: dict, to_sheet: bool = True, to_firestore: bool = False, index=None) -> dict:
     """Save a row to the score sheet and/or Firestore.
 
     Parameters
@@ -572,12 +1006,19 @@ def save_row(row: dict, to_sheet: bool = True, to_firestore: bool = False) -> di
     to_firestore: bool
         When ``True`` the row is written to Firestore using
         :func:`save_row_to_firestore`.
+    index: SaveIndex, optional
+        Local record of rows already saved.  When given, targets that
+        already hold identical content are skipped.  A changed row
+        overwrites the Firestore document named after its idempotency key;
+        the Scores sheet is append-only, so it gets a new row.  The index
+        is only updated once a write succeeded.
 
     Returns
     -------
     dict
         ``{"ok": True}`` if all requested operations succeed, otherwise the
-        first failure returned.
+        first failure returned.  ``skipped`` lists targets that already had
+        the row.
     """
 
     row = dict(row)
@@ -595,233 +1036,694 @@ def save_row(row: dict, to_sheet: bool = True, to_firestore: bool = False) -> di
 
     result: Dict[str, Any] = {"ok": True}
     messages: List[str] = []
+    skipped: List[str] = []
 
     if to_sheet:
-        sheet_res = save_row_to_scores(row)
-        if not sheet_res.get("ok"):
-            return sheet_res
-        result.update(sheet_res)
-        messages.append(sheet_res.get("message", "Scores sheet").replace("Saved to ", ""))
+        op, key, digest = index.plan(row, "sheet") if index else ("", "", "")
+        if op == "skip":
+            skipped.append("Scores sheet")
+        else:
+            sheet_res = save_row_to_scores(row)
+            if not sheet_res.get("ok"):
+                return sheet_res
+            if index:
+                index.record(key, "sheet", digest)
+            result.update(sheet_res)
+            messages.append(sheet_res.get("message", "Scores sheet").replace("Saved to ", ""))
 
     if to_firestore:
-        fs_res = save_row_to_firestore(row)
-        if not fs_res.get("ok"):
-            return fs_res
-        result.update(fs_res)
-        messages.append(fs_res.get("message", "Firestore").replace("Saved to ", ""))
-
+        op, key, digest = index.plan(row, "firestore") if index else ("", "", "")
+        if op == "skip":
+            skipped.append("Firestore")
+        else:
+            fs_res = save_row_to_firestore(row, doc_id=key) if index else save_row_to_firestore(row)
+            if not fs_res.get("ok"):
+                return fs_res
+            if index:
+                index.record(key, "firestore", digest)
+            result.update(fs_res)
+            messages.append(fs_res.get("message", "Firestore").replace("Saved to ", ""))
+
+    if skipped:
+        result["skipped"] = skipped
+        if not messages:
+            result["message"] = "Already saved; nothing changed"
+            return result
     result["message"] = "Saved to " + " and ".join(messages) if messages else "Saved"
     return result
 
 
+# ===================== REPORT CARDS =====================
+
+def reference_links(assignments: List[str], ans_dict: Dict[str, Any], index: AssignmentIndex) -> Dict[str, str]:
+    """Reference link (answer_url) for each saved assignment name that resolves to a key."""
+    links: Dict[str, str] = {}
+    for name in assignments:
+        key = index.resolve(name)
+        if key:
+            link = build_reference_text_from_json(ans_dict[key])[1]
+            if link:
+                links[name] = link
+    return links
+
+
+def zip_files(paths: List[str]) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted(paths):
+            zf.write(path, os.path.basename(path))
+    return buf.getvalue()
+
+
 
 # =========================================================
 # UI
 # =========================================================
+# The page is split into fragments so a widget change only reruns the part
+# of the page that owns it.  Fragments share state through session keys:
+#
+#   student_picker     -> student      (read by submission_viewer, scoring_form);
+#                         in queue mode also queue_post (post to preselect)
+#   reference_chooser  -> ref_assignment (read by submission_viewer,
+#                         scoring_form); the reference itself lives in the
+#                         process-wide reference_store, see chosen_reference
+#   submission_viewer  -> prefilled_post and ref_assignment (reference
+#                         matched to the chosen post), ai_score and feedback
+#                         when the post has a provisional auto-mark
+#   scoring_form       -> ai_score, feedback (own state only)
+#
+# When a fragment changes a shared key during a fragment-only rerun it calls
+# ``publish`` which triggers a full rerun so the dependants catch up.
 st.set_page_config(page_title="📘 Marking Dashboard", page_icon="📘", layout="wide")
-message = st.session_state.pop("last_save_success", None)
-if message:
-    st.success("✅ " + message)
-st.title("📘 Marking Dashboard")
-
-if st.button("🔄 Refresh caches"):
-    st.cache_data.clear()
-    st.rerun()
-
-# --- Load students
-students_df = load_sheet_csv(STUDENTS_SHEET_ID, STUDENTS_SHEET_TAB)
-code_col  = find_col(students_df, ["studentcode", "student_code", "code"], default="studentcode")
-name_col  = find_col(students_df, ["name", "fullname"], default="name")
-level_col = find_col(students_df, ["level"], default="level")
-
-# Pick student
-st.subheader("1) Pick Student")
-q = st.text_input("Search student (code / name / any field)")
-df_filtered = filter_any(students_df, q)
-if df_filtered.empty:
-    st.warning("No students match your search.")
-    st.stop()
-
-labels = [f"{r.get(code_col,'')} — {r.get(name_col,'')} ({r.get(level_col,'')})" for _, r in df_filtered.iterrows()]
-choice = st.selectbox("Select student", labels)
-srow = df_filtered.iloc[labels.index(choice)]
-studentcode = str(srow.get(code_col,"")).strip()
-student_name = str(srow.get(name_col,"")).strip()
-student_level = str(srow.get(level_col,"")).strip()
-
-c1, c2 = st.columns(2)
-with c1: st.text_input("Name (auto)",  value=student_name,  disabled=True)
-with c2: st.text_input("Level (auto)", value=student_level, disabled=True)
-
-# ---------------- Reference chooser (Tabs) ----------------
-st.subheader("2) Reference source")
-
-# Session holder for the *chosen* reference
-if "ref_assignment" not in st.session_state:
-    st.session_state.ref_assignment = ""
-if "ref_text" not in st.session_state:
-    st.session_state.ref_text = ""
-if "ref_link" not in st.session_state:
-    st.session_state.ref_link = ""
-if "ref_format" not in st.session_state:
-    st.session_state.ref_format = "essay"
-if "ref_answers" not in st.session_state:
-    st.session_state.ref_answers = {}
-
-tab_json, = st.tabs(["📦 JSON dictionary"])
-
-# ---- JSON tab
-with tab_json:
-    ans_dict = load_answers_dictionary()
-    if not ans_dict:
-        st.info("answers_dictionary.json not found in repo.")
-    else:
-        all_assignments_json = list_json_assignments(ans_dict)
-        st.caption(f"{len(all_assignments_json)} assignments in JSON")
-        qj = st.text_input("Search assignment", key="search_json")
-        pool_json = [a for a in all_assignments_json if qj.lower() in a.lower()] if qj else all_assignments_json
-        pick_json = st.selectbox("Select assignment", pool_json, key="pick_json")
-        ref_text_json, link_json, fmt_json, ans_map_json = build_reference_text_from_json(
-            ans_dict.get(pick_json, {})
-        )
-        st.markdown("**Reference preview (JSON):**")
-        st.code(ref_text_json or "(none)", language="markdown")
-        st.caption(f"Format: {fmt_json}")
-        if link_json:
-            st.caption(f"Reference link: {link_json}")
-        if st.button("✅ Use this JSON reference"):
-            st.session_state.ref_assignment = pick_json
-            st.session_state.ref_text = ref_text_json
-            st.session_state.ref_link = link_json
-            st.session_state.ref_format = fmt_json
-            st.session_state.ref_answers = ans_map_json
-            st.success("Using JSON reference")
-
-# Ensure a default reference is selected
-if not st.session_state.ref_assignment:
-    ans = load_answers_dictionary()
-    if ans:
-        first = list_json_assignments(ans)[0]
-        txt, ln, fmt, ans_map = build_reference_text_from_json(ans[first])
-        st.session_state.ref_assignment = first
-        st.session_state.ref_text = txt
-        st.session_state.ref_link = ln
-        st.session_state.ref_format = fmt
-        st.session_state.ref_answers = ans_map
-
-st.info(
-    f"Currently selected reference → **{st.session_state.ref_assignment or '—'}** (format: {st.session_state.ref_format})"
-)
+_page_started = time.perf_counter()
+
+
+def publish(key: str, value: Any) -> None:
+    """Store a shared value and rerun the page if a fragment changed it."""
+    changed = st.session_state.get(key) != value
+    st.session_state[key] = value
+    if changed and not st.session_state.get("_full_run_active"):
+        st.rerun()
+
+
+@st.fragment
+def student_picker(students_df: pd.DataFrame) -> None:
+    """Search and pick a student; publishes ``student``."""
+    with timed("student picker", st.session_state):
+        st.subheader("1) Pick Student")
+        q = st.text_input("Search student (code / name / any field)")
+        df_filtered = filter_any(students_df, q)
+        if df_filtered.empty:
+            st.warning("No students match your search.")
+            publish("student", {"code": "", "name": "", "level": ""})
+            return
+
+        mode = st.radio("Mode", QUEUE_MODES, horizontal=True, key="picker_mode")
+        if mode != QUEUE_MODES[0]:
+            marking_queue(mode, df_filtered)
+            return
+
+        labels = build_student_labels(df_filtered, code_col, name_col, level_col)
+        n_pages = -(-len(labels) // PICKER_PAGE_SIZE)
+        page = 1
+        if n_pages > 1:
+            page = st.number_input(
+                f"Page (1–{n_pages}, {len(labels)} matches — narrow the search to see fewer)",
+                1, n_pages, 1, key="student_page",
+            )
+        options = picker_page(labels, page)
+        row_id = st.selectbox("Select student", list(options), format_func=options.__getitem__, key="student_row_id")
+        srow = df_filtered.loc[row_id]
+        student = {
+            "code":  str(srow.get(code_col, "")).strip(),
+            "name":  str(srow.get(name_col, "")).strip(),
+            "level": str(srow.get(level_col, "")).strip(),
+        }
 
+        c1, c2 = st.columns(2)
+        with c1: st.text_input("Name (auto)",  value=student["name"],  disabled=True)
+        with c2: st.text_input("Level (auto)", value=student["level"], disabled=True)
+        publish("student", student)
 
-# ---------------- Submissions & Marking ----------------
-st.subheader("3) Student submission (Firestore)")
-student_text = ""
-subs = fetch_submissions(student_level, studentcode)
-if not subs:
-    st.warning(
-        f"No submissions found under submissions/{student_level}/posts/."
-    )
-else:
-    def label_for(d: Dict[str, Any]) -> str:
-        txt = extract_text_from_doc(d)
-        preview = (txt[:80] + "…") if len(txt) > 80 else txt
-        ts = datetime.fromtimestamp(d.get("_ts_ms", 0) / 1000).strftime("%Y-%m-%d %H:%M")
-        return (
-            f"{ts} • {d.get('student_name','')} • {d.get('student_code','')} "
-            f"• {d.get('level','')} • {d.get('chapter','')} "
-            f"• {d.get('assignment','')} • {preview}"
-        )
 
-    labels_sub = [label_for(d) for d in subs]
-    pick = st.selectbox("Pick submission", labels_sub)
-    chosen = subs[labels_sub.index(pick)]
-    student_text = extract_text_from_doc(chosen)
-    st.markdown(f"**Student:** {chosen.get('student_name','')}")
-    st.markdown(f"**Level:** {chosen.get('level','')}")
-    st.markdown(f"**Chapter:** {chosen.get('chapter','')}")
-    st.markdown(f"**Assignment:** {chosen.get('assignment','')}")
-
-st.markdown("**Student Submission**")
-st.code(student_text or "(empty)", language="markdown")
-
-st.markdown("**Reference Answer (chosen)**")
-st.code(st.session_state.ref_text or "(not set)", language="markdown")
-st.caption(f"Format: {st.session_state.ref_format}")
-if st.session_state.ref_link:
-    st.caption(f"Reference link: {st.session_state.ref_link}")
-
-# Combined copy block
-st.subheader("4) Combined (copyable)")
-combined = f"""# Student Submission
-{student_text}
-
-# Reference Answer
-{st.session_state.ref_text}
-"""
-st.text_area("Combined", value=combined, height=200)
-
-# Manual scoring
-if "ai_score" not in st.session_state:
-    st.session_state.ai_score = 0
-if "feedback" not in st.session_state:
-    st.session_state.feedback = ""
-
-if st.button("Reset"):
-    st.session_state.ai_score = 0
-    st.session_state.feedback = ""
-
-score = st.number_input("Score", 0, 100, value=int(st.session_state.ai_score))
-st.session_state.ai_score = score
-
-feedback = st.text_area("Feedback", key="feedback", height=80)
-
-# Save to Scores
-st.subheader("5) Save to Scores sheet")
-save_to_firestore = st.checkbox("also save to Firestore")
-if st.button("💾 Save", type="primary", use_container_width=True):
-    if not studentcode:
-        st.error("Pick a student first.")
-    elif not st.session_state.ref_assignment:
-        st.error("Pick a JSON reference and click its 'Use this JSON reference' button.")
-    elif not feedback.strip():
-        st.error("Feedback is required.")
-    else:
-        try:
-            studentcode_val = int(studentcode)
-        except ValueError:
-            studentcode_val = studentcode
-
-        score_int = int(score)
-        link_value = st.session_state.ref_link if score_int >= 60 else ""
-
-        row = {
-            "studentcode": studentcode_val,
-            "name":        student_name,
-            "assignment":  st.session_state.ref_assignment,
-            "score":       score_int,
-            "comments":    feedback.strip(),
-            "date":        datetime.now().strftime("%Y-%m-%d"),
-            "level":       student_level,
-            "link":        link_value,  # uses answer_url only when allowed
-        }
+QUEUE_MODES = ("Pick a student", "Queue: filtered students", "Queue: unmarked submissions")
+
 
-        result = save_row(row, to_firestore=save_to_firestore)
-        if result.get("ok"):
-            message = result.get("message", "Saved")
-            st.session_state["last_save_success"] = message
-            st.success("✅ " + message)
-            load_sheet_csv.clear()
-            st.rerun()
-        elif result.get("why") == "validation":
-            field = result.get("field")
-            if field:
-                st.error(f"❌ Sheet blocked the write due to data validation ({field}).")
+def marking_queue(mode: str, df_filtered: pd.DataFrame) -> None:
+    """Walk a queue of students or posts; publishes ``student`` and ``queue_post``.
+
+    The next ``QUEUE_PREFETCH`` items are loaded in the background while
+    the current one is being marked.
+    """
+    if mode == QUEUE_MODES[1]:
+        queue = student_queue(df_filtered, code_col, name_col, level_col)
+    else:
+        levels_q = sorted(df_filtered[level_col].dropna().astype(str).unique().tolist()) or [""]
+        level = st.selectbox("Level", levels_q, key="queue_level")
+        if st.button("Build queue of unmarked submissions", key="queue_build") or st.session_state.get("queue_for") != level:
+            ans_dict = load_answers_dictionary()
+            st.session_state.unmarked_queue = unmarked_queue(
+                fetch_level_submissions(level), load_scores(), assignment_index(tuple(ans_dict))
+            )
+            st.session_state.queue_for = level
+            st.session_state.queue_pos = 0
+        queue = st.session_state.get("unmarked_queue", [])
+    if not queue:
+        st.info("The queue is empty.")
+        publish("student", {"code": "", "name": "", "level": ""})
+        return
+
+    pos = min(int(st.session_state.get("queue_pos", 0)), len(queue) - 1)
+    c1, c2, c3 = st.columns([1, 4, 1])
+    with c1:
+        if st.button("⬅ Previous", disabled=pos == 0, key="queue_prev"):
+            pos -= 1
+    with c3:
+        if st.button("Next ➡", disabled=pos >= len(queue) - 1, key="queue_next"):
+            pos += 1
+    st.session_state.queue_pos = pos
+    item = queue[pos]
+    with c2:
+        st.markdown(f"**{pos + 1} / {len(queue)}** — {item['code']} — {item['name']} ({item['level']})")
+
+    upcoming = queue[pos + 1:pos + 1 + QUEUE_PREFETCH]
+    student_prefetcher().want([(item["level"], item["code"])] + [(i["level"], i["code"]) for i in upcoming])
+    st.session_state.queue_post = item["post"]
+    publish("student", {"code": item["code"], "name": item["name"], "level": item["level"]})
+
+
+@st.fragment
+def reference_chooser() -> None:
+    """Browse the answers dictionary; publishes ``ref_assignment`` on confirmation."""
+    with timed("reference chooser", st.session_state):
+        st.subheader("2) Reference source")
+        tab_json, = st.tabs(["📦 JSON dictionary"])
+
+        # ---- JSON tab
+        with tab_json:
+            ans_dict = load_answers_dictionary()
+            if not ans_dict:
+                st.info("answers_dictionary.json not found in repo.")
             else:
-                st.error("❌ Sheet blocked the write due to data validation.")
-                if result.get("raw"):
-                    st.caption(result["raw"])
-        else:
-            st.error(f"❌ Failed to save: {result}")
+                all_assignments_json = list_json_assignments(ans_dict)
+                st.caption(f"{len(all_assignments_json)} assignments in JSON")
+                qj = st.text_input("Search assignment", key="search_json")
+                pool_json = [a for a in all_assignments_json if qj.lower() in a.lower()] if qj else all_assignments_json
+                pick_json = st.selectbox("Select assignment", pool_json, key="pick_json")
+                preview = reference_store().get(pick_json, ans_dict.get(pick_json))
+                st.markdown("**Reference preview (JSON):**")
+                st.code(preview.text or "(none)", language="markdown")
+                st.caption(f"Format: {preview.format}")
+                if preview.link:
+                    st.caption(f"Reference link: {preview.link}")
+                if st.button("✅ Use this JSON reference"):
+                    publish("ref_assignment", pick_json)
+                    st.success("Using JSON reference")
+
+        st.info(
+            f"Currently selected reference → **{st.session_state.ref_assignment or '—'}** (format: {chosen_reference().format})"
+        )
 
 
+@st.fragment
+def submission_viewer() -> None:
+    """Show the picked student's submissions next to the chosen reference."""
+    with timed("submission viewer", st.session_state):
+        student = st.session_state.get("student") or {}
+        student_level = student.get("level", "")
+        st.subheader("3) Student submission (Firestore)")
+        student_text = ""
+        code = student.get("code", "")
+        try:
+            # Always read fresh, so a new post or auto-mark shows up at once.
+            subs = fetch_submissions(student_level, code, strict=True)
+            prepared = prepare_student(
+                student_level, subs, assignment_index(tuple(load_answers_dictionary())),
+                load_student_provisionals(student_level, code), student_prefetcher().peek((student_level, code)),
+            )
+        except Exception as e:
+            prepared = {"submissions": [], "texts": [], "refs": [], "provisional": {}, "error": str(e)}
+        subs = prepared["submissions"]
+        if prepared.get("error"):
+            st.error(f"❌ Could not load submissions from Firestore: {prepared['error']}")
+        elif not subs:
+            st.warning(
+                f"No submissions found under submissions/{student_level}/posts/."
+            )
+        else:
+            def label_for(d: Dict[str, Any], txt: str) -> str:
+                preview = (txt[:80] + "…") if len(txt) > 80 else txt
+                ts = datetime.fromtimestamp(d.get("_ts_ms", 0) / 1000).strftime("%Y-%m-%d %H:%M")
+                return (
+                    f"{ts} • {d.get('student_name','')} • {d.get('student_code','')} "
+                    f"• {d.get('level','')} • {d.get('chapter','')} "
+                    f"• {d.get('assignment','')} • {preview}"
+                )
+
+            labels_sub = [label_for(d, txt) for d, txt in zip(subs, prepared["texts"])]
+            paths = [d["_path"] for d in subs]
+            queued = st.session_state.get("queue_post", "")
+            pick = st.selectbox("Pick submission", labels_sub, index=paths.index(queued) if queued in paths else 0)
+            chosen_i = labels_sub.index(pick)
+            chosen = subs[chosen_i]
+            student_text = prepared["texts"][chosen_i]
+            st.markdown(f"**Student:** {chosen.get('student_name','')}")
+            st.markdown(f"**Level:** {chosen.get('level','')}")
+            st.markdown(f"**Chapter:** {chosen.get('chapter','')}")
+            st.markdown(f"**Assignment:** {chosen.get('assignment','')}")
+
+            ans_dict = load_answers_dictionary()
+            ref_key, how = prepared["refs"][chosen_i]
+            provisional = prepared["provisional"].get(chosen.get("id", ""))
+            if provisional:
+                ref_key, how = provisional.get("assignment") or ref_key, "auto-mark"
+                st.info(
+                    f"🤖 Provisional auto-mark: **{provisional.get('score')}** against "
+                    f"{provisional.get('assignment')}. Review the feedback below before saving."
+                )
+            if ref_key:
+                st.caption(f"Reference matched automatically ({how}): {ref_key}")
+            else:
+                st.caption("No matching reference found; pick one in the JSON tab.")
+            if ref_key and st.session_state.get("prefilled_post") != chosen["_path"]:
+                # Apply once per post so the teacher's own choices are not overwritten.
+                st.session_state.prefilled_post = chosen["_path"]
+                changed = bool(provisional) or st.session_state.ref_assignment != ref_key
+                if provisional:
+                    st.session_state.ai_score = int(provisional.get("score") or 0)
+                    st.session_state.feedback = provisional.get("feedback", "")
+                if ref_key in ans_dict:
+                    st.session_state.ref_assignment = ref_key
+                if changed:
+                    # Rerun everything: the reference chooser above already rendered.
+                    st.rerun()
+
+        st.markdown("**Student Submission**")
+        st.code(student_text or "(empty)", language="markdown")
+
+        reference = chosen_reference()
+        st.markdown("**Reference Answer (chosen)**")
+        st.code(reference.text or "(not set)", language="markdown")
+        st.caption(f"Format: {reference.format}")
+        if reference.link:
+            st.caption(f"Reference link: {reference.link}")
+
+        # Combined copy block: built only when asked for, and shown with
+        # st.code (copy button) rather than a widget that keeps a copy.
+        st.subheader("4) Combined (copyable)")
+        if st.toggle("Show combined text", key="show_combined"):
+            st.code(
+                f"# Student Submission\n{student_text}\n\n# Reference Answer\n{reference.text}\n",
+                language="markdown",
+            )
+
+
+@st.fragment
+def scoring_form() -> None:
+    """Score, feedback and save.  Typing here reruns only this fragment."""
+    with timed("scoring form", st.session_state):
+        student = st.session_state.get("student") or {}
+        studentcode = student.get("code", "")
+        student_name = student.get("name", "")
+        student_level = student.get("level", "")
+
+        # Manual scoring
+        if "ai_score" not in st.session_state:
+            st.session_state.ai_score = 0
+        if "feedback" not in st.session_state:
+            st.session_state.feedback = ""
+
+        if st.button("Reset"):
+            st.session_state.ai_score = 0
+            st.session_state.feedback = ""
+
+        score = st.number_input("Score", 0, 100, value=int(st.session_state.ai_score))
+        st.session_state.ai_score = score
+
+        feedback = st.text_area("Feedback", key="feedback", height=80)
+
+        # Save to Scores
+        st.subheader("5) Save to Scores sheet")
+        save_to_firestore = st.checkbox("also save to Firestore")
+        if st.button("💾 Save", type="primary", use_container_width=True):
+            if not studentcode:
+                st.error("Pick a student first.")
+            elif not st.session_state.ref_assignment:
+                st.error("Pick a JSON reference and click its 'Use this JSON reference' button.")
+            elif not feedback.strip():
+                st.error("Feedback is required.")
+            else:
+                try:
+                    studentcode_val = int(studentcode)
+                except ValueError:
+                    studentcode_val = studentcode
+
+                score_int = int(score)
+                link_value = chosen_reference().link if score_int >= 60 else ""
+
+                row = {
+                    "studentcode": studentcode_val,
+                    "name":        student_name,
+                    "assignment":  st.session_state.ref_assignment,
+                    "score":       score_int,
+                    "comments":    feedback.strip(),
+                    "date":        datetime.now().strftime("%Y-%m-%d"),
+                    "level":       student_level,
+                    "link":        link_value,  # uses answer_url only when allowed
+                }
+
+                result = save_row(row, to_firestore=save_to_firestore, index=save_index())
+                if result.get("ok"):
+                    message = result.get("message", "Saved")
+                    st.session_state["last_save_success"] = message
+                    st.success("✅ " + message)
+                    if "Scores sheet" not in result.get("skipped", []):
+                        forget_scores_sheet()
+                        load_sheet_csv.clear()
+                    st.rerun()
+                elif result.get("why") == "circuit_open":
+                    st.error("❌ The Scores sheet is not responding; saving is paused for a moment. Try again shortly.")
+                elif result.get("why") == "busy":
+                    st.warning("⏳ Too many saves at once; this one was not sent. Save again in a moment.")
+                elif result.get("why") == "validation":
+                    field = result.get("field")
+                    if field:
+                        st.error(f"❌ Sheet blocked the write due to data validation ({field}).")
+                    else:
+                        st.error("❌ Sheet blocked the write due to data validation.")
+                        if result.get("raw"):
+                            st.caption(result["raw"])
+                else:
+                    st.error(f"❌ Failed to save: {result}")
+
+
+@st.fragment
+def essay_triage(levels: List[str]) -> None:
+    """Rank a whole level's essay submissions by similarity to their reference."""
+    with timed("essay triage", st.session_state):
+        with st.expander("6) Essay triage (whole level)"):
+            student_level = (st.session_state.get("student") or {}).get("level", "")
+            level = st.selectbox(
+                "Level", levels, index=levels.index(student_level) if student_level in levels else 0,
+                key="triage_level",
+            )
+            if not st.button("Rank essays", key="triage_run"):
+                return
+            ans_dict = load_answers_dictionary()
+            references: Dict[str, str] = {}
+            for key, entry in ans_dict.items():
+                text, _, fmt, _ = build_reference_text_from_json(entry)
+                if fmt == "essay":
+                    references[key] = text
+            index = assignment_index(tuple(ans_dict))
+            items = [
+                {
+                    "student": d.get("student_name", ""),
+                    "code": d.get("student_code", ""),
+                    "assignment": d.get("assignment", ""),
+                    "reference": index.resolve(str(d.get("assignment", "")), str(d.get("chapter", "")), level),
+                    "text": extract_text_from_doc(d),
+                }
+                for d in fetch_level_submissions(level)
+            ]
+            ranked = rank_essays(items, references)
+            st.caption(
+                f"{len(ranked)} essays ranked; {len(items) - len(ranked)} posts had no essay reference."
+            )
+            if ranked:
+                table = pd.DataFrame(ranked).drop(columns=["text"])
+                st.dataframe(table, use_container_width=True, hide_index=True)
+
+
+@st.fragment
+def copy_check(levels: List[str]) -> None:
+    """Clusters of near-identical posts per assignment across a whole level."""
+    with timed("copy check", st.session_state):
+        with st.expander("7) Copying check (whole level)"):
+            student_level = (st.session_state.get("student") or {}).get("level", "")
+            level = st.selectbox(
+                "Level", levels, index=levels.index(student_level) if student_level in levels else 0,
+                key="copy_level",
+            )
+            if not st.button("Find near-duplicates", key="copy_run"):
+                return
+            index = duplicate_index(level)
+            if db and not index.ready(level):
+                st.info("⏳ Still indexing this level's posts; clusters may be missing. Run the check again shortly.")
+            clusters = index.clusters()
+            st.caption(
+                f"{len(clusters)} clusters among {len(index)} indexed texts. "
+                "Objective clusters also catch students who simply got the same answers right."
+            )
+            rows = []
+            for n, c in enumerate(clusters, start=1):
+                assignment, kind = c["group"]
+                for key in c["keys"]:
+                    d = index.meta(key) or {}
+                    rows.append(
+                        {
+                            "cluster": n,
+                            "assignment": d.get("assignment", assignment),
+                            "kind": kind,
+                            "similarity ≥": c["min_similarity"],
+                            "student": d.get("student_name", ""),
+                            "code": d.get("student_code", ""),
+                            "submitted": datetime.fromtimestamp(d.get("_ts_ms", 0) / 1000).strftime("%Y-%m-%d %H:%M"),
+                        }
+                    )
+            if rows:
+                st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+
+@st.fragment
+def report_cards(levels: List[str], students_df: pd.DataFrame) -> None:
+    """Render a PDF report card for every student of a level and offer them as a zip."""
+    with timed("report cards", st.session_state):
+        with st.expander("8) Report cards (whole level)"):
+            student_level = (st.session_state.get("student") or {}).get("level", "")
+            level = st.selectbox(
+                "Level", levels, index=levels.index(student_level) if student_level in levels else 0,
+                key="report_level",
+            )
+            if st.button("Generate report cards", key="report_run"):
+                scores = load_scores()
+                ans_dict = load_answers_dictionary()
+                links = reference_links(
+                    scores["assignment"].dropna().astype(str).unique().tolist(),
+                    ans_dict,
+                    assignment_index(tuple(ans_dict)),
+                )
+                roster = students_df.rename(columns={code_col: "studentcode", name_col: "name", level_col: "level"})
+                cards = build_report_cards(scores, level, links, roster)
+                started = time.perf_counter()
+                progress = st.progress(0.0, text=f"Rendering {len(cards)} report cards…")
+                paths: List[str] = []
+                failed: List[Dict[str, Any]] = []
+                for result in render_report_cards(cards, os.path.join(REPORTS_DIR, level), workers=REPORT_WORKERS):
+                    if result["ok"]:
+                        paths.append(result["path"])
+                    else:
+                        failed.append({"student": result["code"], "error": result["error"]})
+                    done = len(paths) + len(failed)
+                    progress.progress(done / len(cards), text=f"{done} / {len(cards)} report cards")
+                st.session_state["report_zip"] = (level, zip_files(paths))
+                st.caption(f"{len(paths)} report cards in {time.perf_counter() - started:.1f}s")
+                if failed:
+                    st.error(f"{len(failed)} report card(s) could not be rendered and are not in the zip.")
+                    st.dataframe(pd.DataFrame(failed), use_container_width=True, hide_index=True)
+            ready = st.session_state.get("report_zip")
+            if ready and ready[0] == level:
+                st.download_button(
+                    "⬇️ Download report cards (zip)", ready[1],
+                    file_name=f"report_cards_{level}.zip", mime="application/zip", key="report_download",
+                )
+
+
+@st.fragment
+def gradebook_export(levels: List[str], students_df: pd.DataFrame) -> None:
+    """Export a level's (or the whole school's) gradebook as CSV, Parquet or XLSX."""
+    with timed("gradebook export", st.session_state):
+        with st.expander("9) Gradebook export"):
+            options = levels + ["All levels"]
+            student_level = (st.session_state.get("student") or {}).get("level", "")
+            level = st.selectbox(
+                "Level", options, index=options.index(student_level) if student_level in options else 0,
+                key="gradebook_level",
+            )
+            fmt = st.radio("Format", list(GRADEBOOK_FORMATS), horizontal=True, key="gradebook_format")
+            mime, ext = GRADEBOOK_FORMATS[fmt]
+            name = f"gradebook_{'all' if level == 'All levels' else level}{ext}"
+            path = os.path.join(EXPORTS_DIR, name)
+            if st.button("Build gradebook", key="gradebook_run"):
+                ans_dict = load_answers_dictionary()
+                roster = students_df.rename(columns={code_col: "studentcode", name_col: "name", level_col: "level"})
+                os.makedirs(EXPORTS_DIR, exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                started = time.perf_counter()
+                with open(tmp, "wb") as f:
+                    rows = export_gradebook(
+                        score_chunks(), roster, "" if level == "All levels" else level,
+                        list_json_assignments(ans_dict), assignment_index(tuple(ans_dict)), fmt, f,
+                    )
+                os.replace(tmp, path)
+                st.session_state["gradebook_file"] = path
+                st.caption(f"{rows} students in {time.perf_counter() - started:.1f}s")
+            if st.session_state.get("gradebook_file") == path and os.path.exists(path):
+                with open(path, "rb") as f:
+                    st.download_button(
+                        f"⬇️ Download {name}", f, file_name=name, mime=mime, key="gradebook_download",
+                    )
+
+
+@st.fragment
+def submission_search(levels: List[str]) -> None:
+    """Ranked full-text search over the posts of every level."""
+    with timed("submission search", st.session_state):
+        with st.expander("10) Search submissions (all levels)"):
+            c1, c2, c3 = st.columns([3, 1, 2])
+            query = c1.text_input(
+                "Words or \"a phrase\"", key="search_query",
+                help="Umlauts and ß match their spelled-out forms; end a word with * to match a prefix.",
+            )
+            level = c2.selectbox("Level", ["All levels"] + levels, key="search_level")
+            assignment = c3.text_input("Assignment contains", key="search_assignment")
+            if not query.strip():
+                return
+            index = submission_index(tuple(levels))
+            indexing = [lvl for lvl in levels if lvl and not index.ready(lvl)]
+            if indexing:
+                st.info(f"⏳ Still indexing {', '.join(indexing)}; those posts may be missing from the results.")
+            started = time.perf_counter()
+            hits = index.search(query, "" if level == "All levels" else level, assignment.strip())
+            st.caption(f"{len(hits)} hits among {len(index)} posts in {(time.perf_counter() - started) * 1000:.0f} ms")
+            if hits:
+                table = pd.DataFrame(hits)
+                table["submitted"] = pd.to_datetime(table["ts_ms"], unit="ms").dt.strftime("%Y-%m-%d %H:%M")
+                st.dataframe(
+                    table[["level", "student_code", "student_name", "assignment", "submitted", "snippet", "path"]],
+                    use_container_width=True, hide_index=True,
+                )
+
+
+@st.fragment
+def answer_key_regrade() -> None:
+    """Re-mark provisional scores whose objective answer key has since been corrected."""
+    with timed("answer key regrade", st.session_state):
+        with st.expander("11) Regrade after answer-key changes"):
+            if not db:
+                st.caption("Needs Firestore (provisional marks live there).")
+                return
+            if st.button("Check for answer-key changes", key="regrade_check"):
+                keys = objective_keys(load_answers_dictionary())
+                plan = regrade(db, keys, provisional_mark_fn(), dry_run=True)
+                if not plan["stale"]:
+                    save_keys(db, keys)  # every mark uses these keys: the baseline for later diffs
+                st.session_state["regrade_plan"] = plan
+            plan = st.session_state.get("regrade_plan")
+            if not plan:
+                return
+            if not plan["stale"]:
+                st.caption("Every provisional mark was made with the current answer keys.")
+                return
+            st.dataframe(
+                pd.DataFrame(
+                    [
+                        {
+                            "assignment": a,
+                            "stale marks": n,
+                            "changed questions": "?" if plan["changed questions"][a] is None
+                            else ", ".join(map(str, plan["changed questions"][a])),
+                        }
+                        for a, n in plan["stale marks"].items()
+                    ]
+                ),
+                use_container_width=True, hide_index=True,
+            )
+            if None in plan["changed questions"].values():
+                st.caption("? = no earlier key was recorded, so the changed questions are unknown.")
+            if st.button(f"Re-mark {plan['stale']} provisional scores", key="regrade_run"):
+                started = time.perf_counter()
+                report = regrade(db, objective_keys(load_answers_dictionary()), provisional_mark_fn())
+                st.session_state.pop("regrade_plan", None)
+                st.caption(f"Done in {time.perf_counter() - started:.1f}s")
+                st.json(report)
+
+# The page itself.  ``_full_run_active`` is reset even when the run stops early
+# (an error, ``st.rerun``/``st.stop``), or ``publish`` would stop rerunning.
+st.session_state["_full_run_active"] = True
+try:
+    message = st.session_state.pop("last_save_success", None)
+    if message:
+        st.success("✅ " + message)
+    st.title("📘 Marking Dashboard")
+
+    if st.button("🔄 Refresh caches"):
+        # Bumping the shared generations makes every replica miss on old entries.
+        for namespace in ("sheets", "answers"):
+            shared_cache(namespace).invalidate()
+        sheet_snapshots().refresh()
+        student_prefetcher().clear()
+        reference_store().clear()
+        st.cache_data.clear()
+        st.rerun()
+
+    # --- Load students
+    students_df = load_sheet_csv(STUDENTS_SHEET_ID, STUDENTS_SHEET_TAB, STUDENT_COLUMNS)
+    code_col  = find_col(students_df, ["studentcode", "student_code", "code"], default="studentcode")
+    name_col  = find_col(students_df, ["name", "fullname"], default="name")
+    level_col = find_col(students_df, ["level"], default="level")
+
+    # The session keeps only the *chosen* reference's key (see chosen_reference)
+    if not st.session_state.get("ref_assignment"):
+        ans = load_answers_dictionary()
+        st.session_state.ref_assignment = list_json_assignments(ans)[0] if ans else ""
+
+    student_picker(students_df)
+    reference_chooser()
+    submission_viewer()
+    scoring_form()
+    levels = sorted(students_df[level_col].dropna().astype(str).unique().tolist()) or [""]
+    marker = auto_marker() if AUTO_MARK else None
+    if marker:
+        marker.watch_levels(levels)
+    essay_triage(levels)
+    copy_check(levels)
+    report_cards(levels, students_df)
+    gradebook_export(levels, students_df)
+    submission_search(levels)
+    answer_key_regrade()
+finally:
+    st.session_state["_full_run_active"] = False
+record_timing("full rerun", (time.perf_counter() - _page_started) * 1000, st.session_state)
+
+# Fragment-only reruns are recorded too; they show up here on the next full run.
+with st.sidebar.expander("⏱ Diagnostics"):
+    st.caption("Rerun time per section (ms)")
+    st.table(timing_report(st.session_state))
+    st.caption("Loaded sheets (this session)")
+    st.table(frame_memory_report({"students": students_df}))
+    for key, err in list(sheet_snapshots().errors.items()):
+        st.caption(f"Serving last snapshot of {key}; refresh failed: {err}")
+    st.caption("Memory")
+    st.table(memory_report(st.session_state))
+    st.caption("Shared references (process-wide)")
+    st.json(reference_store().stats())
+    st.caption("Firestore (process-wide client)")
+    if st.button("Check Firestore"):
+        firestore_health()
+    st.json(firestore_stats())
+    st.caption("Scores webhook")
+    st.json(WEBHOOK_CLIENT.stats())
+    st.caption("Marking queue prefetch")
+    st.json(student_prefetcher().stats())
+    st.caption("Saved rows index")
+    st.json(save_index().stats())
+    st.caption("Submission search index")
+    search_index = open_search_indexes().get(tuple(levels))
+    if search_index:
+        st.json(search_index.stats())
+    else:
+        st.caption("Not opened yet; the first search opens it.")
+    if marker:
+        st.caption("Auto-marker")
+        st.json(marker.stats())
@@ -0,0 +1,153 @@
+"""Resolve a submission's assignment name to its answers-dictionary key.
+
+Submissions name their assignment loosely ("a2 4.10", "Assignment 10",
+"Tourismus und traditionelle Feste" with chapter "4.10", ...), while the
+answers dictionary uses keys like ``"A2 4.10 Tourismus und Traditionelle
+Feste"``.  :class:`AssignmentIndex` precomputes three lookups over the keys
+so resolving a name is a few dictionary hits:
+
+* the fully normalized name (case, umlauts, punctuation, filler words);
+* ``(level, number)`` for chapter numbers such as ``0.1`` or ``4.10``,
+  plus the last part of the number (``10``) when it is unique in the level;
+* title tokens, including every one-letter-deleted variant of each token,
+  so a typo in one word still finds its candidates in constant time.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from text_fold import fold_umlauts
+
+LEVEL_RE = re.compile(r"\b([abc][12])\b")
+NUMBER_RE = re.compile(r"(?<![\w.])(\d+(?:[.,]\d+)?)(?![\w.])")
+FILLER_WORDS = {
+    "assignment", "aufgabe", "lektion", "lesson", "chapter", "kapitel", "schreiben",
+    "und", "oder", "der", "die", "das", "den", "dem", "ein", "eine", "in", "im", "auf",
+    "zu", "zur", "zum", "fuer", "mit", "vs", "wie", "was", "wo", "the", "and", "of",
+}
+MIN_FUZZY_SCORE = 0.5
+
+
+def fold(text: str) -> str:
+    """Lowercase, spell out umlauts and turn punctuation (except ``.`` in numbers) into spaces."""
+    s = re.sub(r"(\d),(\d)", r"\1.\2", fold_umlauts(text))
+    s = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", s)
+    s = re.sub(r"[^\w.]+", " ", s)
+    return " ".join(s.split())
+
+
+def normalize_number(number: str) -> str:
+    """``"04.10"`` -> ``"4.10"``; ``"4,1"`` -> ``"4.1"``."""
+    return ".".join(str(int(part)) for part in number.replace(",", ".").split("."))
+
+
+def _parts(folded: str) -> Tuple[str, List[str], List[str]]:
+    """Level, chapter numbers and title tokens of already :func:`fold`-ed text."""
+    level_m = LEVEL_RE.search(folded)
+    numbers = [normalize_number(n) for n in NUMBER_RE.findall(folded)]
+    tokens = [
+        t for t in folded.split()
+        if t not in FILLER_WORDS and not LEVEL_RE.fullmatch(t) and not t.replace(".", "").isdigit()
+    ]
+    return (level_m.group(1).upper() if level_m else ""), numbers, tokens
+
+
+def normalize_assignment(text: str) -> str:
+    """Canonical form used for exact matches: level, numbers and title tokens."""
+    level, numbers, tokens = _parts(fold(text))
+    return " ".join(p.lower() for p in [level] + numbers + tokens if p)
+
+
+def _deletions(token: str) -> Set[str]:
+    if len(token) < 4:
+        return set()
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+class AssignmentIndex:
+    """Precomputed lookups from loose assignment names to dictionary keys."""
+
+    def __init__(self, keys: Iterable[str]) -> None:
+        self.keys = list(keys)
+        self._exact: Dict[str, str] = {}
+        self._by_number: Dict[Tuple[str, str], Set[str]] = {}
+        self._tokens: Dict[str, Set[str]] = {}
+        self._variants: Dict[str, Set[str]] = {}
+        self._key_tokens: Dict[str, Set[str]] = {}
+        self._key_level: Dict[str, str] = {}
+
+        short_numbers: Dict[Tuple[str, str], Set[str]] = {}
+        for key in self.keys:
+            self._exact.setdefault(normalize_assignment(key), key)
+            level, numbers, tokens_list = _parts(fold(key))
+            self._key_level[key] = level
+            if numbers:
+                self._by_number.setdefault((level, numbers[0]), set()).add(key)
+                if "." in numbers[0]:
+                    short = numbers[0].rsplit(".", 1)[1]
+                    short_numbers.setdefault((level, short), set()).add(key)
+            tokens = set(tokens_list)
+            self._key_tokens[key] = tokens
+            for token in tokens:
+                self._tokens.setdefault(token, set()).add(key)
+                for variant in _deletions(token):
+                    self._variants.setdefault(variant, set()).add(token)
+        self._levels = sorted(set(self._key_level.values()))
+        # "A2 Assignment 10" -> "A2 4.10" when 10 is unique in the level and
+        # not itself a full chapter number there.
+        for level_number, keys in short_numbers.items():
+            if len(keys) == 1 and level_number not in self._by_number:
+                self._by_number[level_number] = keys
+
+    def level(self, key: str) -> str:
+        """The level (``"A1"``...) named in a dictionary key, or ``""``."""
+        return self._key_level.get(key, "")
+
+    def _token_matches(self, token: str) -> Set[str]:
+        """Dictionary tokens equal to ``token`` or one insertion/deletion/substitution away."""
+        found = {token} if token in self._tokens else set()
+        found |= self._variants.get(token, set())
+        for variant in _deletions(token):
+            if variant in self._tokens:
+                found.add(variant)
+            found |= self._variants.get(variant, set())
+        return found
+
+    def match(self, assignment: str, chapter: str = "", level: str = "") -> Tuple[Optional[str], str]:
+        """Return ``(key, how)`` with ``how`` in ``exact``/``number``/``fuzzy``, or ``(None, "")``."""
+        a_level, a_numbers, a_tokens = _parts(fold(assignment))
+        exact = self._exact.get(" ".join(p.lower() for p in [a_level] + a_numbers + a_tokens if p))
+        if exact:
+            return exact, "exact"
+
+        c_level, c_numbers, c_tokens = _parts(fold(chapter)) if chapter else ("", [], [])
+        lvl = a_level or (_parts(fold(level))[0] if level else "") or c_level
+        levels = [lvl] if lvl else self._levels
+        for number in a_numbers + c_numbers:
+            hits = [k for l in levels for k in self._by_number.get((l, number), ())]
+            if len(hits) == 1:
+                return hits[0], "number"
+
+        query = set(a_tokens) or set(c_tokens)
+        scores: Dict[str, int] = {}
+        for token in query:
+            keys = set().union(*(self._tokens[t] for t in self._token_matches(token)))
+            for key in keys:
+                if not lvl or self._key_level[key] == lvl:
+                    scores[key] = scores.get(key, 0) + 1
+        if not scores:
+            return None, ""
+        ranked = sorted(
+            ((2 * hits / (len(query) + len(self._key_tokens[k])), k) for k, hits in scores.items()),
+            reverse=True,
+        )
+        best_score, best = ranked[0]
+        if best_score < MIN_FUZZY_SCORE or (len(ranked) > 1 and ranked[1][0] == best_score):
+            return None, ""
+        return best, "fuzzy"
+
+    def resolve(self, assignment: str, chapter: str = "", level: str = "") -> Optional[str]:
+        """The dictionary key for a submission's assignment, or ``None``."""
+        return self.match(assignment, chapter, level)[0]
@@ -0,0 +1,201 @@
+"""Background marking of submissions as they arrive in Firestore.
+
+:class:`AutoMarker` listens to ``submissions/{level}/posts`` with
+``on_snapshot`` and queues every new or edited post.  A single worker
+thread marks the queue one post at a time (optionally pausing between
+posts), so a burst of submissions is spread out instead of competing with
+page reruns.  Each result is stored as a provisional score in its own
+collection, keyed by level and post id, for a teacher to review.
+
+Marking itself is injected: ``mark(level, post_id, data)`` returns the
+fields to store or ``None`` when the post cannot be marked automatically.
+
+One marker serves the whole process; :meth:`AutoMarker.watch_levels` adds
+and removes level subscriptions as the roster changes.  The first snapshot
+of a level is the backlog of old posts and is not queued, except posts
+submitted after the marker last ran (by ``posted_at``) that have no
+provisional score yet.  Provisional scores are read one post at a time
+when a post is marked, never as a whole collection.
+
+Run it on one replica only: every running marker marks every post.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+PROVISIONAL_COLLECTION = "provisional_scores"
+
+Mark = Callable[[str, str, Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+def provisional_id(level: str, post_id: str) -> str:
+    """Document id of the provisional score for one post."""
+    return f"{level}__{post_id}"
+
+
+def post_hash(data: Dict[str, Any]) -> str:
+    """Hash of a post's content, used to skip posts that were already marked."""
+    raw = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class AutoMarker:
+    """Mark new posts of ``levels`` in the background and store provisional scores."""
+
+    def __init__(
+        self,
+        db: Any,
+        levels: Iterable[str],
+        mark: Mark,
+        collection: str = PROVISIONAL_COLLECTION,
+        min_interval: float = 0.0,
+        sleep: Callable[[float], None] = time.sleep,
+        posted_at: Optional[Callable[[Dict[str, Any]], float]] = None,
+    ) -> None:
+        self.db = db
+        self.levels = [lvl for lvl in levels if lvl]
+        self.mark = mark
+        self.posted_at = posted_at  # seconds since the epoch a post was submitted, 0 if unknown
+        self.last_run = 0.0
+        self.collection = collection
+        self.min_interval = min_interval
+        self._sleep = sleep
+        self._queue: "queue.Queue[Optional[Tuple[str, str, Dict[str, Any]]]]" = queue.Queue()
+        self._done: Dict[str, str] = {}
+        self._watches: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.counters = {"queued": 0, "marked": 0, "unchanged": 0, "not markable": 0, "old posts": 0, "errors": 0}
+        self.last_error = ""
+
+    # ---------------- lifecycle ----------------
+    def start(self) -> "AutoMarker":
+        """Find when the last mark was made, start the worker and subscribe to ``levels``."""
+        if self._thread is not None:
+            return self
+        latest = self.db.collection(self.collection).order_by("marked_at", direction="DESCENDING").limit(1)
+        for snap in latest.stream():
+            self.last_run = float((snap.to_dict() or {}).get("marked_at") or 0)
+        self.last_run = self.last_run or time.time()
+        self._thread = threading.Thread(target=self._work, name="auto-marker", daemon=True)
+        self._thread.start()
+        self.watch_levels(self.levels)
+        return self
+
+    def watch_levels(self, levels: Iterable[str]) -> "AutoMarker":
+        """Subscribe to the posts of ``levels`` and drop the subscriptions of other levels."""
+        wanted = [lvl for lvl in levels if lvl]
+        with self._lock:
+            for level in [lvl for lvl in self._watches if lvl not in wanted]:
+                self._watches.pop(level).unsubscribe()
+            for level in wanted:
+                if level not in self._watches:
+                    posts = self.db.collection("submissions").document(level).collection("posts")
+                    self._watches[level] = posts.on_snapshot(self._listener(level))
+            self.levels = sorted(self._watches)
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Unsubscribe and let the worker finish what is queued."""
+        self.watch_levels(())
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def drain(self) -> None:
+        """Block until every queued post has been processed."""
+        self._queue.join()
+
+    # ---------------- internals ----------------
+    def _listener(self, level: str) -> Callable:
+        first = True
+
+        def on_snapshot(docs: Any, changes: Any, read_time: Any) -> None:
+            nonlocal first
+            backlog, first = first, False
+            for change in changes:
+                if change.type.name not in ("ADDED", "MODIFIED"):
+                    continue
+                doc = change.document
+                data = doc.to_dict() or {}
+                if backlog and not self._missed(level, doc.id, data):
+                    self.counters["old posts"] += 1
+                    continue
+                self.counters["queued"] += 1
+                self._queue.put((level, doc.id, data))
+
+        return on_snapshot
+
+    def _missed(self, level: str, post_id: str, data: Dict[str, Any]) -> bool:
+        """Whether a post of the first snapshot arrived after the last run and is unmarked."""
+        if self.posted_at is None:
+            return False
+        try:
+            return self.posted_at(data) > self.last_run and self._marked_hash(level, post_id) is None
+        except Exception:
+            return False
+
+    def _marked_hash(self, level: str, post_id: str) -> Optional[str]:
+        """``source_hash`` of the post's provisional score, read once and then remembered."""
+        doc_id = provisional_id(level, post_id)
+        if doc_id not in self._done:
+            snap = self.db.collection(self.collection).document(doc_id).get()
+            self._done[doc_id] = ((snap.to_dict() or {}) if snap.exists else {}).get("source_hash", "")
+        return self._done[doc_id] or None
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._process(*item) and self.min_interval:
+                    self._sleep(self.min_interval)
+            finally:
+                self._queue.task_done()
+
+    def _process(self, level: str, post_id: str, data: Dict[str, Any]) -> bool:
+        """Mark one post; returns ``True`` when marking actually ran."""
+        doc_id = provisional_id(level, post_id)
+        digest = post_hash(data)
+        try:
+            if self._marked_hash(level, post_id) == digest:
+                self.counters["unchanged"] += 1
+                return False
+            result = self.mark(level, post_id, data)
+            if result is None:
+                self.counters["not markable"] += 1
+            else:
+                doc = dict(
+                    result,
+                    level=level,
+                    post_id=post_id,
+                    post_path=f"submissions/{level}/posts/{post_id}",
+                    source_hash=digest,
+                    marked_at=time.time(),
+                    status="provisional",
+                )
+                self.db.collection(self.collection).document(doc_id).set(doc)
+                self.counters["marked"] += 1
+            self._done[doc_id] = digest
+        except Exception as e:  # keep listening; the post is retried when it changes
+            self.counters["errors"] += 1
+            self.last_error = str(e)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            self.counters,
+            levels=", ".join(self.levels),
+            last_run=self.last_run,
+            backlog=self._queue.qsize(),
+            running=self._thread is not None and self._thread.is_alive(),
+            last_error=self.last_error,
+        )
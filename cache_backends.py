@@ -0,0 +1,294 @@
+"""Cache backends that can be shared between Streamlit replicas.
+
+Every backend stores raw bytes under string keys with an optional TTL.
+:class:`SharedCache` layers pickling and namespace-wide invalidation on
+top: each namespace has a generation counter stored in the backend itself,
+so bumping it from one replica makes every replica miss on the old entries.
+The old entries are then deleted where the backend can enumerate keys, and
+expired ones are swept every ``SWEEP_INTERVAL`` seconds on write (memcached
+evicts both by itself).
+"""
+
+from __future__ import annotations
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+SWEEP_INTERVAL = 60.0  # seconds between sweeps of expired entries
+
+
+class CacheBackend:
+    """Interface shared by all backends."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        """Atomically add one to an integer counter (created at 0) and return it."""
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix: str) -> int:
+        """Delete every key starting with ``prefix``; returns how many (0 if unsupported)."""
+        return 0
+
+    def sweep(self) -> int:
+        """Delete expired entries; returns how many (0 if the store expires them itself)."""
+        return 0
+
+
+class InProcessBackend(CacheBackend):
+    """Plain dictionary; only shared by the sessions of one process."""
+
+    def __init__(self) -> None:
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+        self._swept = time.time()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            value, expires = hit
+            if expires is not None and expires <= time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+        if time.time() - self._swept > SWEEP_INTERVAL:
+            self.sweep()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value, expires = self._data.get(key, (b"0", None))
+            n = int(value) + 1
+            self._data[key] = (str(n).encode(), expires)
+            return n
+
+    def delete_prefix(self, prefix: str) -> int:
+        with self._lock:
+            keys = [k for k in self._data if k.startswith(prefix)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def sweep(self) -> int:
+        now = time.time()
+        with self._lock:
+            self._swept = now
+            keys = [k for k, (_, expires) in self._data.items() if expires is not None and expires <= now]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+
+class SQLiteBackend(CacheBackend):
+    """SQLite file shared by every replica that can see the same disk."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        self._swept = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute(
+            "SELECT value, expires FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires is not None and expires <= time.time():
+            self.delete(key)
+            return None
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, sqlite3.Binary(value), time.time() + ttl if ttl else None),
+            )
+        if time.time() - self._swept > SWEEP_INTERVAL:
+            self.sweep()
+
+    def delete(self, key: str) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key: str) -> int:
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO cache (key, value, expires) VALUES (?, '1', NULL) "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(CAST(value AS INTEGER) + 1 AS TEXT)",
+                (key,),
+            )
+            row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        return int(row[0])
+
+    def delete_prefix(self, prefix: str) -> int:
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with self._conn() as conn:
+            return conn.execute("DELETE FROM cache WHERE key LIKE ? ESCAPE '\\'", (pattern,)).rowcount
+
+    def sweep(self) -> int:
+        self._swept = time.time()
+        with self._conn() as conn:
+            return conn.execute(
+                "DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (self._swept,)
+            ).rowcount
+
+
+class LocalMemcacheClient:
+    """In-memory stand-in with the subset of the ``pymemcache`` client API we use.
+
+    Useful for development and tests; several :class:`MemcacheBackend`
+    instances sharing one client behave like replicas sharing a server.
+    """
+
+    def __init__(self) -> None:
+        self._backend = InProcessBackend()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._backend.get(key)
+
+    def set(self, key: str, value: bytes, expire: int = 0) -> bool:
+        self._backend.set(key, value, ttl=expire or None)
+        return True
+
+    def delete(self, key: str) -> bool:
+        self._backend.delete(key)
+        return True
+
+    def add(self, key: str, value: bytes, expire: int = 0) -> bool:
+        if self._backend.get(key) is not None:
+            return False
+        return self.set(key, value, expire)
+
+    def incr(self, key: str, value: int) -> Optional[int]:
+        with self._lock:
+            raw = self._backend.get(key)
+            if raw is None:
+                return None
+            n = int(raw) + value
+            self._backend.set(key, str(n).encode())
+            return n
+
+
+class MemcacheBackend(CacheBackend):
+    """Backend on top of a memcached client (``pymemcache`` or the local stand-in)."""
+
+    def __init__(self, client: Any) -> None:
+        self.client = client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        # memcached treats expire=0 as "never"; round short TTLs up to a second
+        self.client.set(key, value, expire=max(int(ttl), 1) if ttl else 0)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+    def incr(self, key: str) -> int:
+        n = self.client.incr(key, 1)
+        if n is None:
+            self.client.add(key, b"0")
+            n = self.client.incr(key, 1)
+        return int(n)
+
+
+def make_backend(kind: str = "memory", sqlite_path: str = ".cache/shared.sqlite", memcache_server: str = "") -> CacheBackend:
+    """Build a backend from configuration.
+
+    ``kind`` is one of ``"memory"``, ``"sqlite"``, ``"memcache"`` (needs
+    ``pymemcache`` and ``memcache_server`` as ``host:port``) or
+    ``"memcache-local"`` for the in-memory stand-in.
+    """
+    kind = (kind or "memory").strip().lower()
+    if kind == "memory":
+        return InProcessBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(sqlite_path)
+    if kind == "memcache-local":
+        return MemcacheBackend(LocalMemcacheClient())
+    if kind == "memcache":
+        from pymemcache.client.base import Client  # optional dependency
+
+        host, _, port = memcache_server.partition(":")
+        return MemcacheBackend(Client((host or "localhost", int(port or 11211))))
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+
+class SharedCache:
+    """Pickled values in one namespace of a backend, invalidated as a whole."""
+
+    def __init__(self, backend: CacheBackend, namespace: str) -> None:
+        self.backend = backend
+        self.namespace = namespace
+
+    def _generation(self) -> int:
+        raw = self.backend.get(f"gen:{self.namespace}")
+        return int(raw) if raw else 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{self._generation()}:{key}"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raw = self.backend.get(self._key(key))
+        return default if raw is None else pickle.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.backend.set(self._key(key), pickle.dumps(value), ttl)
+
+    def delete(self, key: str) -> None:
+        """Drop one entry for all replicas."""
+        self.backend.delete(self._key(key))
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Return the cached value for ``key`` or call ``loader`` and store its result."""
+        full_key = self._key(key)
+        raw = self.backend.get(full_key)
+        if raw is not None:
+            return pickle.loads(raw)
+        value = loader()
+        self.backend.set(full_key, pickle.dumps(value), ttl)
+        return value
+
+    def invalidate(self) -> int:
+        """Drop every entry of this namespace for all replicas; returns the new generation."""
+        generation = self.backend.incr(f"gen:{self.namespace}")
+        self.backend.delete_prefix(f"{self.namespace}:")
+        return generation
@@ -0,0 +1,160 @@
+"""Offline similarity scoring of essay submissions against their reference text.
+
+Essays and references are turned into character n-gram TF-IDF vectors
+(sparse, L2-normalised) and each essay is compared with its own
+reference in a single sparse element-wise product, so a whole level's
+backlog is scored in one pass on the CPU without any network model.
+Character n-grams are forgiving of the spelling and umlaut variations
+typical of learner German.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from text_fold import fold_umlauts
+
+NGRAM_RANGE = (3, 5)
+
+
+def fold_text(text: str) -> str:
+    """:func:`text_fold.fold_umlauts`, with punctuation dropped and spaces padded."""
+    s = re.sub(r"[^\w\s]+", " ", fold_umlauts(text))
+    return " " + re.sub(r"\s+", " ", s).strip() + " "
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> List[str]:
+    """Return the character n-grams of the folded ``text`` (for inspection)."""
+    s = fold_text(text)
+    lo, hi = ngram_range
+    return [s[i:i + n] for n in range(lo, hi + 1) for i in range(len(s) - n + 1)]
+
+
+class CharNgramTfidf:
+    """Hashed character n-gram TF-IDF vectoriser producing CSR matrices.
+
+    N-grams are never materialised as strings.  The folded texts of a chunk
+    are joined into one array of code points and every n-gram is hashed
+    (FNV-1a over its code points, computed for all positions at once) into
+    one of ``n_features`` columns, so building the matrix is a handful of
+    NumPy operations per n-gram length and needs no vocabulary.  Hash
+    collisions are rare at the default 2**20 columns and only blur
+    similarity slightly.  Documents are processed ``chunk_size`` at a time to
+    keep peak memory bounded.
+    """
+
+    _FNV_OFFSET = np.uint64(14695981039346656037)
+    _FNV_PRIME = np.uint64(1099511628211)
+
+    def __init__(
+        self,
+        ngram_range: Tuple[int, int] = NGRAM_RANGE,
+        n_features: int = 2 ** 20,
+        sublinear_tf: bool = True,
+        chunk_size: int = 2000,
+    ) -> None:
+        self.ngram_range = ngram_range
+        self.n_features = n_features
+        self.sublinear_tf = sublinear_tf
+        self.chunk_size = chunk_size
+        self.idf = np.ones(n_features)
+
+    def _chunk_counts(self, texts: Sequence[str]) -> sparse.csr_matrix:
+        folded = [fold_text(t) for t in texts]
+        lengths = np.fromiter((len(t) for t in folded), dtype=np.int64, count=len(folded))
+        codes = np.frombuffer("".join(folded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        doc = np.repeat(np.arange(len(folded)), lengths)
+
+        docs, cols = [], []
+        lo, hi = self.ngram_range
+        with np.errstate(over="ignore"):
+            for n in range(lo, hi + 1):
+                m = len(codes) - n + 1
+                if m <= 0:
+                    continue
+                h = np.full(m, self._FNV_OFFSET, dtype=np.uint64)
+                for k in range(n):
+                    h = (h ^ codes[k:k + m]) * self._FNV_PRIME
+                ok = doc[:m] == doc[n - 1:]  # n-gram does not straddle two texts
+                docs.append(doc[:m][ok])
+                cols.append((h[ok] % np.uint64(self.n_features)).astype(np.int64))
+        if not cols:
+            return sparse.csr_matrix((len(texts), self.n_features))
+        docs_a, cols_a = np.concatenate(docs), np.concatenate(cols)
+        # duplicate (doc, col) entries are summed into term counts
+        return sparse.csr_matrix(
+            (np.ones(len(cols_a)), (docs_a, cols_a)), shape=(len(texts), self.n_features)
+        )
+
+    def _counts(self, texts: Sequence[str]) -> sparse.csr_matrix:
+        texts = list(texts)
+        if not texts:
+            return sparse.csr_matrix((0, self.n_features))
+        chunks = [
+            self._chunk_counts(texts[i:i + self.chunk_size])
+            for i in range(0, len(texts), self.chunk_size)
+        ]
+        return sparse.vstack(chunks, format="csr")
+
+    def _weight(self, X: sparse.csr_matrix) -> sparse.csr_matrix:
+        if self.sublinear_tf:
+            np.log1p(X.data, out=X.data)
+        X.data *= self.idf[X.indices]
+        norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.csr_matrix(sparse.diags(1.0 / norms) @ X)
+
+    def fit_transform(self, texts: Sequence[str]) -> sparse.csr_matrix:
+        """Learn smoothed IDF weights from ``texts`` and return their rows."""
+        counts = self._counts(texts)
+        df = np.bincount(counts.indices, minlength=self.n_features)
+        self.idf = np.log((1 + counts.shape[0]) / (1 + df)) + 1.0
+        return self._weight(counts)
+
+    def fit(self, texts: Sequence[str]) -> "CharNgramTfidf":
+        self.fit_transform(texts)
+        return self
+
+    def transform(self, texts: Sequence[str]) -> sparse.csr_matrix:
+        """Return L2-normalised TF-IDF rows for ``texts``."""
+        return self._weight(self._counts(texts))
+
+
+def essay_similarities(essays: Sequence[str], references: Sequence[str], ref_index: Sequence[int]) -> np.ndarray:
+    """Cosine similarity of each essay to ``references[ref_index[i]]``.
+
+    All essays are scored together: both matrices share one feature space and
+    the per-pair dot products come from a single sparse element-wise product.
+    """
+    if not len(essays):
+        return np.zeros(0)
+    X = CharNgramTfidf().fit_transform(list(references) + list(essays))
+    R, E = X[: len(references)], X[len(references):]
+    paired = R[np.asarray(ref_index, dtype=np.int64)]
+    return np.asarray(E.multiply(paired).sum(axis=1)).ravel()
+
+
+def rank_essays(items: Sequence[Dict[str, Any]], references: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Score ``items`` against their reference and return them most similar first.
+
+    Each item needs ``"text"`` and ``"reference"`` (a key of ``references``);
+    other fields are passed through.  Items whose reference is unknown are
+    left out.  The result adds ``"similarity"`` (0..1) and ``"rank"``.
+    """
+    ref_keys = list(references)
+    ref_pos = {k: i for i, k in enumerate(ref_keys)}
+    usable = [it for it in items if it.get("reference") in ref_pos]
+    sims = essay_similarities(
+        [it.get("text", "") for it in usable],
+        [references[k] for k in ref_keys],
+        [ref_pos[it["reference"]] for it in usable],
+    )
+    order = np.argsort(-sims, kind="stable")
+    ranked = []
+    for rank, i in enumerate(order, start=1):
+        ranked.append(dict(usable[i], similarity=round(float(sims[i]), 3), rank=rank))
+    return ranked
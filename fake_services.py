@@ -0,0 +1,396 @@
+"""Local stand-ins for Firestore and the Apps Script webhook.
+
+Both fakes can inject latency and failures so the save and load paths can
+be exercised (and load-tested) without touching Google.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class FakeFirestoreError(RuntimeError):
+    """Injected failure raised by :class:`FakeFirestore` operations."""
+
+
+class _Faults:
+    def __init__(self, latency: float, error_rate: float, seed: Optional[int]) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def apply(self, op: str) -> None:
+        with self._lock:
+            fail = self._rng.random() < self.error_rate
+            # +/-50% jitter around the configured latency
+            delay = self.latency * (0.5 + self._rng.random()) if self.latency else 0
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeFirestoreError(f"injected {op} failure")
+
+
+class FakeSnapshot:
+    """What ``stream()`` and ``get()`` yield: an id plus a ``to_dict()``."""
+
+    def __init__(self, doc_id: str, data: Optional[Dict[str, Any]], reference: "FakeDocument") -> None:
+        self.id = doc_id
+        self._data = data
+        self.reference = reference
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return None if self._data is None else dict(self._data)
+
+
+class FakeChange:
+    """One entry of ``on_snapshot`` ``changes`` (``type.name`` is ADDED/MODIFIED/REMOVED)."""
+
+    class _Type:
+        def __init__(self, name: str) -> None:
+            self.name = name
+
+    def __init__(self, kind: str, document: FakeSnapshot) -> None:
+        self.type = self._Type(kind)
+        self.document = document
+
+
+class FakeWatch:
+    """Handle returned by ``on_snapshot``; ``unsubscribe()`` stops callbacks."""
+
+    def __init__(self, collection: "FakeCollection", callback: Callable) -> None:
+        self._collection = collection
+        self.callback = callback
+
+    def unsubscribe(self) -> None:
+        self._collection._watchers.discard(self)
+
+
+class FakeDocument:
+    def __init__(self, db: "FakeFirestore", path: Tuple[str, ...]) -> None:
+        self._db = db
+        self._path = path
+        self.id = path[-1]
+
+    @property
+    def path(self) -> str:
+        return "/".join(self._path)
+
+    def collection(self, name: str) -> "FakeCollection":
+        return FakeCollection(self._db, self._path + (name,))
+
+    def get(self) -> FakeSnapshot:
+        self._db._faults.apply("get")
+        with self._db._lock:
+            data = self._db._docs.get(self._path)
+        return FakeSnapshot(self.id, data, self)
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        self._db._faults.apply("set")
+        self._db._write(self._path, dict(data), merge)
+
+    def update(self, data: Dict[str, Any]) -> None:
+        self._db._faults.apply("update")
+        with self._db._lock:
+            if self._path not in self._db._docs:
+                raise FakeFirestoreError(f"No document to update: {self.path}")
+        self._db._write(self._path, dict(data), merge=True)
+
+    def delete(self) -> None:
+        self._db._faults.apply("delete")
+        self._db._remove(self._path)
+
+
+class FakeQuery:
+    def __init__(
+        self,
+        collection: "FakeCollection",
+        filters=(),
+        limit: Optional[int] = None,
+        order: Optional[Tuple[str, str]] = None,
+    ) -> None:
+        self._collection = collection
+        self._filters = list(filters)
+        self._limit = limit
+        self._order = order
+
+    def where(self, field: str, op: str, value: Any) -> "FakeQuery":
+        if op not in ("==", "in"):
+            raise NotImplementedError(f"FakeFirestore supports == and in, not {op}")
+        return FakeQuery(self._collection, self._filters + [(field, op, value)], self._limit, self._order)
+
+    def limit(self, n: int) -> "FakeQuery":
+        return FakeQuery(self._collection, self._filters, n, self._order)
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "FakeQuery":
+        """Like Firestore, documents without ``field`` are left out."""
+        return FakeQuery(self._collection, self._filters, self._limit, (field, direction))
+
+    def _matches(self, data: Dict[str, Any]) -> bool:
+        for field, op, value in self._filters:
+            if op == "==" and data.get(field) != value:
+                return False
+            if op == "in" and data.get(field) not in value:
+                return False
+        return True
+
+    def stream(self) -> Iterator[FakeSnapshot]:
+        db = self._collection._db
+        db._faults.apply("stream")
+        snaps = [
+            FakeSnapshot(doc_id, data, self._collection.document(doc_id))
+            for doc_id, data in self._collection._items()
+            if self._matches(data) and (self._order is None or self._order[0] in data)
+        ]
+        if self._order is not None:
+            field, direction = self._order
+            snaps.sort(key=lambda s: s.to_dict()[field], reverse=direction == "DESCENDING")
+        return iter(snaps[: self._limit] if self._limit is not None else snaps)
+
+    def get(self) -> List[FakeSnapshot]:
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db: "FakeFirestore", path: Tuple[str, ...]) -> None:
+        super().__init__(self)
+        self._db = db
+        self._path = path
+        self.id = path[-1]
+        self._watchers = db._watchers.setdefault(path, set())
+
+    def document(self, doc_id: Optional[str] = None) -> FakeDocument:
+        return FakeDocument(self._db, self._path + (doc_id or self._db._new_id(),))
+
+    def add(self, data: Dict[str, Any]) -> Tuple[float, FakeDocument]:
+        self._db._faults.apply("add")
+        ref = self.document()
+        self._db._write(ref._path, dict(data), merge=False)
+        return time.time(), ref
+
+    def _items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        with self._db._lock:
+            return [
+                (path[-1], dict(data))
+                for path, data in self._db._docs.items()
+                if path[:-1] == self._path
+            ]
+
+    def on_snapshot(self, callback: Callable) -> FakeWatch:
+        """Call ``callback(docs, changes, read_time)`` now and after every change."""
+        watch = FakeWatch(self, callback)
+        self._watchers.add(watch)
+        docs = [FakeSnapshot(i, d, self.document(i)) for i, d in self._items()]
+        callback(docs, [FakeChange("ADDED", s) for s in docs], time.time())
+        return watch
+
+
+class FakeBatch:
+    def __init__(self, db: "FakeFirestore") -> None:
+        self._db = db
+        self._ops: List[Callable[[], None]] = []
+
+    def set(self, ref: FakeDocument, data: Dict[str, Any], merge: bool = False) -> None:
+        self._ops.append(lambda: self._db._write(ref._path, dict(data), merge))
+
+    def update(self, ref: FakeDocument, data: Dict[str, Any]) -> None:
+        self._ops.append(lambda: self._db._write(ref._path, dict(data), merge=True))
+
+    def delete(self, ref: FakeDocument) -> None:
+        self._ops.append(lambda: self._db._remove(ref._path))
+
+    def commit(self) -> None:
+        if len(self._ops) > 500:
+            raise FakeFirestoreError("A batch can contain at most 500 writes")
+        self._db._faults.apply("commit")
+        self._db.batches_committed += 1
+        for op in self._ops:
+            op()
+        self._ops = []
+
+
+class FakeFirestore:
+    """In-memory client with the subset of the Firestore API the app uses.
+
+    ``latency`` (seconds, jittered) and ``error_rate`` (0..1) apply to every
+    read and write.  ``writes`` counts stored documents, which makes it easy
+    to assert how many writes a job spent.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None) -> None:
+        self._docs: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        self._watchers: Dict[Tuple[str, ...], set] = {}
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._faults = _Faults(latency, error_rate, seed)
+        self.writes = 0
+        self.batches_committed = 0
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, (name,))
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+    def get_all(self, references: Iterable[FakeDocument]) -> Iterator[FakeSnapshot]:
+        """Read several documents in one round trip, like ``Client.get_all``."""
+        self._faults.apply("get_all")
+        with self._lock:
+            found = [(ref, self._docs.get(ref._path)) for ref in references]
+        for ref, data in found:
+            yield FakeSnapshot(ref.id, data, ref)
+
+    def _new_id(self) -> str:
+        return f"doc{next(self._ids):06d}"
+
+    def _write(self, path: Tuple[str, ...], data: Dict[str, Any], merge: bool) -> None:
+        with self._lock:
+            existed = path in self._docs
+            if merge and existed:
+                data = dict(self._docs[path], **data)
+            self._docs[path] = data
+            self.writes += 1
+        self._notify(path, "MODIFIED" if existed else "ADDED", data)
+
+    def _remove(self, path: Tuple[str, ...]) -> None:
+        with self._lock:
+            data = self._docs.pop(path, None)
+            self.writes += 1
+        if data is not None:
+            self._notify(path, "REMOVED", data)
+
+    def _notify(self, path: Tuple[str, ...], kind: str, data: Dict[str, Any]) -> None:
+        watchers = list(self._watchers.get(path[:-1], ()))
+        if not watchers:
+            return
+        ref = FakeDocument(self, path)
+        snap = FakeSnapshot(path[-1], data, ref)
+        for watch in watchers:
+            watch.callback([snap], [FakeChange(kind, snap)], time.time())
+
+
+# ---------------------------------------------------------------------------
+# Apps Script webhook
+# ---------------------------------------------------------------------------
+
+
+class FakeAppsScriptServer:
+    """Threaded local HTTP server that behaves like the Scores webhook.
+
+    ``POST /`` accepts ``{"token": ..., "row": {...}}``, appends the row
+    and answers ``{"ok": true}``, like the deployed script.  ``latency`` delays every answer, ``error_rate``
+    turns answers into 500s and ``quota_per_min`` answers 429 (with
+    ``Retry-After``) once more requests than that arrived in the last
+    60 seconds, like Apps Script's execution quota.  Rows received are kept
+    in ``rows``.  ``GET /`` serves ``csv`` so sheet downloads can be faked
+    too.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        quota_per_min: int = 0,
+        token: str = "",
+        csv: bytes = b"",
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.quota_per_min = quota_per_min
+        self.token = token
+        self.csv = csv
+        self.rows: List[Dict[str, Any]] = []
+        self.status_counts: Dict[int, int] = {}
+        self._recent: deque = deque()
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "FakeAppsScriptServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeAppsScriptServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def _decide(self, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if self.quota_per_min and len(self._recent) >= self.quota_per_min:
+                status = 429
+            elif self._rng.random() < self.error_rate:
+                status = 500
+            elif self.token and payload.get("token") != self.token:
+                status = 403
+            else:
+                status = 200
+                self._recent.append(now)
+                self._store(payload)
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            delay = self.latency * (0.5 + self._rng.random()) if self.latency else 0
+        return status, {"ok": status == 200, "delay": delay}
+
+    def _store(self, payload: Dict[str, Any]) -> None:
+        self.rows.append(payload.get("row") or {})
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args: Any) -> None:  # keep test output quiet
+                pass
+
+            def _reply(self, status: int, body: bytes, content_type: str, headers=()) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in headers:
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                self._reply(200, fake.csv, "text/csv")
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    payload = {}
+                status, info = fake._decide(payload)
+                if info["delay"]:
+                    time.sleep(info["delay"])
+                headers = [("Retry-After", "1")] if status == 429 else []
+                body = json.dumps({"ok": info["ok"]}).encode()
+                self._reply(status, body, "application/json", headers)
+
+        return Handler
@@ -2,37 +2,108 @@
 
 from __future__ import annotations
 
+import threading
+import time
+
 import firebase_admin
 from firebase_admin import credentials, firestore
 import streamlit as st
 
+# One client per process: the client owns the gRPC channel pool, so every
+# session and rerun shares the same connections.
+_client = None
+_client_lock = threading.Lock()
+_client_stats = {"created": 0, "created_at": 0.0, "last_health": None}
+
 
 def get_firestore_client():
-    """Return a Firestore client, initializing Firebase if needed.
+    """Return the process-wide Firestore client, initializing Firebase if needed.
 
     The function attempts to obtain the default Firebase app using
     :func:`firebase_admin.get_app`.  If no app has been initialized yet a
     ``ValueError`` is raised, in which case we try to initialize it with
     credentials loaded from ``st.secrets['firebase']``.  When initialization
-    cannot be completed (e.g. missing secrets) ``None`` is returned.
+    cannot be completed (e.g. missing secrets) ``None`` is returned and the
+    next call tries again.  A successfully created client is cached for the
+    lifetime of the process.
     """
 
-    try:
-        app = firebase_admin.get_app()
-    except ValueError:
-        fb_cfg = st.secrets.get("firebase")
-        if not fb_cfg:
+    global _client
+    if _client is not None:
+        return _client
+
+    with _client_lock:
+        if _client is not None:
+            return _client
+        try:
+            app = firebase_admin.get_app()
+        except ValueError:
+            fb_cfg = st.secrets.get("firebase")
+            if not fb_cfg:
+                return None
+            cred = credentials.Certificate(dict(fb_cfg))
+            app = firebase_admin.initialize_app(cred)
+
+        try:
+            _client = firestore.client(app)
+        except ValueError:
             return None
-        cred = credentials.Certificate(dict(fb_cfg))
-        app = firebase_admin.initialize_app(cred)
+        _client_stats["created"] += 1
+        _client_stats["created_at"] = time.time()
+        return _client
 
-    try:
-        return firestore.client(app)
-    except ValueError:
-        return None
 
+def reset_firestore_client() -> None:
+    """Forget the cached client so the next call builds a new one."""
+
+    global _client
+    with _client_lock:
+        _client = None
 
-def save_row_to_firestore(row: dict, collection: str = "scores") -> dict:
+
+def firestore_health(collection: str = "scores") -> dict:
+    """Probe Firestore with a one-document read.
+
+    Returns
+    -------
+    dict
+        ``{"ok": True, "latency_ms": float}`` when the probe succeeds,
+        ``{"ok": False, "error": str}`` otherwise.  The result is also kept
+        for :func:`firestore_stats`.
+    """
+
+    db = get_firestore_client()
+    if not db:
+        result = {"ok": False, "error": "no_client"}
+    else:
+        start = time.perf_counter()
+        try:
+            list(db.collection(collection).limit(1).stream())
+            result = {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 1)}
+        except Exception as e:  # pragma: no cover - broad to capture Firestore errors
+            result = {"ok": False, "error": str(e)}
+    _client_stats["last_health"] = dict(result, checked_at=time.time())
+    return result
+
+
+def warmup_firestore(collection: str = "scores") -> dict:
+    """Create the client and open its channel before the first real request."""
+
+    return firestore_health(collection)
+
+
+def firestore_stats() -> dict:
+    """Return how many clients this process built and the last health check."""
+
+    return {
+        "client_alive": _client is not None,
+        "clients_created": _client_stats["created"],
+        "created_at": _client_stats["created_at"],
+        "last_health": _client_stats["last_health"],
+    }
+
+
+def save_row_to_firestore(row: dict, collection: str = "scores", db=None, doc_id=None) -> dict:
     """Save a row to a Firestore collection.
 
     Parameters
@@ -41,6 +112,12 @@ def save_row_to_firestore(row: dict, collection: str = "scores") -> dict:
         The data to be written to Firestore.
     collection:
         Name of the Firestore collection. Defaults to ``"scores"``.
+    db:
+        Client to write with. Defaults to :func:`get_firestore_client`.
+    doc_id:
+        When given, the row is written to that document (created or
+        overwritten) instead of being added under a new id, which makes
+        repeated saves of the same record idempotent.
 
     Returns
     -------
@@ -49,12 +126,15 @@ def save_row_to_firestore(row: dict, collection: str = "scores") -> dict:
         ``{"ok": False, "error": str}`` on failure.
     """
 
-    db = get_firestore_client()
+    db = db or get_firestore_client()
     if not db:
         return {"ok": False, "error": "no_client"}
 
     try:
-        db.collection(collection).add(row)
+        if doc_id:
+            db.collection(collection).document(doc_id).set(row)
+        else:
+            db.collection(collection).add(row)
         return {"ok": True, "message": "Saved to Firestore"}
     except Exception as e:  # pragma: no cover - broad to capture Firestore errors
         return {"ok": False, "error": str(e)}
@@ -0,0 +1,229 @@
+"""Per-level gradebook export as CSV, Parquet or XLSX.
+
+The gradebook has one row per student (roster fields first) and one
+column per assignment in answers-dictionary order, followed by any saved
+assignment names that do not resolve to a dictionary key, and the
+student's average.
+
+It is produced by a generator pipeline:
+
+1. :func:`reconcile.csv_chunks` streams the Scores sheet (or its backup)
+   in chunks;
+2. :func:`collect_scores` folds each chunk into a compact
+   ``students x assignments`` float grid - the latest score per cell -
+   so memory depends on the roster and the syllabus, not on how long the
+   score history is;
+3. :func:`gradebook_chunks` yields the rows ``chunk_size`` students at a
+   time;
+4. :func:`write_gradebook` hands the chunks to a streaming writer (CSV
+   appends, a Parquet row group per chunk, an openpyxl write-only sheet).
+"""
+
+from __future__ import annotations
+
+import io
+import math
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from assignment_index import AssignmentIndex
+
+FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", ".xlsx"),
+}
+ROSTER_FIELDS = ("studentcode", "name", "level", "email", "status")
+CHUNK_SIZE = 500
+
+
+class ScoreGrid:
+    """Latest score per (student, assignment) in a growable float32 matrix."""
+
+    def __init__(self, students: Sequence[str], assignments: Sequence[str]) -> None:
+        self.students: Dict[str, int] = {}
+        self.extra_students: Dict[str, Dict[str, str]] = {}
+        self.assignments: Dict[str, int] = {a: i for i, a in enumerate(assignments)}
+        self.known = len(self.assignments)
+        self.grid = np.full((max(len(students), 16), max(len(assignments), 8)), np.nan, dtype=np.float32)
+        for code in students:
+            self.row(code)
+
+    def row(self, code: str) -> int:
+        """Row of ``code``, added (and the grid grown) if new."""
+        row = self.students.get(code)
+        if row is None:
+            row = self.students[code] = len(self.students)
+            if row >= self.grid.shape[0]:
+                self.grid = np.vstack([self.grid, np.full_like(self.grid, np.nan)])
+        return row
+
+    def col(self, assignment: str) -> int:
+        """Column of ``assignment``, added (and the grid grown) if new."""
+        col = self.assignments.get(assignment)
+        if col is None:
+            col = self.assignments[assignment] = len(self.assignments)
+            if col >= self.grid.shape[1]:
+                self.grid = np.hstack([self.grid, np.full_like(self.grid, np.nan)])
+        return col
+
+    def columns(self) -> List[str]:
+        """Dictionary assignments in order, then unresolved names alphabetically."""
+        names = sorted(self.assignments, key=self.assignments.__getitem__)
+        return names[: self.known] + sorted(names[self.known:], key=str.lower)
+
+
+def collect_scores(
+    chunks: Iterable[pd.DataFrame],
+    level: str,
+    roster_codes: Sequence[str],
+    assignments: Sequence[str],
+    index: AssignmentIndex,
+) -> ScoreGrid:
+    """Fold streamed score rows of ``level`` (all levels if empty) into a :class:`ScoreGrid`.
+
+    Later rows win, as the Scores sheet is appended to in save order.
+    Students who have scores but are not on the roster get a row too.
+    """
+    grid = ScoreGrid([str(c).strip().lower() for c in roster_codes], assignments)
+    resolved: Dict[str, str] = {}
+    want = str(level).strip().lower()
+    for chunk in chunks:
+        chunk = chunk.rename(columns=lambda c: str(c).strip().lower())
+        if want and "level" in chunk.columns:
+            chunk = chunk[chunk["level"].astype(str).str.strip().str.lower() == want]
+        part = pd.DataFrame(
+            {
+                "code": chunk["studentcode"].astype(str).str.strip().str.lower(),
+                "name": chunk["name"].astype(str).str.strip() if "name" in chunk.columns else "",
+                "level": chunk["level"].astype(str).str.strip() if "level" in chunk.columns else level,
+                "assignment": chunk["assignment"].astype(str),
+                "score": pd.to_numeric(chunk["score"], errors="coerce"),
+            }
+        )
+        part = part[(part["code"] != "") & (part["assignment"].str.strip() != "") & part["score"].notna()]
+        if part.empty:
+            continue
+        for name in part["assignment"].unique():
+            if name not in resolved:
+                resolved[name] = index.resolve(name, level=level) or " ".join(name.split())
+        for code, name, lvl in part.drop_duplicates("code")[["code", "name", "level"]].itertuples(index=False):
+            if code not in grid.students:
+                grid.extra_students[code] = {"studentcode": code, "name": name, "level": lvl}
+        rows = part["code"].map(grid.row)
+        cols = part["assignment"].map(resolved).map(grid.col)
+        # Later rows win: keep the last score per cell before the scatter.
+        cells = pd.DataFrame({"row": rows, "col": cols, "score": part["score"]}).drop_duplicates(
+            ["row", "col"], keep="last"
+        )
+        grid.grid[cells["row"].to_numpy(), cells["col"].to_numpy()] = cells["score"].to_numpy()
+    return grid
+
+
+def gradebook_chunks(
+    grid: ScoreGrid, roster: pd.DataFrame, chunk_size: int = CHUNK_SIZE
+) -> Iterator[pd.DataFrame]:
+    """Yield gradebook rows ``chunk_size`` students at a time.
+
+    ``roster`` has lower-case columns; the :data:`ROSTER_FIELDS` it has are
+    copied into the first columns.
+    """
+    fields = [f for f in ROSTER_FIELDS if f in roster.columns] or ["studentcode"]
+    by_code = {
+        str(r.get("studentcode", "")).strip().lower(): r for r in roster[fields].to_dict("records")
+    }
+    columns = grid.columns()
+    col_index = [grid.assignments[c] for c in columns]
+    codes = sorted(grid.students, key=grid.students.__getitem__)
+    for start in range(0, len(codes), chunk_size):
+        part = codes[start:start + chunk_size]
+        rows = [grid.students[c] for c in part]
+        values = grid.grid[np.ix_(rows, col_index)].astype(np.float64) if col_index else np.empty((len(rows), 0))
+        info = [by_code.get(c) or grid.extra_students.get(c, {"studentcode": c}) for c in part]
+        frame = pd.DataFrame({f: [str(i.get(f, "") or "") for i in info] for f in fields})
+        scores = pd.DataFrame(values, columns=columns)
+        counts = (~np.isnan(values)).sum(axis=1)
+        totals = np.nansum(values, axis=1)
+        average = np.round(np.divide(totals, counts, out=np.full(len(rows), np.nan), where=counts > 0), 1)
+        yield pd.concat([frame, scores], axis=1).assign(average=average)
+
+
+def write_gradebook(chunks: Iterable[pd.DataFrame], fmt: str, out: Any) -> int:
+    """Write ``chunks`` to the binary file ``out`` as ``fmt``; returns the row count."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {sorted(FORMATS)}")
+    return {"csv": _write_csv, "parquet": _write_parquet, "xlsx": _write_xlsx}[fmt](chunks, out)
+
+
+def _write_csv(chunks: Iterable[pd.DataFrame], out: Any) -> int:
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    rows, first = 0, True
+    try:
+        for chunk in chunks:
+            chunk.to_csv(text, header=first, index=False, float_format="%g")
+            rows, first = rows + len(chunk), False
+    finally:
+        text.detach()  # leave ``out`` open for the caller
+    return rows
+
+
+def _write_parquet(chunks: Iterable[pd.DataFrame], out: Any) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer, rows = None, 0
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def _write_xlsx(chunks: Iterable[pd.DataFrame], out: Any) -> int:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Gradebook")
+    rows = 0
+    for n, chunk in enumerate(chunks):
+        if n == 0:
+            ws.append(list(chunk.columns))
+        for values in chunk.itertuples(index=False, name=None):
+            ws.append([None if isinstance(v, float) and math.isnan(v) else v for v in values])
+        rows += len(chunk)
+    wb.save(out)
+    return rows
+
+
+def export_gradebook(
+    score_chunks: Iterable[pd.DataFrame],
+    roster: pd.DataFrame,
+    level: str,
+    assignments: Sequence[str],
+    index: AssignmentIndex,
+    fmt: str,
+    out: Any,
+    chunk_size: int = CHUNK_SIZE,
+) -> int:
+    """Stream the ``level`` gradebook into ``out``; returns the number of students written.
+
+    ``roster`` needs lower-case ``studentcode`` and ``level`` columns, and
+    ``assignments`` is the dictionary order (``list_json_assignments``).
+    Only the assignments of ``level`` become columns; an empty ``level``
+    exports the whole school.
+    """
+    want = str(level).strip().lower()
+    level_keys = list(assignments)
+    if want:
+        roster = roster[roster["level"].astype(str).str.strip().str.lower() == want]
+        level_keys = [a for a in assignments if index.level(a).lower() in ("", want)]
+    grid = collect_scores(score_chunks, level, roster["studentcode"].astype(str).tolist(), level_keys, index)
+    return write_gradebook(gradebook_chunks(grid, roster, chunk_size), fmt, out)
@@ -0,0 +1,285 @@
+"""Load generator for the marking dashboard's save and load paths.
+
+Simulates ``sessions`` teachers marking concurrently.  Each simulated
+session repeatedly loads the students sheet (``load_sheet_csv``), fetches
+a student's submissions (``fetch_submissions``) and saves a score
+(``save_row``) against local stand-ins from :mod:`fake_services`, then the
+run reports throughput and latency percentiles per operation.
+
+Example::
+
+    python loadtest.py --sessions 30 --iterations 20 \\
+        --webhook-latency 0.4 --webhook-quota 300 --firestore-latency 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+
+import firebase_utils
+from cache_backends import SharedCache, make_backend
+from fake_services import FakeAppsScriptServer, FakeFirestore
+from save_index import SaveIndex
+from sheets_utils import parse_sheet_csv
+from snapshot_utils import SnapshotStore
+from webhook_utils import CircuitOpenError, WebhookBusyError, WebhookClient
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+
+def load_app_functions(names: List[str], namespace: Dict[str, Any], path: str = APP_PATH) -> Dict[str, Callable]:
+    """Compile the named top-level functions of ``app.py`` into ``namespace``.
+
+    ``app.py`` is a Streamlit script, so importing it would render the page.
+    Like the tests, we lift the functions we need out of its AST and supply
+    their globals ourselves.  Decorators are dropped so ``st.cache_*``
+    wrappers don't hide the cost being measured.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename="app.py")
+    nodes = [n for n in tree.body if isinstance(n, ast.FunctionDef) and n.name in names]
+    missing = set(names) - {n.name for n in nodes}
+    if missing:
+        raise KeyError(f"Functions not found in app.py: {sorted(missing)}")
+    for n in nodes:
+        n.decorator_list = []
+    exec(compile(ast.Module(body=nodes, type_ignores=[]), "app.py", "exec"), namespace)
+    return {name: namespace[name] for name in names}
+
+
+@dataclass
+class LoadTestConfig:
+    sessions: int = 10
+    iterations: int = 10
+    think_time: float = 0.0
+    webhook_latency: float = 0.3
+    webhook_error_rate: float = 0.0
+    webhook_quota: int = 0
+    rate_per_min: float = 90
+    max_concurrency: int = 8
+    firestore_latency: float = 0.05
+    firestore_error_rate: float = 0.0
+    to_firestore: bool = True
+    sheet_ttl: float = 300
+    dedup: bool = False
+    students_csv: str = "students.csv"
+    seed: Optional[int] = 0
+
+
+def _seed_submissions(db: FakeFirestore, students: pd.DataFrame, per_student: int = 3) -> None:
+    now = time.time()
+    for _, s in students.iterrows():
+        posts = db.collection("submissions").document(str(s["level"])).collection("posts")
+        for i in range(per_student):
+            posts.add(
+                {
+                    "student_code": s["studentcode"],
+                    "student_name": s["name"],
+                    "assignment": f"{s['level']} Assignment {i + 1}",
+                    "content": "1. A\n2. B\n3. C\n4. Guten Morgen",
+                    "timestamp": now - i * 3600,
+                }
+            )
+
+
+def percentiles(values_ms: List[float]) -> Dict[str, float]:
+    arr = np.asarray(values_ms or [0.0])
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        "p50 ms": round(float(p50), 1),
+        "p95 ms": round(float(p95), 1),
+        "p99 ms": round(float(p99), 1),
+        "max ms": round(float(arr.max()), 1),
+    }
+
+
+def summarize(samples: List[Tuple[str, float, bool]], wall_seconds: float) -> List[Dict[str, Any]]:
+    """Return one row per operation with throughput and latency percentiles."""
+    rows: List[Dict[str, Any]] = []
+    for op in sorted({s[0] for s in samples}):
+        mine = [s for s in samples if s[0] == op]
+        rows.append(
+            dict(
+                {
+                    "operation": op,
+                    "count": len(mine),
+                    "errors": sum(1 for s in mine if not s[2]),
+                    "per sec": round(len(mine) / wall_seconds, 2) if wall_seconds else 0.0,
+                },
+                **percentiles([s[1] * 1000 for s in mine]),
+            )
+        )
+    return rows
+
+
+def run_load_test(config: LoadTestConfig) -> Dict[str, Any]:
+    """Run the simulation described by ``config`` and return its report."""
+    rng = random.Random(config.seed)
+    students = parse_sheet_csv(open(config.students_csv, "rb").read())
+    students = students[["studentcode", "name", "level"]].dropna().astype(str)
+    csv_bytes = open(config.students_csv, "rb").read()
+
+    db = FakeFirestore(config.firestore_latency, config.firestore_error_rate, seed=config.seed)
+    _seed_submissions(db, students)
+    server = FakeAppsScriptServer(
+        latency=config.webhook_latency,
+        error_rate=config.webhook_error_rate,
+        quota_per_min=config.webhook_quota,
+        token="load-test",
+        csv=csv_bytes,
+        seed=config.seed,
+    ).start()
+    client = WebhookClient(server.url, rate_per_min=config.rate_per_min, max_concurrency=config.max_concurrency)
+    backend = make_backend("memory")
+    snapshots = SnapshotStore(tempfile.mkdtemp(prefix="loadtest-sheets-"), max_age=config.sheet_ttl)
+    index = SaveIndex(os.path.join(tempfile.mkdtemp(prefix="loadtest-saves-"), "saved.sqlite")) if config.dedup else None
+
+    namespace: Dict[str, Any] = {
+        "Dict": Dict, "Any": Any, "List": List, "Tuple": Tuple, "Optional": Optional,
+        "datetime": datetime, "re": re, "json": json, "os": os, "pd": pd,
+        "db": db,
+        "WEBHOOK_CLIENT": client,
+        "WEBHOOK_TOKEN": "load-test",
+        "CircuitOpenError": CircuitOpenError,
+        "WebhookBusyError": WebhookBusyError,
+        "save_row_to_firestore": partial(firebase_utils.save_row_to_firestore, db=db),
+        "sheet_snapshots": lambda: snapshots,
+        "shared_cache": lambda ns: SharedCache(backend, ns),
+        "fetch_sheet_csv": lambda sheet_id, tab, columns=None: requests.get(server.url, timeout=30).content,
+        "parse_sheet_csv": parse_sheet_csv,
+        "SHEETS_TTL": config.sheet_ttl,
+    }
+    fns = load_app_functions(
+        [
+            "save_row_to_scores", "save_row", "submission_ts_ms", "normalize_submission",
+            "fetch_submissions", "load_sheet_csv", "sheet_key",
+        ],
+        namespace,
+    )
+
+    samples: List[Tuple[str, float, bool]] = []
+    lock = threading.Lock()
+
+    def timed_call(op: str, fn: Callable[[], Any], ok: Callable[[Any], bool] = lambda r: True) -> Any:
+        start = time.perf_counter()
+        try:
+            result = fn()
+            good = ok(result)
+        except Exception:
+            result, good = None, False
+        with lock:
+            samples.append((op, time.perf_counter() - start, good))
+        return result
+
+    def session(n: int) -> None:
+        local = random.Random(rng.random() + n)
+        for _ in range(config.iterations):
+            timed_call("load_sheet_csv", lambda: fns["load_sheet_csv"]("students", "Sheet1", ("studentcode", "name", "level")))
+            s = students.iloc[local.randrange(len(students))]
+            timed_call("fetch_submissions", lambda: fns["fetch_submissions"](s["level"], s["studentcode"]))
+            row = {
+                "studentcode": s["studentcode"],
+                "name": s["name"],
+                "assignment": f"{s['level']} Assignment 1",
+                "score": local.randint(40, 100),
+                "comments": "load test",
+                "date": datetime.now().strftime("%Y-%m-%d"),
+                "level": s["level"],
+                "link": "",
+            }
+            timed_call(
+                "save_row",
+                lambda: fns["save_row"](row, to_firestore=config.to_firestore, index=index),
+                ok=lambda r: bool(r and r.get("ok")),
+            )
+            if config.think_time:
+                time.sleep(local.uniform(0, 2 * config.think_time))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(config.sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    snapshots.wait()
+    server.stop()
+
+    return {
+        "sessions": config.sessions,
+        "wall seconds": round(wall, 2),
+        "operations": summarize(samples, wall),
+        "webhook client": client.stats(),
+        "webhook responses": dict(sorted(server.status_counts.items())),
+        "rows received": len(server.rows),
+        "save index": index.stats() if index else {},
+        "firestore writes": db.writes,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    defaults = LoadTestConfig()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=defaults.sessions, help="concurrent simulated teachers")
+    parser.add_argument("--iterations", type=int, default=defaults.iterations, help="marking rounds per session")
+    parser.add_argument("--think-time", type=float, default=defaults.think_time, help="mean pause between rounds (s)")
+    parser.add_argument("--webhook-latency", type=float, default=defaults.webhook_latency)
+    parser.add_argument("--webhook-error-rate", type=float, default=defaults.webhook_error_rate)
+    parser.add_argument("--webhook-quota", type=int, default=defaults.webhook_quota, help="accepted requests per minute (0 = unlimited)")
+    parser.add_argument("--rate-per-min", type=float, default=defaults.rate_per_min, help="client-side webhook rate limit")
+    parser.add_argument("--max-concurrency", type=int, default=defaults.max_concurrency)
+    parser.add_argument("--firestore-latency", type=float, default=defaults.firestore_latency)
+    parser.add_argument("--firestore-error-rate", type=float, default=defaults.firestore_error_rate)
+    parser.add_argument("--no-firestore", action="store_true", help="save to the sheet only")
+    parser.add_argument("--sheet-ttl", type=float, default=defaults.sheet_ttl, help="snapshot age before revalidation (s)")
+    parser.add_argument("--dedup", action="store_true", help="skip unchanged rows through a save index")
+    parser.add_argument("--students-csv", default=defaults.students_csv)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args(argv)
+
+    report = run_load_test(
+        LoadTestConfig(
+            sessions=args.sessions,
+            iterations=args.iterations,
+            think_time=args.think_time,
+            webhook_latency=args.webhook_latency,
+            webhook_error_rate=args.webhook_error_rate,
+            webhook_quota=args.webhook_quota,
+            rate_per_min=args.rate_per_min,
+            max_concurrency=args.max_concurrency,
+            firestore_latency=args.firestore_latency,
+            firestore_error_rate=args.firestore_error_rate,
+            to_firestore=not args.no_firestore,
+            sheet_ttl=args.sheet_ttl,
+            dedup=args.dedup,
+            students_csv=args.students_csv,
+            seed=args.seed,
+        )
+    )
+    print(pd.DataFrame(report["operations"]).to_string(index=False))
+    for key in (
+        "sessions", "wall seconds", "rows received", "firestore writes",
+        "save index", "webhook responses", "webhook client",
+    ):
+        print(f"{key}: {report[key]}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""Near-duplicate detection across submissions with MinHash and LSH.
+
+Comparing every pair of posts is quadratic.  Instead each text is reduced
+to a fixed-size MinHash signature of its character shingles, and the
+signature is cut into bands; two texts only become candidates when one of
+their bands hashes identically (locality-sensitive hashing), which happens
+with high probability only for texts whose Jaccard similarity is near or
+above the threshold.  Candidates are then confirmed on the full signature.
+
+:class:`NearDuplicateIndex` is incremental: posts can be added, replaced
+or removed one at a time and :meth:`NearDuplicateIndex.clusters` reports
+the connected groups of near-identical posts within each group (for the
+dashboard, one group per assignment and kind of text).
+:meth:`NearDuplicateIndex.watch` keeps the index in step with a level's
+posts from a Firestore listener, so a check never re-reads the level;
+:meth:`NearDuplicateIndex.ready` says whether the listener's first
+snapshot has been applied yet.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Set, Tuple
+
+import numpy as np
+
+from essay_similarity import fold_text
+
+SHINGLE_SIZE = 5
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# ``prepare(level, post_id, data)`` -> ``[(key, text, group, meta), ...]`` for one post
+Prepare = Callable[[str, str, Dict[str, Any]], List[Tuple[Hashable, str, Hashable, Any]]]
+
+
+def shingle_hashes(text: str, k: int = SHINGLE_SIZE) -> np.ndarray:
+    """Distinct 32-bit hashes of the ``k``-character shingles of the folded ``text``.
+
+    Texts shorter than ``k`` give a single shingle; empty texts give none.
+    """
+    s = fold_text(text).strip()
+    if not s:
+        return np.zeros(0, dtype=np.uint64)
+    codes = np.frombuffer(s.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    k = min(k, len(codes))
+    m = len(codes) - k + 1
+    h = np.full(m, np.uint64(2166136261), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for i in range(k):
+            h = ((h ^ codes[i:i + m]) * np.uint64(16777619)) & _MAX_HASH
+    return np.unique(h)
+
+
+class MinHasher:
+    """``num_perm`` multiply-shift hash functions applied to 32-bit shingle hashes.
+
+    Each function is ``(a * x + b) >> 32`` in wrapping 64-bit arithmetic
+    with a random odd ``a``, which avoids the (slow) modulo of the classic
+    ``(a * x + b) mod p`` family while staying close to universal.
+    """
+
+    def __init__(self, num_perm: int = 128, seed: int = 1) -> None:
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        """Return the MinHash signature (``num_perm`` values) of a set of shingle hashes."""
+        if not len(hashes):
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        with np.errstate(over="ignore"):
+            values = (self.a[:, None] * hashes[None, :] + self.b[:, None]) >> np.uint64(32)
+        return values.min(axis=1).astype(np.uint32)
+
+
+def estimated_jaccard(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """Share of positions where two signatures agree (an estimate of Jaccard similarity)."""
+    return float(np.mean(sig_a == sig_b))
+
+
+class NearDuplicateIndex:
+    """Incremental LSH index reporting clusters of near-identical texts.
+
+    ``threshold`` is the estimated Jaccard similarity two texts must reach
+    to count as duplicates.  ``bands`` x ``rows`` must equal ``num_perm``;
+    the defaults (16 x 8) make texts at about 0.7 similarity or more
+    collide in some band with high probability while keeping unrelated
+    texts out of each other's buckets.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_size: int = SHINGLE_SIZE,
+        seed: int = 1,
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm, seed)
+        self._lock = threading.RLock()
+        self._entries: Dict[Hashable, Tuple[Hashable, str, np.ndarray]] = {}
+        self._buckets: Dict[Tuple[Hashable, int, bytes], Set[Hashable]] = {}
+        self._edges: Dict[Hashable, Dict[Hashable, float]] = {}
+        self._meta: Dict[Hashable, Any] = {}
+        self._owned: Dict[str, List[Hashable]] = {}
+        self._watches: List[Any] = []
+        self._ready: Set[str] = set()
+        self.comparisons = 0
+        self.errors = 0
+        self.last_error = ""
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._entries)
+
+    def _bucket_keys(self, group: Hashable, sig: np.ndarray) -> List[Tuple[Hashable, int, bytes]]:
+        return [
+            (group, band, sig[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def meta(self, key: Hashable) -> Any:
+        """Whatever was passed as ``meta`` when ``key`` was added (``None`` if unknown)."""
+        with self._lock:
+            return self._meta.get(key)
+
+    def add(self, key: Hashable, text: str, group: Hashable = None, meta: Any = None) -> bool:
+        """Index ``text`` under ``key`` within ``group``; returns ``False`` if nothing changed.
+
+        Re-adding a key with the same text and group only replaces its
+        ``meta``, so callers can feed the whole collection on every refresh
+        and only new or edited posts cost any work.  Empty texts are not
+        indexed.
+        """
+        digest = hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+        if self._unchanged(key, group, digest, meta):
+            return False
+        sig = self.hasher.signature(shingle_hashes(text, self.shingle_size))  # the slow part, unlocked
+        with self._lock:
+            # Decide again under the lock: another thread may have replaced ``key`` meanwhile.
+            if self._unchanged(key, group, digest, meta):
+                return False
+            self.remove(key)
+            if not (text or "").strip():
+                return True
+            candidates: Set[Hashable] = set()
+            for bucket in self._bucket_keys(group, sig):
+                members = self._buckets.setdefault(bucket, set())
+                candidates |= members
+                members.add(key)
+            self._entries[key] = (group, digest, sig)
+            self._meta[key] = meta
+            self._edges[key] = {}
+            if candidates:
+                others = list(candidates)
+                sims = np.mean(np.stack([self._entries[o][2] for o in others]) == sig, axis=1)
+                self.comparisons += len(others)
+                for other, sim in zip(others, sims.tolist()):
+                    if sim >= self.threshold:
+                        self._edges[key][other] = sim
+                        self._edges[other][key] = sim
+        return True
+
+    def _unchanged(self, key: Hashable, group: Hashable, digest: str, meta: Any) -> bool:
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None and old[0] == group and old[1] == digest:
+                self._meta[key] = meta
+                return True
+            return False
+
+    def remove(self, key: Hashable) -> None:
+        """Drop ``key`` from the index (unknown keys are ignored)."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            self._meta.pop(key, None)
+            if entry is None:
+                return
+            group, _, sig = entry
+            for bucket in self._bucket_keys(group, sig):
+                members = self._buckets.get(bucket)
+                if members is not None:
+                    members.discard(key)
+                    if not members:
+                        del self._buckets[bucket]
+            for other in self._edges.pop(key, {}):
+                self._edges[other].pop(key, None)
+
+    def watch(self, db: Any, level: str, prepare: Prepare) -> "NearDuplicateIndex":
+        """Keep the index in step with ``submissions/{level}/posts``.
+
+        Each post is indexed under the keys ``prepare`` returns for it; keys
+        it no longer returns, and every key of a deleted post, are removed.
+        """
+        if level:
+            posts = db.collection("submissions").document(level).collection("posts")
+            self._watches.append(posts.on_snapshot(self._listener(level, prepare)))
+        return self
+
+    def stop(self) -> None:
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+
+    def ready(self, level: str) -> bool:
+        """Whether the first snapshot of ``level``'s posts has been applied."""
+        return level in self._ready
+
+    def _listener(self, level: str, prepare: Prepare) -> Callable:
+        def on_snapshot(docs: Any, changes: Any, read_time: Any) -> None:
+            for change in changes:
+                doc = change.document
+                path = f"submissions/{level}/posts/{doc.id}"
+                try:
+                    removed = change.type.name == "REMOVED"
+                    entries = [] if removed else prepare(level, doc.id, doc.to_dict() or {})
+                    self._replace(path, entries)
+                except Exception as e:  # one bad post must not stop the listener
+                    self.errors += 1
+                    self.last_error = str(e)
+            self._ready.add(level)
+
+        return on_snapshot
+
+    def _replace(self, owner: str, entries: List[Tuple[Hashable, str, Hashable, Any]]) -> None:
+        keys = [key for key, _, _, _ in entries]
+        with self._lock:
+            stale = [key for key in self._owned.get(owner, ()) if key not in keys]
+            if keys:
+                self._owned[owner] = keys
+            else:
+                self._owned.pop(owner, None)
+        for key in stale:
+            self.remove(key)
+        for key, text, group, meta in entries:
+            self.add(key, text, group, meta)
+
+    def similar(self, key: Hashable) -> Dict[Hashable, float]:
+        """Near-duplicates of ``key`` with their estimated similarity."""
+        with self._lock:
+            return dict(self._edges.get(key, {}))
+
+    def clusters(self, group: Any = None, min_size: int = 2) -> List[Dict[str, Any]]:
+        """Connected groups of near-duplicates, largest first.
+
+        Each cluster is ``{"group", "keys", "size", "min_similarity"}`` where
+        ``min_similarity`` is the weakest link inside the cluster.  Pass
+        ``group`` to restrict the report to one group.
+        """
+        with self._lock:
+            edges = {k: dict(v) for k, v in self._edges.items()}
+            groups = {k: e[0] for k, e in self._entries.items()}
+        seen: Set[Hashable] = set()
+        out: List[Dict[str, Any]] = []
+        for start in edges:
+            if start in seen or not edges[start] or (group is not None and groups[start] != group):
+                continue
+            component, stack, weakest = [], [start], 1.0
+            seen.add(start)
+            while stack:
+                node = stack.pop()
+                component.append(node)
+                for other, sim in edges[node].items():
+                    weakest = min(weakest, sim)
+                    if other not in seen:
+                        seen.add(other)
+                        stack.append(other)
+            if len(component) >= min_size:
+                out.append(
+                    {
+                        "group": groups[start],
+                        "keys": sorted(component, key=str),
+                        "size": len(component),
+                        "min_similarity": round(weakest, 3),
+                    }
+                )
+        out.sort(key=lambda c: (-c["size"], -c["min_similarity"], str(c["group"])))
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "posts": len(self._entries),
+                "buckets": len(self._buckets),
+                "duplicate pairs": sum(len(v) for v in self._edges.values()) // 2,
+                "comparisons": self.comparisons,
+                "watching": len(self._watches),
+                "ready": len(self._ready),
+                "errors": self.errors,
+            }
@@ -0,0 +1,118 @@
+"""Helpers for measuring how much work each dashboard rerun does."""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, MutableMapping, Optional, Set
+
+TIMINGS_KEY = "_timings"
+
+
+def record_timing(section: str, elapsed_ms: float, store: MutableMapping) -> Dict[str, float]:
+    """Add one measurement for ``section`` to ``store`` and return its stats.
+
+    ``store`` is usually ``st.session_state`` so every teacher sees the cost
+    of their own interactions.  Stats are kept per section as the number of
+    runs, the last, the maximum and the accumulated duration in milliseconds.
+    """
+
+    timings = store.get(TIMINGS_KEY)
+    if timings is None:
+        timings = {}
+        store[TIMINGS_KEY] = timings
+    stats = timings.setdefault(
+        section, {"runs": 0, "last_ms": 0.0, "max_ms": 0.0, "total_ms": 0.0}
+    )
+    stats["runs"] += 1
+    stats["last_ms"] = elapsed_ms
+    stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+    stats["total_ms"] += elapsed_ms
+    return stats
+
+
+@contextmanager
+def timed(section: str, store: MutableMapping) -> Iterator[None]:
+    """Time the wrapped block and record it with :func:`record_timing`.
+
+    The measurement is recorded even when the block is left through an
+    exception, which is how ``st.rerun()`` and ``st.stop()`` end a run.
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(section, (time.perf_counter() - start) * 1000, store)
+
+
+def timing_report(store: MutableMapping) -> List[Dict[str, Any]]:
+    """Return the recorded timings as rows suitable for ``st.table``."""
+
+    rows: List[Dict[str, Any]] = []
+    for section, stats in sorted((store.get(TIMINGS_KEY) or {}).items()):
+        runs = stats["runs"] or 1
+        rows.append(
+            {
+                "section": section,
+                "runs": stats["runs"],
+                "last ms": round(stats["last_ms"], 1),
+                "avg ms": round(stats["total_ms"] / runs, 1),
+                "max ms": round(stats["max_ms"], 1),
+            }
+        )
+    return rows
+
+
+def deep_sizeof(obj: Any, _seen: Optional[Set[int]] = None) -> int:
+    """Approximate the memory held by ``obj`` and everything it references.
+
+    Containers are walked recursively and shared objects are counted once.
+    Objects with a ``memory_usage(deep=True)`` method (pandas frames and
+    series) report their own size.
+    """
+
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if hasattr(obj, "memory_usage") and not isinstance(obj, type):
+        try:
+            usage = obj.memory_usage(deep=True)
+            return int(usage.sum() if hasattr(usage, "sum") else usage)
+        except TypeError:
+            pass
+    size = sys.getsizeof(obj)
+    if isinstance(obj, Mapping):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(v, seen) for v in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def process_memory_mb() -> float:
+    """Return the resident memory of this process in MiB (peak RSS off Linux)."""
+
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def memory_report(session: Mapping) -> List[Dict[str, Any]]:
+    """Return per-session and per-process memory rows for the diagnostics panel."""
+
+    return [
+        {"scope": "this session", "MiB": round(deep_sizeof(dict(session)) / 2**20, 2)},
+        {"scope": "process (RSS)", "MiB": round(process_memory_mb(), 1)},
+    ]
@@ -0,0 +1,173 @@
+"""Background prefetching for the marking queue.
+
+While a teacher scores the current queue item, :class:`Prefetcher` loads
+the next few items on a worker thread, so moving on finds everything
+already in memory.  ``get`` reports whether a value was a *hit*
+(prefetched and fresh), a *wait* (still loading, so it waited for the
+worker) or a *miss* (loaded on the spot), which is what the diagnostics
+panel shows as the hit rate.
+
+:meth:`Prefetcher.clear` starts a new generation: a load that was already
+running when it was called still finishes, but its value is thrown away
+(counted as ``stale``) rather than stored.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, Optional, Tuple
+
+
+class Prefetcher:
+    """Load ``load(key)`` ahead of time on one worker thread.
+
+    ``want(keys)`` puts keys at the front of the queue (most recent request
+    first; older requests are dropped beyond ``max_pending``).  Values are
+    kept for ``ttl`` seconds, at most ``max_entries`` of them.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[Hashable], Any],
+        ttl: float = 60.0,
+        max_entries: int = 256,
+        max_pending: int = 32,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.load = load
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_pending = max_pending
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._pending: Deque[Hashable] = deque()
+        self._inflight: Dict[Hashable, threading.Event] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._generation = 0
+        self.counters = {
+            "hits": 0, "waits": 0, "misses": 0, "prefetched": 0, "dropped": 0, "stale": 0, "errors": 0,
+        }
+        self.last_error = ""
+
+    # ---------------- cache ----------------
+    def _fresh(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and self._clock() - entry[0] < self.ttl
+
+    def _store(self, key: Hashable, value: Any, generation: int) -> None:
+        if generation != self._generation:
+            self.counters["stale"] += 1  # loaded before a clear()
+            return
+        self._entries[key] = (self._clock(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget every loaded value, everything queued and every load still running."""
+        with self._cond:
+            self._generation += 1
+            self._entries.clear()
+            self._pending.clear()
+            self._inflight.clear()
+
+    # ---------------- requests ----------------
+    def want(self, keys: Iterable[Hashable]) -> None:
+        """Queue ``keys`` for loading, in order, ahead of anything queued before."""
+        keys = [k for k in keys if k is not None]
+        with self._cond:
+            for key in reversed(keys):
+                if self._fresh(key) or key in self._inflight:
+                    continue
+                try:
+                    self._pending.remove(key)
+                except ValueError:
+                    pass
+                self._pending.appendleft(key)
+            while len(self._pending) > self.max_pending:
+                self._pending.pop()
+                self.counters["dropped"] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name="prefetch", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def get(self, key: Hashable, timeout: float = 30.0) -> Any:
+        """The value for ``key``: prefetched if possible, otherwise loaded now."""
+        with self._cond:
+            generation = self._generation
+            if self._fresh(key):
+                self.counters["hits"] += 1
+                self._entries.move_to_end(key)
+                return self._entries[key][1]
+            event = self._inflight.get(key)
+            if event is None:
+                self.counters["misses"] += 1
+                try:
+                    self._pending.remove(key)
+                except ValueError:
+                    pass
+            else:
+                self.counters["waits"] += 1
+        if event is not None:
+            event.wait(timeout)
+            with self._cond:
+                if self._fresh(key):
+                    return self._entries[key][1]
+        value = self.load(key)
+        with self._cond:
+            self._store(key, value, generation)
+        return value
+
+    def peek(self, key: Hashable) -> Any:
+        """The prefetched value for ``key`` if it is ready and fresh, else ``None``; never loads."""
+        with self._cond:
+            if self._fresh(key):
+                self.counters["hits"] += 1
+                self._entries.move_to_end(key)
+                return self._entries[key][1]
+            self.counters["misses"] += 1
+            return None
+
+    # ---------------- worker ----------------
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    if not self._cond.wait(timeout=60):
+                        self._thread = None  # idle: exit, want() starts a new one
+                        return
+                key = self._pending.popleft()
+                if self._fresh(key) or key in self._inflight:
+                    continue
+                event = self._inflight[key] = threading.Event()
+                generation = self._generation
+            try:
+                value = self.load(key)
+            except Exception as e:  # get() loads it again in the foreground
+                with self._cond:
+                    self.counters["errors"] += 1
+                    self.last_error = str(e)
+            else:
+                with self._cond:
+                    if generation == self._generation:
+                        self.counters["prefetched"] += 1
+                    self._store(key, value, generation)
+            finally:
+                with self._cond:
+                    if self._inflight.get(key) is event:
+                        del self._inflight[key]
+                event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        served = self.counters["hits"] + self.counters["waits"] + self.counters["misses"]
+        return dict(
+            self.counters,
+            hit_rate=round(self.counters["hits"] / served, 3) if served else None,
+            queued=len(self._pending),
+            cached=len(self._entries),
+            last_error=self.last_error,
+        )
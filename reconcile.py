@@ -0,0 +1,477 @@
+"""Reconcile ``scores_backup.csv`` with the live Scores sheet or Firestore.
+
+Both sides are read in chunks and joined on ``(studentcode, assignment,
+date)`` - or on ``(studentcode, assignment)`` against Firestore, which keeps
+only the latest mark per student and assignment - with a grace hash join: every chunk is split by a hash of the key
+into partition files on disk, then each pair of partitions is joined in
+memory.  A partition that is still too big is split again with a
+different hash, so memory stays bounded by ``chunk_size`` and
+``max_partition_rows`` however long the history gets.
+
+The result is a set of CSV files in ``out_dir``:
+
+* ``missing_in_{right}.csv`` / ``missing_in_{left}.csv`` - keys only one
+  side has;
+* ``changed.csv`` - same key, different name/score/comments/level (the
+  left row plus the right side's values as ``{right}_*``);
+* ``duplicates.csv`` - keys that occur more than once within one side
+  (for the Firestore key, every re-mark in the backup); the row with the
+  latest date is the one compared.
+
+Repairs only add missing rows, never overwrite changed ones: ``backup``
+appends the live side's extra rows to the backup CSV, ``live`` appends the
+backup's extra rows to the sheet through the webhook, or writes them to
+Firestore in batched commits without replacing a document with an older
+mark.
+
+Example::
+
+    python reconcile.py --against firestore --out reconcile --repair backup
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from save_index import idempotency_key
+
+SCORES_COLUMNS = ("studentcode", "name", "assignment", "score", "comments", "date", "level")
+KEY_COLUMNS = ("studentcode", "assignment", "date")
+LATEST_KEY_COLUMNS = ("studentcode", "assignment")  # how Firestore stores marks
+VALUE_COLUMNS = ("name", "score", "comments", "level")
+CHUNK_SIZE = 20000
+PARTITIONS = 16
+MAX_PARTITION_ROWS = 100000
+MAX_DEPTH = 4
+FIRESTORE_BATCH = 400  # below Firestore's 500 writes per commit
+
+Chunks = Iterable[pd.DataFrame]
+
+
+# ---------------------------------------------------------------------------
+# Sources
+# ---------------------------------------------------------------------------
+
+
+def csv_chunks(source: Any, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Read a CSV path, raw CSV bytes or a binary stream ``chunk_size`` rows at a time."""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    reader = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size)
+    with reader:
+        yield from reader
+
+
+def firestore_chunks(db: Any, collection: str = "scores", chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Stream a collection's documents as frames of ``chunk_size`` rows."""
+    rows: List[Dict[str, Any]] = []
+    for snap in db.collection(collection).stream():
+        rows.append(snap.to_dict() or {})
+        if len(rows) >= chunk_size:
+            yield pd.DataFrame(rows)
+            rows = []
+    if rows:
+        yield pd.DataFrame(rows)
+
+
+def _score_text(value: str) -> str:
+    try:
+        return f"{float(value):g}"
+    except ValueError:
+        return value
+
+
+def normalize_chunk(df: pd.DataFrame, key_columns: Tuple[str, ...] = KEY_COLUMNS) -> pd.DataFrame:
+    """Scores columns as stripped strings plus ``_key`` (over ``key_columns``) and the content ``_hash``.
+
+    Rows without an assignment (blank lines, a trailing end-of-file marker)
+    are dropped.
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    out = pd.DataFrame(index=df.index)
+    for col in SCORES_COLUMNS:
+        values = df[col] if col in df.columns else pd.Series("", index=df.index)
+        out[col] = values.astype("string[pyarrow]").fillna("").str.strip()
+    out = out[out["assignment"] != ""]
+    out["score"] = out["score"].map(_score_text).astype("string[pyarrow]")
+    parts = {
+        "studentcode": out["studentcode"].str.lower(),
+        "assignment": out["assignment"].str.lower().str.split().str.join(" "),
+        "date": out["date"],
+    }
+    key = parts[key_columns[0]]
+    for col in key_columns[1:]:
+        key = key + "|" + parts[col]
+    out["_key"] = key
+    values = out[list(VALUE_COLUMNS)].copy()
+    values["name"] = values["name"].str.lower()
+    out["_hash"] = pd.util.hash_pandas_object(values, index=False).astype(str)
+    return out.reset_index(drop=True)
+
+
+# ---------------------------------------------------------------------------
+# Grace hash join
+# ---------------------------------------------------------------------------
+
+
+def _partition_ids(keys: pd.Series, depth: int, partitions: int) -> pd.Series:
+    # A different hash key per level, so re-splitting a partition spreads it out.
+    hash_key = f"reconcile{depth:07d}"
+    return pd.util.hash_pandas_object(keys, index=False, hash_key=hash_key) % partitions
+
+
+def _partition(
+    chunks: Chunks, directory: str, depth: int, partitions: int, key_columns: Optional[Tuple[str, ...]]
+) -> Dict[int, int]:
+    """Append every row to ``directory/{partition}.csv``; returns rows per partition.
+
+    Raw chunks are normalized when ``key_columns`` is given; re-partitioned
+    ones (``None``) already are.
+    """
+    os.makedirs(directory, exist_ok=True)
+    counts: Dict[int, int] = {}
+    for chunk in chunks:
+        if key_columns:
+            chunk = normalize_chunk(chunk, key_columns)
+        if chunk.empty:
+            continue
+        for part, rows in chunk.groupby(_partition_ids(chunk["_key"], depth, partitions).to_numpy()):
+            path = os.path.join(directory, f"{part}.csv")
+            rows.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+            counts[int(part)] = counts.get(int(part), 0) + len(rows)
+    return counts
+
+
+def _read_partition(path: str, chunk_size: Optional[int] = None) -> Any:
+    if not os.path.exists(path):
+        return iter(()) if chunk_size else pd.DataFrame(columns=list(SCORES_COLUMNS) + ["_key", "_hash"])
+    return pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size)
+
+
+class _Outputs:
+    """Result CSVs in ``out_dir``, appended to partition by partition."""
+
+    def __init__(self, out_dir: str, left: str, right: str) -> None:
+        self.out_dir = out_dir
+        self.left, self.right = left, right
+        self.counts = {
+            f"missing in {right}": 0, f"missing in {left}": 0, "changed": 0, "matched": 0,
+            f"duplicate keys in {left}": 0, f"duplicate keys in {right}": 0,
+        }
+        self.files = {
+            f"missing in {right}": f"missing_in_{right}.csv",
+            f"missing in {left}": f"missing_in_{left}.csv",
+            "changed": "changed.csv",
+            "duplicates": "duplicates.csv",
+        }
+        os.makedirs(out_dir, exist_ok=True)
+        for name in self.files.values():
+            path = os.path.join(out_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def path(self, what: str) -> str:
+        return os.path.join(self.out_dir, self.files[what])
+
+    def write(self, what: str, rows: pd.DataFrame) -> None:
+        if rows.empty:
+            return
+        path = self.path(what)
+        rows.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+
+
+def _join_partition(
+    left_path: str,
+    right_path: str,
+    rows: int,
+    out: _Outputs,
+    work_dir: str,
+    depth: int,
+    partitions: int,
+    max_rows: int,
+    chunk_size: int,
+) -> int:
+    """Join one partition pair; returns the largest number of rows held in memory."""
+    if rows > max_rows and depth < MAX_DEPTH:
+        sub_left, sub_right = os.path.join(work_dir, "l"), os.path.join(work_dir, "r")
+        left_counts = _partition(_read_partition(left_path, chunk_size), sub_left, depth + 1, partitions, None)
+        right_counts = _partition(_read_partition(right_path, chunk_size), sub_right, depth + 1, partitions, None)
+        peak = 0
+        for part in sorted(set(left_counts) | set(right_counts)):
+            peak = max(
+                peak,
+                _join_partition(
+                    os.path.join(sub_left, f"{part}.csv"),
+                    os.path.join(sub_right, f"{part}.csv"),
+                    left_counts.get(part, 0) + right_counts.get(part, 0),
+                    out, os.path.join(work_dir, str(part)), depth + 1, partitions, max_rows, chunk_size,
+                ),
+            )
+        shutil.rmtree(sub_left, ignore_errors=True)
+        shutil.rmtree(sub_right, ignore_errors=True)
+        return peak
+
+    left, right = _read_partition(left_path), _read_partition(right_path)
+    for side, name, frame in (("left", out.left, left), ("right", out.right, right)):
+        dup = frame[frame["_key"].duplicated(keep=False)]
+        if not dup.empty:
+            out.counts[f"duplicate keys in {name}"] += dup["_key"].nunique()
+            out.write("duplicates", dup.drop(columns=["_hash"]).assign(source=name))
+    # Of duplicated keys, the latest row (by date, then save order) is compared.
+    left = left.sort_values("date", kind="stable").drop_duplicates("_key", keep="last")
+    right = right.sort_values("date", kind="stable").drop_duplicates("_key", keep="last")
+    merged = left.merge(right, on="_key", how="outer", suffixes=("_l", "_r"), indicator=True)
+    columns = list(SCORES_COLUMNS)
+    only_left = merged[merged["_merge"] == "left_only"]
+    only_right = merged[merged["_merge"] == "right_only"]
+    both = merged[merged["_merge"] == "both"]
+    changed = both[both["_hash_l"] != both["_hash_r"]]
+    out.write(f"missing in {out.right}", only_left[[f"{c}_l" for c in columns]].set_axis(columns, axis=1))
+    out.write(f"missing in {out.left}", only_right[[f"{c}_r" for c in columns]].set_axis(columns, axis=1))
+    out.write(
+        "changed",
+        changed[[f"{c}_l" for c in columns] + [f"{c}_r" for c in VALUE_COLUMNS]].set_axis(
+            columns + [f"{out.right}_{c}" for c in VALUE_COLUMNS], axis=1
+        ),
+    )
+    out.counts[f"missing in {out.right}"] += len(only_left)
+    out.counts[f"missing in {out.left}"] += len(only_right)
+    out.counts["changed"] += len(changed)
+    out.counts["matched"] += len(both) - len(changed)
+    return rows
+
+
+def reconcile(
+    left: Chunks,
+    right: Chunks,
+    out_dir: str,
+    left_name: str = "backup",
+    right_name: str = "live",
+    partitions: int = PARTITIONS,
+    max_partition_rows: int = MAX_PARTITION_ROWS,
+    chunk_size: int = CHUNK_SIZE,
+    key_columns: Tuple[str, ...] = KEY_COLUMNS,
+) -> Dict[str, Any]:
+    """Hash-join two chunked sources on ``key_columns`` and write the differences to ``out_dir``.
+
+    Returns the counts per outcome plus ``peak rows in memory`` (the largest
+    partition pair that was joined) and the paths of the result files.
+    """
+    out = _Outputs(out_dir, left_name, right_name)
+    work = tempfile.mkdtemp(prefix="reconcile-")
+    try:
+        left_counts = _partition(left, os.path.join(work, "left"), 0, partitions, key_columns)
+        right_counts = _partition(right, os.path.join(work, "right"), 0, partitions, key_columns)
+        peak = 0
+        for part in sorted(set(left_counts) | set(right_counts)):
+            peak = max(
+                peak,
+                _join_partition(
+                    os.path.join(work, "left", f"{part}.csv"),
+                    os.path.join(work, "right", f"{part}.csv"),
+                    left_counts.get(part, 0) + right_counts.get(part, 0),
+                    out, os.path.join(work, str(part)), 0, partitions, max_partition_rows, chunk_size,
+                ),
+            )
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return dict(
+        out.counts,
+        **{
+            f"{left_name} rows": sum(left_counts.values()),
+            f"{right_name} rows": sum(right_counts.values()),
+            "peak rows in memory": peak,
+            "files": {k: out.path(k) for k in out.files if os.path.exists(out.path(k))},
+        },
+    )
+
+
+# ---------------------------------------------------------------------------
+# Repairs
+# ---------------------------------------------------------------------------
+
+
+def _missing_rows(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    if os.path.exists(path):
+        yield from csv_chunks(path, chunk_size)
+
+
+def repair_csv(csv_path: str, missing_path: str, chunk_size: int = CHUNK_SIZE) -> int:
+    """Append the rows of ``missing_path`` to ``csv_path`` using its own header."""
+    header = pd.read_csv(csv_path, dtype=str, nrows=0).columns.tolist()
+    by_lower = {h.strip().lower(): h for h in header}
+    written = 0
+    with open(csv_path, "rb+") as f:  # make sure the appended rows start on a new line
+        f.seek(0, os.SEEK_END)
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) not in (b"\n", b"\r"):
+                f.write(b"\n")
+    for chunk in _missing_rows(missing_path, chunk_size):
+        rows = pd.DataFrame({by_lower[c]: chunk[c] for c in SCORES_COLUMNS if c in by_lower})
+        rows.reindex(columns=header, fill_value="").to_csv(csv_path, mode="a", header=False, index=False)
+        written += len(rows)
+    return written
+
+
+def _typed(row: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        score = float(row["score"])
+        row["score"] = int(score) if score.is_integer() else score
+    except (KeyError, ValueError):
+        pass
+    return row
+
+
+def repair_firestore(
+    db: Any,
+    missing_path: str,
+    collection: str = "scores",
+    batch_size: int = FIRESTORE_BATCH,
+    chunk_size: int = CHUNK_SIZE,
+    partitions: int = PARTITIONS,
+) -> Dict[str, int]:
+    """Write the rows of ``missing_path`` to ``collection`` in batched commits.
+
+    Documents are keyed by :func:`save_index.idempotency_key`, like
+    ``save_row``, so each holds the latest mark of a student and assignment:
+    of several rows with one key only the latest is written, and a document
+    that already holds a later ``date`` is left alone.  Running the repair
+    twice writes the same documents.
+
+    The file is read in chunks and split into partition files by key, like
+    :func:`reconcile`, so only one partition and one batch are in memory.
+    """
+    stats = {"written": 0, "skipped older": 0, "batches": 0}
+    work = tempfile.mkdtemp(prefix="reconcile-repair-")
+    try:
+        counts = _partition(_missing_rows(missing_path, chunk_size), work, 0, partitions, LATEST_KEY_COLUMNS)
+        for part in sorted(counts):
+            rows = _read_partition(os.path.join(work, f"{part}.csv")).sort_values("date", kind="stable")
+            latest = rows.drop_duplicates("_key", keep="last")
+            stats["skipped older"] += len(rows) - len(latest)
+            records = latest[list(SCORES_COLUMNS)].to_dict("records")
+            for start in range(0, len(records), batch_size):
+                _write_latest(db, collection, records[start:start + batch_size], stats)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return stats
+
+
+def _write_latest(db: Any, collection: str, rows: List[Dict[str, Any]], stats: Dict[str, int]) -> None:
+    """Commit one batch of ``rows``, skipping those older than their existing document."""
+    refs = [db.collection(collection).document(idempotency_key(row)) for row in rows]
+    current = {snap.id: snap.to_dict() or {} for snap in db.get_all(refs) if snap.exists}
+    batch, writes = db.batch(), 0
+    for ref, row in zip(refs, rows):
+        if ref.id in current and str(current[ref.id].get("date", "")) > str(row["date"]):
+            stats["skipped older"] += 1
+            continue
+        batch.set(ref, _typed(dict(row)))
+        writes += 1
+    if writes:
+        batch.commit()
+        stats["written"] += writes
+        stats["batches"] += 1
+
+
+def repair_sheet(
+    post: Callable[[Dict[str, Any]], Any], missing_path: str, token: str, chunk_size: int = CHUNK_SIZE
+) -> Dict[str, int]:
+    """Append the rows of ``missing_path`` to the Scores sheet through the webhook.
+
+    ``post`` is normally :meth:`webhook_utils.WebhookClient.post`, which
+    paces the requests to the script's quota.  The sheet keeps the whole
+    history, so every missing ``(studentcode, assignment, date)`` row is
+    appended as it is.
+    """
+    stats = {"written": 0, "failed": 0}
+    for chunk in _missing_rows(missing_path, chunk_size):
+        for row in chunk[list(SCORES_COLUMNS)].to_dict("records"):
+            row = _typed(row)
+            try:
+                r = post({"token": token, "row": row})
+                ok = 200 <= r.status_code < 300
+            except Exception:
+                ok = False
+            stats["written" if ok else "failed"] += 1
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Reconcile scores_backup.csv with the live scores.")
+    parser.add_argument("--backup", default="scores_backup.csv")
+    parser.add_argument("--against", choices=("sheet", "firestore", "csv"), default="sheet")
+    parser.add_argument("--sheet-id", default=os.environ.get("SCORES_SHEET_ID", ""))
+    parser.add_argument("--tab", default=os.environ.get("SCORES_SHEET_TAB", "Scores"))
+    parser.add_argument("--collection", default="scores")
+    parser.add_argument("--other", default="", help="CSV to compare with when --against csv")
+    parser.add_argument("--out", default="reconcile")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--partitions", type=int, default=PARTITIONS)
+    parser.add_argument("--max-partition-rows", type=int, default=MAX_PARTITION_ROWS)
+    parser.add_argument(
+        "--repair", choices=("none", "backup", "live"), default="none",
+        help="backup: append live-only rows to the backup; live: write backup-only rows to the live side",
+    )
+    parser.add_argument("--webhook-url", default=os.environ.get("G_SHEETS_WEBHOOK_URL", ""))
+    parser.add_argument("--webhook-token", default=os.environ.get("G_SHEETS_WEBHOOK_TOKEN", ""))
+    args = parser.parse_args(argv)
+
+    db = None
+    if args.against == "sheet":
+        from sheets_utils import stream_sheet_csv
+
+        if not args.sheet_id:
+            parser.error("--sheet-id (or SCORES_SHEET_ID) is required with --against sheet")
+        right = csv_chunks(stream_sheet_csv(args.sheet_id, args.tab, SCORES_COLUMNS), args.chunk_size)
+    elif args.against == "firestore":
+        from firebase_utils import get_firestore_client
+
+        db = get_firestore_client()
+        right = firestore_chunks(db, args.collection, args.chunk_size)
+    else:
+        if not args.other:
+            parser.error("--other is required with --against csv")
+        right = csv_chunks(args.other, args.chunk_size)
+
+    report = reconcile(
+        csv_chunks(args.backup, args.chunk_size), right, args.out,
+        left_name="backup", right_name=args.against,
+        partitions=args.partitions, max_partition_rows=args.max_partition_rows, chunk_size=args.chunk_size,
+        key_columns=LATEST_KEY_COLUMNS if args.against == "firestore" else KEY_COLUMNS,
+    )
+    if args.repair == "backup":
+        report["repaired"] = {"appended": repair_csv(args.backup, os.path.join(args.out, "missing_in_backup.csv"))}
+    elif args.repair == "live":
+        missing = os.path.join(args.out, f"missing_in_{args.against}.csv")
+        if args.against == "firestore":
+            report["repaired"] = repair_firestore(db, missing, args.collection)
+        elif args.against == "csv":
+            report["repaired"] = {"appended": repair_csv(args.other, missing)}
+        else:
+            from webhook_utils import WebhookClient
+
+            if not args.webhook_url:
+                parser.error("--webhook-url (or G_SHEETS_WEBHOOK_URL) is required to repair the sheet")
+            client = WebhookClient(args.webhook_url)
+            report["repaired"] = repair_sheet(client.post, missing, args.webhook_token)
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
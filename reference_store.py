@@ -0,0 +1,84 @@
+"""Process-wide store of immutable reference answers.
+
+Every session used to copy the chosen reference's text, link, format and
+answers map into ``st.session_state``.  :class:`ReferenceStore` builds each
+reference once per process as a frozen :class:`Reference` and hands the
+same object to every session, so a session only keeps the assignment key.
+
+Entries are keyed by assignment and remember a digest of the dictionary row
+they were built from; when the answers dictionary changes, the next
+:meth:`ReferenceStore.get` for that key rebuilds it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from perf_utils import deep_sizeof
+
+# ``build(row)`` -> ``(text, link, format, answers)``, e.g. build_reference_text_from_json
+Build = Callable[[Dict[str, Any]], Tuple[str, str, str, Dict[int, str]]]
+
+
+@dataclass(frozen=True)
+class Reference:
+    """One assignment's reference, shared read-only between sessions."""
+
+    key: str
+    text: str
+    link: str
+    format: str
+    answers: Mapping[int, str] = field(default_factory=lambda: MappingProxyType({}))
+
+
+EMPTY_REFERENCE = Reference(key="", text="", link="", format="essay")
+
+
+def _row_digest(row: Dict[str, Any]) -> str:
+    raw = json.dumps(row, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ReferenceStore:
+    """Interned :class:`Reference` objects by assignment key."""
+
+    def __init__(self, build: Build) -> None:
+        self._build = build
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[str, Reference]] = {}
+        self.counters = {"hits": 0, "builds": 0}
+
+    def get(self, key: str, row: Optional[Dict[str, Any]]) -> Reference:
+        """The shared reference for ``key`` built from its dictionary ``row``."""
+        if not key or not row:
+            return EMPTY_REFERENCE
+        digest = _row_digest(row)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == digest:
+                self.counters["hits"] += 1
+                return entry[1]
+        text, link, fmt, answers = self._build(row)
+        ref = Reference(key=key, text=text, link=link, format=fmt, answers=MappingProxyType(dict(answers)))
+        with self._lock:
+            # Another session may have built it meanwhile; keep one object.
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == digest:
+                return entry[1]
+            self._entries[key] = (digest, ref)
+            self.counters["builds"] += 1
+        return ref
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            refs = [ref for _, ref in self._entries.values()]
+        return dict(self.counters, references=len(refs), kB=round(deep_sizeof(refs) / 1024, 1))
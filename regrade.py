@@ -0,0 +1,221 @@
+"""Re-mark provisional scores after an objective answer key is corrected.
+
+Every provisional auto-mark stores ``answers_hash``, a hash of the
+canonical answer key it was marked against (answers folded the way
+:func:`objective_mark` compares them, so an edit that only changes case,
+umlaut spelling or punctuation does not count as a change).
+
+:func:`regrade` finds the stale marks by comparing that hash with the hash
+of each assignment's current key, reads the affected posts with one
+``get_all`` per batch, re-marks them and writes the corrected marks back in
+batched commits.  A mark whose score and feedback come out the same only
+gets its ``answers_hash`` bumped.
+
+The keys regraded against are also recorded in the ``answer_keys``
+collection.  They are only used to show which question numbers changed
+(:func:`changed_questions`); whether a mark is stale never depends on them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from auto_marker import PROVISIONAL_COLLECTION
+from text_fold import canonical_answer
+
+ANSWER_KEYS_COLLECTION = "answer_keys"
+BATCH_SIZE = 400  # below Firestore's 500 writes per commit
+
+# ``remark(level, post_id, data)`` -> new provisional fields, or ``None``
+Remark = Callable[[str, str, Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+def canonical_key(answers: Dict[Any, Any]) -> Dict[int, str]:
+    """``{question number: canonical answer}`` of a raw answers map."""
+    return {int(n): canonical_answer(str(a)) for n, a in (answers or {}).items()}
+
+
+def key_hash(answers: Dict[Any, Any]) -> str:
+    """Short hash of the canonical form of an answer key."""
+    raw = json.dumps(sorted(canonical_key(answers).items()))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def changed_questions(old: Dict[Any, Any], new: Dict[Any, Any]) -> List[int]:
+    """Question numbers added, removed or answered differently between two keys."""
+    old_c, new_c = canonical_key(old), canonical_key(new)
+    return sorted(n for n in set(old_c) | set(new_c) if old_c.get(n) != new_c.get(n))
+
+
+def _doc_id(assignment: str) -> str:
+    return assignment.replace("/", "_")
+
+
+def load_keys(db: Any, collection: str = ANSWER_KEYS_COLLECTION) -> Dict[str, Dict[int, str]]:
+    """Canonical keys recorded by the last regrade, by assignment."""
+    keys: Dict[str, Dict[int, str]] = {}
+    for snap in db.collection(collection).stream():
+        data = snap.to_dict() or {}
+        if data.get("assignment"):
+            keys[data["assignment"]] = canonical_key(data.get("answers") or {})
+    return keys
+
+
+def stale_marks(
+    db: Any, current: Dict[str, Dict[Any, Any]], collection: str = PROVISIONAL_COLLECTION
+) -> Dict[str, List[Tuple[str, Dict[str, Any]]]]:
+    """``{assignment: [(doc id, mark)]}`` of marks not made against the current key."""
+    hashes = {a: key_hash(answers) for a, answers in current.items()}
+    stale: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+    for snap in db.collection(collection).stream():
+        doc = snap.to_dict() or {}
+        assignment = doc.get("assignment")
+        if assignment not in hashes or not doc.get("level") or not doc.get("post_id"):
+            continue
+        if doc.get("answers_hash") != hashes[assignment]:
+            stale.setdefault(assignment, []).append((snap.id, doc))
+    return stale
+
+
+def _queue_keys(
+    writes: "_Batches",
+    collection: str,
+    current: Dict[str, Dict[Any, Any]],
+    recorded: Dict[str, Dict[int, str]],
+    recorded_at: float,
+) -> None:
+    """Queue a write for every key in ``current`` that differs from ``recorded``."""
+    for assignment, answers in current.items():
+        canonical = canonical_key(answers)
+        if recorded.get(assignment) == canonical:
+            continue
+        writes.add(
+            "set",
+            writes.db.collection(collection).document(_doc_id(assignment)),
+            {
+                "assignment": assignment,
+                "answers": {str(n): a for n, a in canonical.items()},
+                "answers_hash": key_hash(answers),
+                "recorded_at": recorded_at,
+            },
+        )
+
+
+def save_keys(db: Any, current: Dict[str, Dict[Any, Any]], collection: str = ANSWER_KEYS_COLLECTION) -> int:
+    """Record ``current`` as the keys the marks use (when none are stale); returns the writes."""
+    writes = _Batches(db, BATCH_SIZE)
+    _queue_keys(writes, collection, current, load_keys(db, collection), time.time())
+    writes.flush()
+    return writes.writes
+
+
+class _Batches:
+    """Collect writes and commit them ``size`` at a time."""
+
+    def __init__(self, db: Any, size: int) -> None:
+        self.db, self.size = db, size
+        self.ops: List[Tuple[str, Any, Optional[Dict[str, Any]]]] = []
+        self.writes = self.batches = 0
+
+    def add(self, op: str, ref: Any, data: Optional[Dict[str, Any]] = None) -> None:
+        self.ops.append((op, ref, data))
+        if len(self.ops) >= self.size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.ops:
+            return
+        batch = self.db.batch()
+        for op, ref, data in self.ops:
+            if op == "delete":
+                batch.delete(ref)
+            else:
+                getattr(batch, op)(ref, data)
+        batch.commit()
+        self.writes += len(self.ops)
+        self.batches += 1
+        self.ops = []
+
+
+def regrade(
+    db: Any,
+    current: Dict[str, Dict[Any, Any]],
+    remark: Remark,
+    collection: str = PROVISIONAL_COLLECTION,
+    keys_collection: str = ANSWER_KEYS_COLLECTION,
+    batch_size: int = BATCH_SIZE,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """Re-mark the provisional marks whose ``answers_hash`` is not that of ``current``.
+
+    ``current`` maps each objective assignment to its raw answers map.  The
+    report has, per assignment with stale marks, the changed questions
+    (``None`` when no earlier key was recorded) and the stale count, plus
+    the counts of re-scored, unchanged and no-longer-markable marks.  With
+    ``dry_run`` nothing is written.
+    """
+    recorded = load_keys(db, keys_collection)
+    by_assignment = stale_marks(db, current, collection)
+    stale = [item for items in by_assignment.values() for item in items]
+    report: Dict[str, Any] = {
+        # None: no key recorded for the assignment yet, so the diff is unknown
+        "changed questions": {
+            a: changed_questions(recorded[a], current[a]) if a in recorded else None for a in by_assignment
+        },
+        "stale marks": {a: len(items) for a, items in by_assignment.items()},
+        "stale": len(stale),
+        "rescored": 0,
+        "unchanged": 0,
+        "not markable": 0,
+        "missing posts": 0,
+        "errors": 0,
+        "writes": 0,
+        "batches": 0,
+    }
+    if dry_run:
+        return report
+
+    failed = set()
+    writes = _Batches(db, batch_size)
+    regraded_at = time.time()
+    for start in range(0, len(stale), batch_size):
+        chunk = stale[start:start + batch_size]
+        refs = [
+            db.collection("submissions").document(doc["level"]).collection("posts").document(doc["post_id"])
+            for _, doc in chunk
+        ]
+        posts = {snap.reference.path: snap for snap in db.get_all(refs)}
+        for (doc_id, doc), ref in zip(chunk, refs):
+            target = db.collection(collection).document(doc_id)
+            snap = posts.get(ref.path)
+            if snap is None or not snap.exists:
+                report["missing posts"] += 1
+                writes.add("delete", target)
+                continue
+            try:
+                result = remark(doc["level"], doc["post_id"], snap.to_dict() or {})
+            except Exception:
+                report["errors"] += 1
+                failed.add(doc["assignment"])
+                continue
+            if result is None:
+                report["not markable"] += 1
+                writes.add("delete", target)
+            elif all(result.get(k) == doc.get(k) for k in ("score", "feedback", "link")):
+                report["unchanged"] += 1
+                writes.add("update", target, {"answers_hash": result.get("answers_hash", ""), "regraded_at": regraded_at})
+            else:
+                report["rescored"] += 1
+                writes.add(
+                    "update",
+                    target,
+                    dict(result, previous_score=doc.get("score"), regraded_at=regraded_at),
+                )
+    # Record the keys the marks now use, for the next run's question diff.
+    _queue_keys(writes, keys_collection, {a: k for a, k in current.items() if a not in failed}, recorded, regraded_at)
+    writes.flush()
+    report["writes"], report["batches"] = writes.writes, writes.batches
+    return report
@@ -0,0 +1,405 @@
+"""Batch rendering of per-student PDF report cards.
+
+:func:`build_report_cards` groups a level's score rows by student and
+:func:`render_report_cards` renders one PDF per student on a process pool,
+yielding each card's result as soon as its worker has written it.  The
+pool is created once per process (:func:`worker_pool`) and reused by every
+render.  Its workers are separate Python processes started from the small
+entry module :mod:`report_workers`, so they never import the calling script.
+
+Every worker sets itself up once in :func:`_init_worker`: it loads the
+report font and precomputes the page layout, and keeps both for all the
+cards it renders.  fpdf2 subsets the embedded font in place while writing
+a document, so a parsed font cannot be shared between documents; instead
+the parent writes a Latin/punctuation subset of ``font/DejaVuSans.ttf``
+once (cached under ``.cache/fonts``), which loads and embeds in well
+under half the time of the full font.  Cards with characters outside
+the subset fall back to the full font.
+
+Command line::
+
+    python report_cards.py --level A2 --scores scores_backup.csv --students students.csv --out reports
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import pickle
+import queue
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+FONT_PATH = os.path.join(ROOT, "font", "DejaVuSans.ttf")
+FONT_CACHE_DIR = os.path.join(".cache", "fonts")
+# Latin incl. extensions (Ɛ, Ɔ in Ghanaian names), IPA, punctuation, currency, arrows
+SUBSET_RANGES = ((0x20, 0x2AF), (0x2000, 0x206F), (0x20A0, 0x20CF), (0x2190, 0x21FF))
+PASS_MARK = 60
+
+
+@dataclass
+class ReportCard:
+    code: str
+    name: str
+    level: str
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def average(self) -> Optional[float]:
+        scores = [r["score"] for r in self.rows if r.get("score") is not None]
+        return round(sum(scores) / len(scores), 1) if scores else None
+
+    @property
+    def filename(self) -> str:
+        safe = re.sub(r"[^\w.-]+", "_", f"{self.level}_{self.code or self.name}")
+        return f"{safe}.pdf"
+
+    def text(self) -> str:
+        """Everything that will be printed, used to pick the font."""
+        parts = [self.code, self.name, self.level]
+        for r in self.rows:
+            parts += [str(r.get(k, "")) for k in ("assignment", "comments", "date", "link")]
+        return "".join(parts)
+
+
+def _score(value: Any) -> Optional[float]:
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if pd.isna(score) else score
+
+
+def build_report_cards(
+    scores: pd.DataFrame,
+    level: str,
+    links: Optional[Dict[str, str]] = None,
+    students: Optional[pd.DataFrame] = None,
+) -> List[ReportCard]:
+    """One :class:`ReportCard` per student of ``level``.
+
+    ``scores`` has the Scores sheet columns (``studentcode``, ``name``,
+    ``assignment``, ``score``, ``comments``, ``date``, ``level``).  Reference
+    links come from a ``link`` column when present, otherwise from
+    ``links[assignment]``, and are only shown for passing scores, as when
+    saving.  Students listed in ``students`` without any score still get a
+    card.  Rows without a student code are skipped.
+    """
+    links = links or {}
+    want = str(level).strip().lower()
+    mine = scores[scores["level"].astype(str).str.strip().str.lower() == want]
+    cards: Dict[str, ReportCard] = {}
+    for row in mine.to_dict("records"):
+        code = str(row.get("studentcode") or "").strip()
+        if not code:
+            continue
+        card = cards.setdefault(code.lower(), ReportCard(code, str(row.get("name") or ""), str(level)))
+        score = _score(row.get("score"))
+        link = str(row.get("link") or "") or links.get(str(row.get("assignment", "")), "")
+        card.rows.append(
+            {
+                "assignment": str(row.get("assignment") or ""),
+                "score": score,
+                "comments": "" if pd.isna(row.get("comments")) else str(row.get("comments") or ""),
+                "date": str(row.get("date") or ""),
+                "link": link if score is not None and score >= PASS_MARK else "",
+            }
+        )
+    if students is not None:
+        roster = students[students["level"].astype(str).str.strip().str.lower() == want]
+        for row in roster.to_dict("records"):
+            code = str(row.get("studentcode") or "").strip()
+            if code:
+                cards.setdefault(code.lower(), ReportCard(code, str(row.get("name") or ""), str(level)))
+    for card in cards.values():
+        card.rows.sort(key=lambda r: (r["date"], r["assignment"]))
+    return sorted(cards.values(), key=lambda c: (c.name.lower(), c.code))
+
+
+# ---------------------------------------------------------------------------
+# Fonts
+# ---------------------------------------------------------------------------
+
+
+def subset_font(src: str = FONT_PATH, cache_dir: str = FONT_CACHE_DIR) -> str:
+    """Path of the :data:`SUBSET_RANGES` subset of ``src``, created on first use."""
+    from fontTools import subset
+
+    base = os.path.splitext(os.path.basename(src))[0]
+    path = os.path.join(cache_dir, f"{base}-latin.ttf")
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(src):
+        return path
+    os.makedirs(cache_dir, exist_ok=True)
+    options = subset.Options()
+    options.notdef_outline = True
+    options.layout_features = ["*"]
+    options.drop_tables += ["FFTM"]
+    font = subset.load_font(src, options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=[u for lo, hi in SUBSET_RANGES for u in range(lo, hi + 1)])
+    subsetter.subset(font)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    subset.save_font(font, tmp, options)
+    os.replace(tmp, path)
+    return path
+
+
+def _codepoints(font_path: str) -> Set[int]:
+    from fontTools import ttLib
+
+    return set(ttLib.TTFont(font_path, lazy=True).getBestCmap())
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class _Layout:
+    """Page geometry and fixed strings, computed once per worker."""
+
+    title: str
+    page_width: float = 210
+    margin: float = 15
+    line: float = 6
+    generated: str = field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d"))
+
+    def __post_init__(self) -> None:
+        usable = self.page_width - 2 * self.margin
+        self.col_assignment = usable * 0.62
+        self.col_score = usable * 0.14
+        self.col_date = usable - self.col_assignment - self.col_score
+        self.usable = usable
+
+
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_worker(font_path: str, fallback_font_path: str, title: str) -> None:
+    """Worker setup (see :mod:`report_workers`): cache the font choice and the layout."""
+    _WORKER.clear()
+    _WORKER.update(
+        font=font_path,
+        fallback_font=fallback_font_path,
+        glyphs=_codepoints(font_path),
+        layout=_Layout(title),
+    )
+
+
+def _render(card: ReportCard) -> bytes:
+    from fpdf import FPDF
+
+    if not _WORKER:
+        _init_worker(FONT_PATH, FONT_PATH, "Report card")
+    layout: _Layout = _WORKER["layout"]
+    glyphs: Set[int] = _WORKER["glyphs"]
+    font = _WORKER["font"] if all(ord(ch) in glyphs for ch in card.text()) else _WORKER["fallback_font"]
+
+    pdf = FPDF(format="A4")
+    pdf.set_margins(layout.margin, layout.margin)
+    pdf.set_auto_page_break(True, margin=layout.margin)
+    pdf.add_font("Report", fname=font)
+    pdf.add_page()
+
+    pdf.set_font("Report", size=16)
+    pdf.cell(0, 10, layout.title, new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font("Report", size=11)
+    pdf.cell(0, layout.line, f"{card.name} ({card.code}) · Level {card.level}", new_x="LMARGIN", new_y="NEXT")
+    average = "—" if card.average is None else f"{card.average:g}"
+    pdf.cell(
+        0, layout.line, f"Assignments marked: {len(card.rows)} · Average score: {average}",
+        new_x="LMARGIN", new_y="NEXT",
+    )
+    pdf.set_font("Report", size=8)
+    pdf.cell(0, layout.line, f"Generated {layout.generated}", new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(2)
+
+    pdf.set_font("Report", size=10)
+    pdf.set_fill_color(230, 230, 230)
+    pdf.cell(layout.col_assignment, 7, "Assignment", border=1, fill=True)
+    pdf.cell(layout.col_score, 7, "Score", border=1, fill=True, align="C")
+    pdf.cell(layout.col_date, 7, "Date", border=1, fill=True, new_x="LMARGIN", new_y="NEXT")
+    for row in card.rows:
+        score = "—" if row["score"] is None else f"{row['score']:g}"
+        pdf.set_font("Report", size=10)
+        pdf.cell(layout.col_assignment, 7, row["assignment"][:70], border="LTR")
+        pdf.cell(layout.col_score, 7, score, border="LTR", align="C")
+        pdf.cell(layout.col_date, 7, row["date"], border="LTR", new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font("Report", size=8)
+        if row["comments"]:
+            pdf.multi_cell(layout.usable, 4.5, row["comments"], border="LR", new_x="LMARGIN", new_y="NEXT")
+        if row["link"]:
+            pdf.set_text_color(30, 80, 200)
+            pdf.cell(layout.usable, 4.5, "Reference answers", border="LR", link=row["link"], new_x="LMARGIN", new_y="NEXT")
+            pdf.set_text_color(0, 0, 0)
+        pdf.cell(layout.usable, 0, "", border="T", new_x="LMARGIN", new_y="NEXT")
+    if not card.rows:
+        pdf.cell(0, layout.line, "No marked assignments yet.", new_x="LMARGIN", new_y="NEXT")
+    return bytes(pdf.output())
+
+
+def render_card_to_file(card: ReportCard, out_dir: str) -> str:
+    """Render ``card`` into ``out_dir`` (atomically) and return the file path."""
+    data = _render(card)
+    path = os.path.join(out_dir, card.filename)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Parent side
+# ---------------------------------------------------------------------------
+
+
+class WorkerPool:
+    """Worker processes started from :mod:`report_workers`, one card at a time each.
+
+    Every worker is started and set up when the pool is created.  A card
+    that fails to render is answered with its error and the worker carries
+    on; a worker that exits is replaced, and only its current card fails.
+    """
+
+    def __init__(self, workers: int, font_path: str, fallback_font_path: str, title: str) -> None:
+        self.args = [font_path, fallback_font_path, title]
+        self._lock = threading.Lock()
+        self._idle: "queue.Queue[subprocess.Popen]" = queue.Queue()
+        self.processes = [self._launch() for _ in range(workers)]
+        for proc in self.processes:
+            self._ready(proc)
+            self._idle.put(proc)
+        self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-card")
+
+    def _launch(self) -> subprocess.Popen:
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+        return subprocess.Popen(
+            [sys.executable, "-m", "report_workers", *self.args],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+        )
+
+    @staticmethod
+    def _ready(proc: subprocess.Popen) -> None:
+        try:
+            ok, value = pickle.load(proc.stdout)
+        except EOFError:
+            ok, value = False, f"exited with code {proc.wait()}"
+        if not ok:
+            proc.kill()
+            raise RuntimeError(f"Report-card worker did not start: {value}")
+
+    def _replace(self, proc: subprocess.Popen) -> subprocess.Popen:
+        proc.kill()
+        proc.wait()
+        fresh = self._launch()
+        self._ready(fresh)
+        with self._lock:
+            self.processes[self.processes.index(proc)] = fresh
+        return fresh
+
+    def _run(self, fields: Dict[str, Any], out_dir: str) -> Tuple[bool, str]:
+        proc = self._idle.get()
+        try:
+            pickle.dump((fields, out_dir), proc.stdin)
+            proc.stdin.flush()
+            return pickle.load(proc.stdout)
+        except (EOFError, OSError, pickle.UnpicklingError):
+            proc = self._replace(proc)
+            return False, "worker process exited"
+        finally:
+            self._idle.put(proc)
+
+    def submit(self, card: ReportCard, out_dir: str) -> "Future[Tuple[bool, str]]":
+        """Render ``card`` into ``out_dir`` on the next free worker: ``(True, path)`` or ``(False, error)``."""
+        return self._threads.submit(self._run, asdict(card), out_dir)
+
+    @property
+    def pids(self) -> List[int]:
+        with self._lock:
+            return [proc.pid for proc in self.processes]
+
+
+_POOLS: Dict[Tuple[int, str, str, str], WorkerPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def worker_pool(workers: int, font_path: str, fallback_font_path: str, title: str) -> WorkerPool:
+    """The process-wide pool for these settings, created and fully started on first use."""
+    key = (workers, font_path, fallback_font_path, title)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = WorkerPool(workers, font_path, fallback_font_path, title)
+    return pool
+
+
+def render_report_cards(
+    cards: List[ReportCard],
+    out_dir: str,
+    workers: Optional[int] = None,
+    title: str = "Report card",
+    font_path: str = FONT_PATH,
+) -> Iterator[Dict[str, Any]]:
+    """Render ``cards`` on the worker pool and yield a result for each as it completes.
+
+    Results are ``{"ok": True, "code", "path"}`` or ``{"ok": False, "code",
+    "error"}``; a card that fails does not stop the others.
+    """
+    if not cards:
+        return
+    out_dir = os.path.abspath(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    small_font = subset_font(font_path)
+    workers = max(1, workers or os.cpu_count() or 1)
+    pool = worker_pool(workers, small_font, font_path, title)
+    futures = {pool.submit(card, out_dir): card for card in cards}
+    for future in as_completed(futures):
+        ok, value = future.result()
+        code = futures[future].code
+        yield {"ok": True, "code": code, "path": value} if ok else {"ok": False, "code": code, "error": value}
+
+
+def main(argv: Optional[List[str]] = None) -> List[str]:
+    from sheets_utils import parse_sheet_csv
+
+    parser = argparse.ArgumentParser(description="Render PDF report cards for one level.")
+    parser.add_argument("--level", required=True)
+    parser.add_argument("--scores", default="scores_backup.csv", help="Scores sheet exported as CSV")
+    parser.add_argument("--students", default="", help="students CSV, to include students without scores")
+    parser.add_argument("--out", default="reports")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    with open(args.scores, "rb") as f:
+        scores = parse_sheet_csv(f.read())
+    students = None
+    if args.students:
+        with open(args.students, "rb") as f:
+            students = parse_sheet_csv(f.read())
+    cards = build_report_cards(scores, args.level, students=students)
+    started = time.perf_counter()
+    paths = []
+    for result in render_report_cards(cards, os.path.join(args.out, args.level), workers=args.workers):
+        if result["ok"]:
+            paths.append(result["path"])
+            print(result["path"])
+        else:
+            print(f"{result['code']}: {result['error']}", file=sys.stderr)
+    print(f"{len(paths)} report cards in {time.perf_counter() - started:.2f}s")
+    return paths
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Entry module of the report-card worker processes.
+
+:class:`report_cards.WorkerPool` starts each worker as
+``python -m report_workers FONT FALLBACK_FONT TITLE``, so a worker only
+imports :mod:`report_cards` and never the script that started it (under
+``streamlit run`` that would be the whole app).
+
+A worker sets itself up once, answers ``(True, pid)`` on stdout, then reads
+pickled ``(card fields, out_dir)`` requests from stdin and answers each with
+a pickled ``(True, path)`` or ``(False, error)``.  It exits when stdin is
+closed.
+"""
+
+from __future__ import annotations
+
+import os
+import pickle
+import sys
+from typing import Any, BinaryIO, List, Optional
+
+
+def _reply(out: BinaryIO, ok: bool, value: Any) -> None:
+    pickle.dump((ok, value), out)
+    out.flush()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    font_path, fallback_font_path, title = argv if argv is not None else sys.argv[1:]
+    # Answers go to the real stdout; anything a library prints goes to stderr.
+    out = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    try:
+        from report_cards import ReportCard, _init_worker, render_card_to_file
+
+        _init_worker(font_path, fallback_font_path, title)
+    except Exception as exc:
+        _reply(out, False, f"{type(exc).__name__}: {exc}")
+        return
+    _reply(out, True, os.getpid())
+
+    requests = sys.stdin.buffer
+    while True:
+        try:
+            fields, out_dir = pickle.load(requests)
+        except EOFError:
+            return
+        try:
+            _reply(out, True, render_card_to_file(ReportCard(**fields), out_dir))
+        except Exception as exc:
+            _reply(out, False, f"{type(exc).__name__}: {exc}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Sync the students sheet to a Firestore ``students`` collection.
+
+Every student row is hashed and compared with a manifest of the hashes
+written last time, so a sync only writes students that are new or changed
+and deletes those no longer on the sheet.  Writes go out in batched
+commits.  When little has changed the whole job costs a handful of
+writes, and other tools can read one student by code
+(:func:`read_student`) instead of downloading the sheet.
+
+A sheet without a student-code column or without any students, or one
+that would delete more than ``MAX_DELETE_FRACTION`` of the synced students,
+is refused with :class:`RosterSyncError` (``--allow-deletes`` accepts the
+deletes) so a broken export cannot empty the collection.
+
+The manifest is a local JSON file.  It is only an optimization: each
+document also stores its ``row_hash``, so when the manifest is missing it
+is rebuilt from the collection (reads, not writes).
+
+Example::
+
+    python roster_sync.py --csv students.csv          # or --sheet-id ... --tab Sheet1
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+STUDENTS_COLLECTION = "students"
+MANIFEST_PATH = os.path.join(".cache", "roster_manifest.json")
+BATCH_SIZE = 400  # below Firestore's 500 writes per commit
+CODE_FIELD = "studentcode"
+MAX_DELETE_FRACTION = 0.10  # of the synced students, refused without allow_deletes
+
+
+class RosterSyncError(ValueError):
+    """The sheet does not look like a complete roster; nothing was written."""
+
+
+def field_name(column: str) -> str:
+    """``"Emergency Contact (Phone Number)"`` -> ``"emergency_contact_phone_number"``."""
+    return re.sub(r"[^0-9a-z]+", "_", str(column).strip().lower()).strip("_")
+
+
+def student_id(code: str) -> str:
+    """Document id for a student code (case-insensitive, no ``/``)."""
+    return str(code).strip().lower().replace("/", "_")
+
+
+def row_hash(row: Dict[str, Any]) -> str:
+    raw = json.dumps(row, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def roster_rows(raw: bytes) -> Iterator[Tuple[str, Dict[str, str]]]:
+    """``(doc_id, fields)`` for every student in CSV bytes; rows without a code are skipped."""
+    df = pd.read_csv(io.BytesIO(raw), dtype=str, keep_default_na=False)
+    df.columns = [field_name(c) for c in df.columns]
+    if CODE_FIELD not in df.columns:
+        raise RosterSyncError(f"no student code column in the sheet (columns: {', '.join(df.columns)})")
+    for row in df.to_dict("records"):
+        row = {k: v.strip() for k, v in row.items()}
+        if row.get(CODE_FIELD):
+            yield student_id(row[CODE_FIELD]), row
+
+
+def load_manifest(path: str) -> Optional[Dict[str, str]]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(path: str, manifest: Dict[str, str]) -> None:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def manifest_from_collection(db: Any, collection: str = STUDENTS_COLLECTION) -> Dict[str, str]:
+    """Rebuild the manifest from the ``row_hash`` stored on each document."""
+    return {snap.id: (snap.to_dict() or {}).get("row_hash", "") for snap in db.collection(collection).stream()}
+
+
+def plan_sync(
+    rows: Iterable[Tuple[str, Dict[str, str]]], manifest: Dict[str, str], allow_deletes: bool = False
+) -> Tuple[List[Tuple[str, Dict[str, Any]]], List[str], Dict[str, int]]:
+    """Return ``(upserts, deletes, counts)`` needed to bring the collection up to date.
+
+    Raises :class:`RosterSyncError` when no students parse, or when more
+    than ``MAX_DELETE_FRACTION`` of ``manifest`` (at least one) would be
+    deleted and ``allow_deletes`` is not set.
+    """
+    current: Dict[str, Dict[str, Any]] = {}
+    duplicates = 0
+    for doc_id, row in rows:
+        if doc_id in current:
+            duplicates += 1  # the last row on the sheet wins
+        current[doc_id] = dict(row, row_hash=row_hash(row))
+    if not current:
+        raise RosterSyncError("no students with a student code in the sheet")
+    upserts = [(i, doc) for i, doc in current.items() if manifest.get(i) != doc["row_hash"]]
+    deletes = sorted(set(manifest) - set(current))
+    limit = max(1, int(MAX_DELETE_FRACTION * len(manifest)))
+    if len(deletes) > limit and not allow_deletes:
+        raise RosterSyncError(
+            f"{len(deletes)} of {len(manifest)} students would be deleted (limit {limit}); "
+            "check the sheet or pass --allow-deletes"
+        )
+    added = sum(1 for i, _ in upserts if i not in manifest)
+    counts = {
+        "students": len(current),
+        "added": added,
+        "changed": len(upserts) - added,
+        "removed": len(deletes),
+        "unchanged": len(current) - len(upserts),
+        "duplicate codes": duplicates,
+    }
+    return upserts, deletes, counts
+
+
+def sync_roster(
+    db: Any,
+    raw: bytes,
+    manifest_path: str = MANIFEST_PATH,
+    collection: str = STUDENTS_COLLECTION,
+    batch_size: int = BATCH_SIZE,
+    dry_run: bool = False,
+    allow_deletes: bool = False,
+) -> Dict[str, Any]:
+    """Write new/changed students and delete removed ones in batched commits.
+
+    The manifest is saved after every commit, so an interrupted sync picks
+    up where it stopped.  See :func:`plan_sync` for when it refuses.
+    """
+    manifest = load_manifest(manifest_path)
+    rebuilt = manifest is None
+    if manifest is None:
+        manifest = manifest_from_collection(db, collection)
+    upserts, deletes, counts = plan_sync(roster_rows(raw), manifest, allow_deletes)
+    report: Dict[str, Any] = dict(counts, writes=0, batches=0, manifest_rebuilt=rebuilt)
+    if dry_run:
+        return report
+
+    ops: List[Tuple[str, Optional[Dict[str, Any]]]] = [(i, doc) for i, doc in upserts]
+    ops += [(i, None) for i in deletes]
+    synced_at = time.time()
+    for start in range(0, len(ops), batch_size):
+        chunk = ops[start:start + batch_size]
+        batch = db.batch()
+        for doc_id, doc in chunk:
+            ref = db.collection(collection).document(doc_id)
+            if doc is None:
+                batch.delete(ref)
+            else:
+                batch.set(ref, dict(doc, synced_at=synced_at))
+        batch.commit()
+        for doc_id, doc in chunk:
+            if doc is None:
+                manifest.pop(doc_id, None)
+            else:
+                manifest[doc_id] = doc["row_hash"]
+        save_manifest(manifest_path, manifest)
+        report["writes"] += len(chunk)
+        report["batches"] += 1
+    if rebuilt and not ops:
+        save_manifest(manifest_path, manifest)
+    return report
+
+
+def read_student(db: Any, code: str, collection: str = STUDENTS_COLLECTION) -> Optional[Dict[str, Any]]:
+    """One student's synced row by student code, or ``None``."""
+    snap = db.collection(collection).document(student_id(code)).get()
+    return snap.to_dict() if snap.exists else None
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Sync the students sheet to Firestore.")
+    parser.add_argument("--csv", default="", help="students CSV instead of downloading the sheet")
+    parser.add_argument("--sheet-id", default=os.environ.get("STUDENTS_SHEET_ID", ""))
+    parser.add_argument("--tab", default=os.environ.get("STUDENTS_SHEET_TAB", "Sheet1"))
+    parser.add_argument("--collection", default=STUDENTS_COLLECTION)
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be written")
+    parser.add_argument(
+        "--allow-deletes", action="store_true",
+        help=f"delete more than {MAX_DELETE_FRACTION:.0%} of the synced students if the sheet says so",
+    )
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        with open(args.csv, "rb") as f:
+            raw = f.read()
+    elif args.sheet_id:
+        from sheets_utils import fetch_sheet_csv
+
+        raw = fetch_sheet_csv(args.sheet_id, args.tab)
+    else:
+        parser.error("pass --csv or --sheet-id (or set STUDENTS_SHEET_ID)")
+
+    from firebase_utils import get_firestore_client
+
+    db = get_firestore_client()
+    if db is None:
+        parser.error("Firestore is not configured (st.secrets['firebase'])")
+    try:
+        report = sync_roster(
+            db, raw, args.manifest, args.collection, dry_run=args.dry_run, allow_deletes=args.allow_deletes
+        )
+    except RosterSyncError as e:
+        parser.error(str(e))
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Idempotency keys for score rows and a local index of what was already saved.
+
+A score row is identified by ``(studentcode, assignment)``; its content hash
+covers every other field except the date.  :class:`SaveIndex` remembers,
+per target (``"sheet"`` or ``"firestore"``), the hash last written for each
+key, so saving an unchanged row is skipped.  A changed row overwrites the
+Firestore document named after its key, and is appended to the Scores
+sheet, which keeps the history of every mark.
+
+The index only saves writes, it is not needed for correctness: a write the
+index did not know about still lands on the same Firestore document, and
+on the sheet it only repeats a row.  Callers record a write only after it
+succeeded.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+IGNORED_FIELDS = ("date",)
+
+
+def idempotency_key(row: Dict[str, Any]) -> str:
+    """Stable id of the record ``row`` belongs to (safe as a Firestore document id)."""
+    code = str(row.get("studentcode", "")).strip().lower()
+    assignment = " ".join(str(row.get("assignment", "")).lower().split())
+    return hashlib.sha1(f"{code}|{assignment}".encode("utf-8")).hexdigest()[:24]
+
+
+def content_hash(row: Dict[str, Any]) -> str:
+    """Hash of the row's content, ignoring ``IGNORED_FIELDS``."""
+    content = {k: v for k, v in row.items() if k not in IGNORED_FIELDS}
+    raw = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SaveIndex:
+    """SQLite table of ``(key, target) -> content hash`` for rows already written."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        self.counters = {"insert": 0, "update": 0, "skip": 0}  # writes recorded, skips planned
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS saved ("
+                "key TEXT, target TEXT, hash TEXT, saved REAL, PRIMARY KEY (key, target))"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def plan(self, row: Dict[str, Any], target: str) -> Tuple[str, str, str]:
+        """Return ``(op, key, hash)`` where ``op`` is ``"insert"``, ``"update"`` or ``"skip"``.
+
+        Only skips are counted here; writes are counted by :meth:`record`.
+        """
+        key, digest = idempotency_key(row), content_hash(row)
+        found = self._conn().execute(
+            "SELECT hash FROM saved WHERE key = ? AND target = ?", (key, target)
+        ).fetchone()
+        if found is None:
+            op = "insert"
+        elif found[0] == digest:
+            op = "skip"
+        else:
+            op = "update"
+        if op == "skip":
+            self.counters["skip"] += 1
+        return op, key, digest
+
+    def record(self, key: str, target: str, digest: str) -> None:
+        """Remember that ``digest`` is now stored under ``key`` in ``target`` (after the write succeeded)."""
+        with self._conn() as conn:
+            found = conn.execute("SELECT 1 FROM saved WHERE key = ? AND target = ?", (key, target)).fetchone()
+            self.counters["update" if found else "insert"] += 1
+            conn.execute(
+                "INSERT OR REPLACE INTO saved (key, target, hash, saved) VALUES (?, ?, ?, ?)",
+                (key, target, digest, time.time()),
+            )
+
+    def stats(self) -> Dict[str, int]:
+        """Indexed rows per target plus this process's insert/update/skip counts."""
+        rows = self._conn().execute("SELECT target, COUNT(*) FROM saved GROUP BY target").fetchall()
+        return dict(self.counters, **{f"{target} rows": n for target, n in rows})
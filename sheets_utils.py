@@ -0,0 +1,113 @@
+"""Helpers for downloading Google Sheet tabs through the gviz CSV endpoint."""
+
+from __future__ import annotations
+
+import io
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import quote
+
+import pandas as pd
+import requests
+
+ROW_LIMIT = 100000
+
+# Columns that only take a handful of values are stored as categories and
+# money/score columns as numbers; everything else stays a string.
+CATEGORICAL_COLUMNS = ("level", "status")
+NUMERIC_COLUMNS = ("balance", "paid", "score")
+
+
+def _norm(name: str) -> str:
+    return str(name).lower().strip().replace(" ", "").replace("_", "")
+
+
+def gviz_csv_url(sheet_id: str, tab: str, query: str) -> str:
+    """Return the gviz CSV export URL for ``tab`` filtered by ``query``."""
+    return (
+        f"https://docs.google.com/spreadsheets/d/{sheet_id}/gviz/tq"
+        f"?tqx=out:csv&sheet={quote(tab)}&tq={quote(query)}"
+    )
+
+
+def column_letter(index: int) -> str:
+    """Return the sheet column id (``A``, ``B``, ... ``AA``) for a 0-based index."""
+    letters = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def select_query(header: Iterable[str], columns: Optional[Iterable[str]] = None) -> str:
+    """Build a gviz ``select`` for ``columns`` given the tab's ``header``.
+
+    The gviz query language addresses columns by letter, so the wanted
+    names are looked up in ``header`` using the same loose matching as
+    ``find_col`` (case, spaces and underscores ignored).  Names that are
+    not in the header are skipped; when none match every column is
+    selected so callers still get a usable frame.
+    """
+    wanted = {_norm(c) for c in columns or []}
+    letters = [column_letter(i) for i, h in enumerate(header) if _norm(h) in wanted]
+    cols = ", ".join(letters) if letters else "*"
+    return f"select {cols} limit {ROW_LIMIT}"
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert known low-cardinality and numeric columns in place and return ``df``."""
+    for col in df.columns:
+        n = _norm(col)
+        if n in CATEGORICAL_COLUMNS:
+            df[col] = df[col].str.strip().astype("category")
+        elif n in NUMERIC_COLUMNS:
+            cleaned = df[col].astype("string").str.replace(",", "", regex=False).str.strip()
+            df[col] = pd.to_numeric(cleaned, errors="coerce", downcast="float")
+    return df
+
+
+def _projected_url(sheet_id: str, tab: str, columns: Optional[Iterable[str]], timeout: float) -> str:
+    query = select_query([])
+    if columns:
+        head = requests.get(gviz_csv_url(sheet_id, tab, "select * limit 0"), timeout=timeout)
+        head.raise_for_status()
+        header = pd.read_csv(io.BytesIO(head.content), dtype=str, nrows=0).columns
+        query = select_query(header, columns)
+    return gviz_csv_url(sheet_id, tab, query)
+
+
+def fetch_sheet_csv(sheet_id: str, tab: str, columns: Optional[Iterable[str]] = None, timeout: float = 30) -> bytes:
+    """Download ``tab`` as raw CSV bytes, projected to ``columns`` when given."""
+    r = requests.get(_projected_url(sheet_id, tab, columns, timeout), timeout=timeout)
+    r.raise_for_status()
+    return r.content
+
+
+def stream_sheet_csv(sheet_id: str, tab: str, columns: Optional[Iterable[str]] = None, timeout: float = 30) -> Any:
+    """Like :func:`fetch_sheet_csv`, but a binary stream of the CSV instead of all of it in memory."""
+    r = requests.get(_projected_url(sheet_id, tab, columns, timeout), timeout=timeout, stream=True)
+    r.raise_for_status()
+    r.raw.decode_content = True  # undo gzip transfer encoding
+    return r.raw
+
+
+def parse_sheet_csv(raw: bytes) -> pd.DataFrame:
+    """Parse CSV bytes from :func:`fetch_sheet_csv` into a compact frame."""
+    df = pd.read_csv(io.BytesIO(raw), dtype=str)
+    df.columns = df.columns.str.strip().str.lower()
+    return compact_dtypes(df)
+
+
+def frame_memory_report(frames: Dict[str, pd.DataFrame]) -> List[Dict[str, Any]]:
+    """Return rows/columns/deep memory of each frame for the diagnostics panel."""
+    rows: List[Dict[str, Any]] = []
+    for name, df in frames.items():
+        rows.append(
+            {
+                "frame": name,
+                "rows": len(df),
+                "columns": len(df.columns),
+                "memory kB": round(float(df.memory_usage(deep=True).sum()) / 1024, 1),
+            }
+        )
+    return rows
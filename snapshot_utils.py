@@ -0,0 +1,205 @@
+"""On-disk snapshots of downloaded tables with stale-while-revalidate refresh."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+Fetch = Callable[[], bytes]
+Cached = Callable[[], Optional[bytes]]
+Parse = Callable[[bytes], pd.DataFrame]
+
+
+class SnapshotStore:
+    """Serve the last good copy of a table immediately and refresh it in the background.
+
+    Each key is persisted as a Parquet file next to a small JSON file holding
+    the SHA-256 of the raw download it was parsed from.  :meth:`load` never
+    waits on the network once a snapshot exists: it returns the snapshot and,
+    when the snapshot is older than ``max_age`` seconds, starts a background
+    thread that downloads the source again.  If the hash of the new download
+    matches the stored one nothing is parsed or rewritten; otherwise the new
+    frame replaces the snapshot and ``on_change(key)`` is called so callers
+    can drop anything derived from the old one.
+
+    After a write to the source, :meth:`invalidate` makes the next
+    :meth:`load` of that key revalidate before returning.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_age: float = 300,
+        on_change: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.root = root
+        self.max_age = max_age
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._frames: Dict[str, Tuple[str, pd.DataFrame]] = {}
+        self._checked: Dict[str, float] = {}
+        self._sources: Dict[str, Tuple[Fetch, Parse]] = {}
+        self._inflight: Dict[str, threading.Thread] = {}
+        self._key_locks: Dict[str, threading.RLock] = {}
+        self._stale: set = set()
+        self.errors: Dict[str, str] = {}
+
+    # ---------------- paths ----------------
+    def _key_lock(self, key: str) -> threading.RLock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.RLock())
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        base = os.path.join(self.root, name)
+        return base + ".parquet", base + ".json"
+
+    def _read_meta(self, key: str) -> Dict[str, float]:
+        _, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, key: str, digest: str, checked: float) -> None:
+        _, meta_path = self._paths(key)
+        tmp = f"{meta_path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "hash": digest, "checked": checked}, f)
+        os.replace(tmp, meta_path)
+
+    # ---------------- public API ----------------
+    def content_hash(self, key: str) -> Optional[str]:
+        """Return the hash of the snapshot currently served for ``key``."""
+        entry = self._frames.get(key)
+        return entry[0] if entry else self._read_meta(key).get("hash")
+
+    def load(self, key: str, fetch: Fetch, parse: Parse, cached: Optional[Cached] = None) -> pd.DataFrame:
+        """Return the snapshot for ``key``, fetching synchronously only if none exists.
+
+        ``fetch`` must download the source afresh.  ``cached`` may return a
+        copy downloaded elsewhere (e.g. by another replica) and is only
+        tried when there is no snapshot at all; revalidations never use it.
+        """
+        with self._lock:
+            self._sources[key] = (fetch, parse)
+            entry = self._frames.get(key)
+            stale = key in self._stale
+        if entry is None:
+            entry = self._load_from_disk(key)
+        if entry is None:
+            # Concurrent cold loads of the same key share one download.
+            with self._key_lock(key):
+                if key not in self._frames:
+                    raw = cached() if cached else None
+                    if raw is not None:
+                        self._store(key, raw, hashlib.sha256(raw).hexdigest(), time.time())
+                    else:
+                        self.revalidate(key)
+                with self._lock:
+                    self._stale.discard(key)
+            return self._frames[key][1]
+        if stale:
+            with self._lock:
+                self._stale.discard(key)
+            try:
+                self.revalidate(key)
+                self.errors.pop(key, None)
+            except Exception as e:  # serve the old snapshot
+                self.errors[key] = str(e)
+            return self._frames.get(key, entry)[1]
+        if time.time() - self._checked.get(key, 0) > self.max_age:
+            self.revalidate_async(key)
+        return entry[1]
+
+    def revalidate(self, key: str) -> bool:
+        """Download ``key`` again and return ``True`` if its content changed."""
+        with self._key_lock(key):
+            return self._revalidate_locked(key)
+
+    def _revalidate_locked(self, key: str) -> bool:
+        fetch, parse = self._sources[key]
+        raw = fetch()
+        digest = hashlib.sha256(raw).hexdigest()
+        now = time.time()
+        if digest == self.content_hash(key) and key in self._frames:
+            self._checked[key] = now
+            self._write_meta(key, digest, now)
+            return False
+
+        self._store(key, raw, digest, now)
+        return True
+
+    def _store(self, key: str, raw: bytes, digest: str, now: float) -> None:
+        _, parse = self._sources[key]
+        df = parse(raw)
+        os.makedirs(self.root, exist_ok=True)
+        data_path, _ = self._paths(key)
+        tmp = f"{data_path}.{threading.get_ident()}.tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, data_path)
+        self._write_meta(key, digest, now)
+        with self._lock:
+            self._frames[key] = (digest, df)
+            self._checked[key] = now
+        if self.on_change:
+            self.on_change(key)
+
+    def revalidate_async(self, key: str) -> None:
+        """Run :meth:`revalidate` in a daemon thread unless one is already running."""
+        with self._lock:
+            if key in self._inflight:
+                return
+            thread = threading.Thread(target=self._revalidate_quietly, args=(key,), daemon=True)
+            self._inflight[key] = thread
+        thread.start()
+
+    def invalidate(self, key: str) -> None:
+        """Make the next :meth:`load` of ``key`` download it again before returning."""
+        with self._lock:
+            self._stale.add(key)
+            self._checked[key] = 0
+
+    def refresh(self) -> List[str]:
+        """Revalidate every known key now and return the keys that changed."""
+        self.wait()
+        return [key for key in list(self._sources) if self.revalidate(key)]
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Block until background revalidations have finished."""
+        for thread in list(self._inflight.values()):
+            thread.join(timeout)
+
+    # ---------------- internals ----------------
+    def _load_from_disk(self, key: str) -> Optional[Tuple[str, pd.DataFrame]]:
+        data_path, _ = self._paths(key)
+        meta = self._read_meta(key)
+        if not meta.get("hash") or not os.path.exists(data_path):
+            return None
+        try:
+            df = pd.read_parquet(data_path)
+        except Exception:  # pragma: no cover - corrupt snapshot, fetch afresh
+            return None
+        entry = (str(meta["hash"]), df)
+        with self._lock:
+            self._frames[key] = entry
+            # A restart always triggers one background check of the snapshot.
+            self._checked[key] = 0
+        return entry
+
+    def _revalidate_quietly(self, key: str) -> None:
+        try:
+            self.revalidate(key)
+            self.errors.pop(key, None)
+        except Exception as e:  # keep serving the old snapshot
+            self.errors[key] = str(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
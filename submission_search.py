@@ -0,0 +1,244 @@
+"""Full-text search over every submission, across levels.
+
+:class:`SubmissionIndex` keeps an SQLite FTS5 inverted index of the post
+texts next to a table of per-post metadata (level, student, assignment,
+chapter, timestamp), so "who wrote this phrase" is a single ranked query
+(``bm25``) instead of opening every student in turn.
+
+Text is folded with :func:`text_fold.fold_umlauts` (lower case, ``ä`` ->
+``ae``, ``ö`` -> ``oe``, ``ü`` -> ``ue``, ``ß`` -> ``ss``) before it is indexed, and queries are folded the same way, so "Grüße" finds
+"gruesse" and vice versa.
+
+The index is maintained incrementally: :meth:`SubmissionIndex.watch`
+subscribes to ``submissions/{level}/posts`` and applies every change; a
+post whose text and metadata are unchanged costs one lookup.  Posts
+deleted while no listener ran are dropped when the first snapshot of their
+level arrives without them.  Listeners deliver that first snapshot
+asynchronously; :meth:`SubmissionIndex.ready` says whether it has been
+applied, so callers can tell an empty result from one still loading.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple
+
+from text_fold import fold_umlauts
+
+META_FIELDS = ("level", "student_code", "student_name", "assignment", "chapter", "ts_ms")
+
+# ``prepare(level, post_id, data)`` -> ``(text, metadata)`` for one post
+Prepare = Callable[[str, str, Dict[str, Any]], Tuple[str, Dict[str, Any]]]
+
+
+def fts_query(query: str) -> str:
+    """Turn what a teacher types into an FTS5 query.
+
+    ``"quoted words"`` must appear as a phrase, a trailing ``*`` matches a
+    prefix and every other word must appear somewhere in the post.
+    """
+    parts: List[str] = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', fold_umlauts(query)):
+        if phrase:
+            tokens = re.findall(r"\w+", phrase)
+            if tokens:
+                parts.append('"' + " ".join(tokens) + '"')
+            continue
+        prefix = word.endswith("*")
+        for token in re.findall(r"\w+", word):
+            parts.append(f'"{token}"')
+        if prefix and parts and re.search(r"\w", word):
+            parts[-1] += "*"
+    return " ".join(parts)
+
+
+def _digest(text: str, meta: Dict[str, Any]) -> str:
+    raw = "\x1f".join([text] + [str(meta.get(k, "")) for k in META_FIELDS])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class SubmissionIndex:
+    """SQLite FTS5 index of post texts plus a metadata table keyed by post path."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+        self._watches: List[Any] = []
+        self._ready: Set[str] = set()
+        self.counters = {"indexed": 0, "unchanged": 0, "removed": 0, "searches": 0, "errors": 0}
+        self.last_error = ""
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS posts ("
+                "id INTEGER PRIMARY KEY, path TEXT UNIQUE, level TEXT, student_code TEXT, "
+                "student_name TEXT, assignment TEXT, chapter TEXT, ts_ms INTEGER, digest TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS posts_level ON posts (level)")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS post_text USING fts5("
+                "text, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------------- writes ----------------
+    def upsert_many(self, items: Iterable[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """Index ``(path, text, metadata)`` items in one transaction; returns how many changed."""
+        changed = 0
+        with self._conn() as conn:
+            for path, text, meta in items:
+                digest = _digest(text, meta)
+                found = conn.execute("SELECT id, digest FROM posts WHERE path = ?", (path,)).fetchone()
+                if found is not None and found[1] == digest:
+                    self.counters["unchanged"] += 1
+                    continue
+                values = [str(meta.get(k, "")) for k in META_FIELDS[:-1]] + [int(meta.get("ts_ms") or 0), digest]
+                if found is None:
+                    cur = conn.execute(
+                        "INSERT INTO posts (path, level, student_code, student_name, assignment, chapter, ts_ms, digest) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [path] + values,
+                    )
+                    conn.execute("INSERT INTO post_text (rowid, text) VALUES (?, ?)", (cur.lastrowid, fold_umlauts(text)))
+                else:
+                    conn.execute(
+                        "UPDATE posts SET level = ?, student_code = ?, student_name = ?, assignment = ?, "
+                        "chapter = ?, ts_ms = ?, digest = ? WHERE id = ?",
+                        values + [found[0]],
+                    )
+                    conn.execute("UPDATE post_text SET text = ? WHERE rowid = ?", (fold_umlauts(text), found[0]))
+                changed += 1
+        self.counters["indexed"] += changed
+        return changed
+
+    def upsert(self, path: str, text: str, meta: Dict[str, Any]) -> bool:
+        return self.upsert_many([(path, text, meta)]) == 1
+
+    def remove_many(self, paths: Iterable[str]) -> int:
+        removed = 0
+        with self._conn() as conn:
+            for path in paths:
+                found = conn.execute("SELECT id FROM posts WHERE path = ?", (path,)).fetchone()
+                if found is None:
+                    continue
+                conn.execute("DELETE FROM post_text WHERE rowid = ?", found)
+                conn.execute("DELETE FROM posts WHERE id = ?", found)
+                removed += 1
+        self.counters["removed"] += removed
+        return removed
+
+    # ---------------- reads ----------------
+    def search(self, query: str, level: str = "", assignment: str = "", limit: int = 50) -> List[Dict[str, Any]]:
+        """Ranked hits (best first) with metadata and a ``[marked]`` snippet of the folded text."""
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = (
+            "SELECT p.path, p.level, p.student_code, p.student_name, p.assignment, p.chapter, p.ts_ms, "
+            "snippet(post_text, 0, '[', ']', '…', 12), bm25(post_text) AS rank "
+            "FROM post_text JOIN posts p ON p.id = post_text.rowid WHERE post_text MATCH ?"
+        )
+        params: List[Any] = [match]
+        if level:
+            sql += " AND p.level = ?"
+            params.append(level)
+        if assignment:
+            sql += " AND p.assignment LIKE ?"
+            params.append(f"%{assignment}%")
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(int(limit))
+        self.counters["searches"] += 1
+        rows = self._conn().execute(sql, params).fetchall()
+        names = ("path",) + META_FIELDS + ("snippet", "rank")
+        return [dict(zip(names, row)) for row in rows]
+
+    def paths(self, level: str = "", prefix: str = "") -> List[str]:
+        sql, params = "SELECT path FROM posts WHERE 1 = 1", []
+        if level:
+            sql += " AND level = ?"
+            params.append(level)
+        if prefix:
+            sql += " AND substr(path, 1, ?) = ?"
+            params += [len(prefix), prefix]
+        return [row[0] for row in self._conn().execute(sql, params)]
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    # ---------------- live updates ----------------
+    def watch(self, db: Any, levels: Iterable[str], prepare: Prepare) -> "SubmissionIndex":
+        """Keep the index in step with ``submissions/{level}/posts`` for ``levels``."""
+        for level in [lvl for lvl in levels if lvl]:
+            posts = self.db_posts(db, level)
+            self._watches.append(posts.on_snapshot(self._listener(level, prepare)))
+        return self
+
+    @staticmethod
+    def db_posts(db: Any, level: str) -> Any:
+        return db.collection("submissions").document(level).collection("posts")
+
+    def stop(self) -> None:
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+
+    def ready(self, level: str) -> bool:
+        """Whether the first snapshot of ``level``'s posts has been applied."""
+        return level in self._ready
+
+    def _listener(self, level: str, prepare: Prepare) -> Callable:
+        prefix = f"submissions/{level}/posts/"
+        first = True
+
+        def on_snapshot(docs: Any, changes: Any, read_time: Any) -> None:
+            nonlocal first
+            upserts, removals = [], []
+            if first:
+                # The first snapshot holds every post: drop what was deleted meanwhile.
+                first = False
+                present = {prefix + doc.id for doc in docs or ()}
+                try:
+                    removals += [p for p in self.paths(prefix=prefix) if p not in present]
+                except Exception as e:
+                    self.counters["errors"] += 1
+                    self.last_error = str(e)
+            for change in changes:
+                doc = change.document
+                path = f"submissions/{level}/posts/{doc.id}"
+                try:
+                    if change.type.name == "REMOVED":
+                        removals.append(path)
+                    else:
+                        text, meta = prepare(level, doc.id, doc.to_dict() or {})
+                        upserts.append((path, text, meta))
+                except Exception as e:  # one bad post must not stop the listener
+                    self.counters["errors"] += 1
+                    self.last_error = str(e)
+            try:
+                self.upsert_many(upserts)
+                self.remove_many(removals)
+            except Exception as e:
+                self.counters["errors"] += 1
+                self.last_error = str(e)
+            self._ready.add(level)
+
+        return on_snapshot
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            self.counters, posts=len(self), watching=len(self._watches), ready=", ".join(sorted(self._ready)),
+            last_error=self.last_error,
+        )
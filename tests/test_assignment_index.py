@@ -0,0 +1,45 @@
+import os
+import sys
+import json
+
+# Ensure project root is on the import path for local imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from assignment_index import AssignmentIndex, normalize_assignment
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+@pytest.fixture(scope="module")
+def index():
+    with open(os.path.join(ROOT, "answers_dictionary.json"), "r", encoding="utf-8") as f:
+        return AssignmentIndex(json.load(f))
+
+
+def test_normalization_ignores_case_umlauts_padding_and_filler():
+    assert normalize_assignment("A1 Assignment 00.1") == normalize_assignment("a1 assignment 0.1")
+    assert normalize_assignment("A2 2.4 Wo möchten wir uns treffen?") == "a2 2.4 moechten wir uns treffen"
+
+
+@pytest.mark.parametrize(
+    "assignment, chapter, level, expected, how",
+    [
+        ("a1 assignment 0.1", "", "", "A1 Assignment 0.1", "exact"),
+        ("A2 4.10", "", "", "A2 4.10 Tourismus und Traditionelle Feste", "number"),
+        ("Assignment 10", "", "A2", "A2 4.10 Tourismus und Traditionelle Feste", "number"),
+        ("Hausaufgabe", "12.2", "A1", "A1 Assignment 12.2", "number"),
+        ("A2 Tourismus und Traditionele Feste", "", "", "A2 4.10 Tourismus und Traditionelle Feste", "fuzzy"),
+        ("klimafreundlch leben", "", "B1", "B1 10.28 Klimafreundlich leben", "fuzzy"),
+        ("Wohnung suchen", "", "B1", "B1 2.4 Wohnung suchen", "fuzzy"),
+    ],
+)
+def test_resolves_loose_names(index, assignment, chapter, level, expected, how):
+    assert index.match(assignment, chapter, level) == (expected, how)
+
+
+def test_ambiguous_or_unknown_names_are_not_guessed(index):
+    assert index.resolve("Wohnung suchen") is None  # A2 3.7 and B1 2.4
+    assert index.resolve("A1 Assignment 3") is None
+    assert index.resolve("Hallo") is None
@@ -0,0 +1,179 @@
+import os
+import sys
+import ast
+
+# Ensure project root is on import path if needed
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from assignment_index import AssignmentIndex
+from auto_marker import PROVISIONAL_COLLECTION, AutoMarker, provisional_id
+from fake_services import FakeFirestore, FakeQuery
+from regrade import key_hash
+from text_fold import canonical_answer
+
+
+def _posts(db: FakeFirestore, level: str):
+    return db.collection("submissions").document(level).collection("posts")
+
+
+def _length_mark(level: str, post_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if data.get("kind") != "objective":
+        return None
+    return {"score": len(data["content"]), "feedback": "ok"}
+
+
+def test_marks_new_posts_into_provisional_collection_but_not_the_backlog():
+    db = FakeFirestore()
+    _posts(db, "A1").document("old").set({"kind": "objective", "content": "abc"})
+    marker = AutoMarker(db, ["A1", "B1"], _length_mark).start()
+    try:
+        _posts(db, "A1").document("p1").set({"kind": "objective", "content": "abc"})
+        _posts(db, "B1").document("p2").set({"kind": "objective", "content": "abcdef"})
+        _posts(db, "B1").document("p3").set({"kind": "essay", "content": "Liebe Oma"})
+        marker.drain()
+    finally:
+        marker.stop(timeout=5)
+
+    stored = {s.id: s.to_dict() for s in db.collection(PROVISIONAL_COLLECTION).stream()}
+    assert set(stored) == {provisional_id("A1", "p1"), provisional_id("B1", "p2")}
+    doc = stored[provisional_id("B1", "p2")]
+    assert doc["score"] == 6 and doc["status"] == "provisional"
+    assert doc["post_path"] == "submissions/B1/posts/p2"
+    assert marker.counters["marked"] == 2 and marker.counters["not markable"] == 1
+    assert marker.counters["old posts"] == 1
+
+
+def test_restart_skips_posts_already_marked_and_remarks_edits():
+    db = FakeFirestore()
+    first = AutoMarker(db, ["A1"], _length_mark).start()
+    _posts(db, "A1").document("p1").set({"kind": "objective", "content": "abc"})
+    first.drain()
+    first.stop(timeout=5)
+
+    calls: List[str] = []
+
+    def counting_mark(level, post_id, data):
+        calls.append(post_id)
+        return _length_mark(level, post_id, data)
+
+    marker = AutoMarker(db, ["A1"], counting_mark).start()
+    try:
+        marker.drain()
+        assert calls == [] and marker.counters["old posts"] == 1
+        _posts(db, "A1").document("p1").set({"kind": "objective", "content": "abcd"})
+        marker.drain()
+    finally:
+        marker.stop(timeout=5)
+
+    assert calls == ["p1"]
+    assert db.collection(PROVISIONAL_COLLECTION).document(provisional_id("A1", "p1")).get().to_dict()["score"] == 4
+
+
+def test_posts_submitted_while_stopped_are_marked_and_levels_follow_the_roster():
+    db = FakeFirestore()
+    db.collection(PROVISIONAL_COLLECTION).document(provisional_id("A1", "p0")).set(
+        {"score": 1, "source_hash": "x", "marked_at": 100.0}
+    )
+    for post_id, ts in (("p0", 90), ("early", 50), ("missed", 150)):
+        _posts(db, "A1").document(post_id).set({"kind": "objective", "content": post_id, "ts": ts})
+    calls: List[str] = []
+
+    def counting_mark(level, post_id, data):
+        calls.append(post_id)
+        return _length_mark(level, post_id, data)
+
+    marker = AutoMarker(db, (), counting_mark, posted_at=lambda d: d["ts"]).start()
+    try:
+        assert marker.watch_levels(["A1", "B1"]).levels == ["A1", "B1"]
+        marker.drain()
+        assert calls == ["missed"] and marker.counters["old posts"] == 2
+
+        marker.watch_levels(["B1"])
+        _posts(db, "A1").document("later").set({"kind": "objective", "content": "x", "ts": 200})
+        _posts(db, "B1").document("b1").set({"kind": "objective", "content": "x", "ts": 200})
+        marker.drain()
+    finally:
+        marker.stop(timeout=5)
+
+    assert calls == ["missed", "b1"] and marker.stats()["levels"] == ""
+
+
+def test_start_reads_only_the_latest_mark(monkeypatch):
+    db = FakeFirestore()
+    for i in range(50):
+        db.collection(PROVISIONAL_COLLECTION).document(provisional_id("A1", f"p{i}")).set(
+            {"score": 1, "source_hash": "x", "marked_at": float(i)}
+        )
+    streamed: List[str] = []
+    original = FakeQuery.stream
+
+    def stream(self):
+        snaps = list(original(self))
+        streamed.extend(s.id for s in snaps)
+        return iter(snaps)
+
+    monkeypatch.setattr(FakeQuery, "stream", stream)
+    marker = AutoMarker(db, (), _length_mark).start()
+    marker.stop(timeout=5)
+
+    assert marker.last_run == 49.0 and streamed == [provisional_id("A1", "p49")]
+
+
+def test_marking_errors_are_counted_and_do_not_stop_the_worker():
+    db = FakeFirestore()
+
+    def flaky(level, post_id, data):
+        if post_id == "bad":
+            raise ValueError("boom")
+        return {"score": 1}
+
+    marker = AutoMarker(db, ["A1"], flaky, min_interval=0.01, sleep=lambda s: None).start()
+    try:
+        _posts(db, "A1").document("bad").set({"x": 1})
+        _posts(db, "A1").document("good").set({"x": 2})
+        marker.drain()
+    finally:
+        marker.stop(timeout=5)
+
+    assert marker.counters["errors"] == 1 and marker.counters["marked"] == 1
+    assert marker.stats()["last_error"] == "boom"
+
+
+def _load_auto_mark_post():
+    path = os.path.join(os.path.dirname(__file__), "..", "app.py")
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename="app.py")
+    wanted = {"auto_mark_post", "build_reference_text_from_json", "objective_mark", "extract_text_from_doc", "natural_key"}
+    nodes = [node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name in wanted]
+    module = ast.Module(body=nodes, type_ignores=[])
+    namespace = {
+        "re": re, "Dict": Dict, "Any": Any, "List": List, "Tuple": Tuple, "Optional": Optional,
+        "AssignmentIndex": AssignmentIndex, "key_hash": key_hash, "canonical_answer": canonical_answer,
+    }
+    exec(compile(module, "app.py", "exec"), namespace)
+    return namespace["auto_mark_post"]
+
+
+def test_auto_mark_post_uses_objective_reference_only():
+    auto_mark_post = _load_auto_mark_post()
+    ans_dict = {
+        "A1 Assignment 3": {"format": "objective", "answers": {"Answer1": "B", "Answer2": "ja"}, "answer_url": "u"},
+        "A1 Brief": {"format": "essay", "answers": {"Answer1": "Liebe Oma"}},
+    }
+    index = AssignmentIndex(ans_dict)
+
+    result = auto_mark_post(
+        {"assignment": "Assignment 3", "level": "A1", "content": "1. b\n2. Nein", "student_code": "a1"},
+        ans_dict,
+        index,
+    )
+
+    assert result["assignment"] == "A1 Assignment 3"
+    assert result["score"] == 50 and result["link"] == ""
+    assert "2→ja" in result["feedback"]
+    assert result["answers_hash"] == key_hash({1: "b", 2: "Ja"})
+    assert auto_mark_post({"assignment": "A1 Brief", "content": "Hallo"}, ans_dict, index) is None
+    assert auto_mark_post({"assignment": "unknown", "content": "1. B"}, ans_dict, index) is None
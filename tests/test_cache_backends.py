@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+
+# Ensure project root is on the import path for local imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from cache_backends import (
+    InProcessBackend,
+    LocalMemcacheClient,
+    MemcacheBackend,
+    SharedCache,
+    SQLiteBackend,
+    make_backend,
+)
+
+
+def _replica_pairs(tmp_path):
+    """Two backend objects per kind that share storage like two replicas would."""
+    db = str(tmp_path / "shared.sqlite")
+    client = LocalMemcacheClient()
+    memory = InProcessBackend()
+    return {
+        "memory": (memory, memory),
+        "sqlite": (SQLiteBackend(db), SQLiteBackend(db)),
+        "memcache-local": (MemcacheBackend(client), MemcacheBackend(client)),
+    }
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite", "memcache-local"])
+def test_backend_roundtrip_ttl_and_incr(tmp_path, kind):
+    backend, _ = _replica_pairs(tmp_path)[kind]
+
+    backend.set("k", b"v")
+    assert backend.get("k") == b"v"
+    backend.delete("k")
+    assert backend.get("k") is None
+
+    backend.set("short", b"v", ttl=0.01)
+    time.sleep(1.1 if kind == "memcache-local" else 0.05)
+    assert backend.get("short") is None
+
+    assert backend.incr("n") == 1
+    assert backend.incr("n") == 2
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite", "memcache-local"])
+def test_replicas_share_loads_and_invalidation(tmp_path, kind):
+    first, second = _replica_pairs(tmp_path)[kind]
+    calls = []
+
+    def download():
+        calls.append(1)
+        return {"rows": len(calls)}
+
+    a = SharedCache(first, "sheets")
+    b = SharedCache(second, "sheets")
+
+    assert a.get_or_load("students", download) == {"rows": 1}
+    assert b.get_or_load("students", download) == {"rows": 1}
+    assert len(calls) == 1
+
+    b.invalidate()
+    assert a.get_or_load("students", download) == {"rows": 2}
+    assert len(calls) == 2
+
+    b.delete("students")
+    assert a.get("students") is None
+    assert a.get_or_load("students", download) == {"rows": 3}
+
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_invalidate_deletes_old_entries_and_sweep_drops_expired_ones(tmp_path, kind):
+    backend, _ = _replica_pairs(tmp_path)[kind]
+    sheets, answers = SharedCache(backend, "sheets"), SharedCache(backend, "answers")
+    sheets.set("students", b"rows")
+    sheets.set("scores_1", b"rows")
+    answers.set("answers_dictionary", {"A1": 1})
+
+    sheets.invalidate()
+    assert backend.delete_prefix("sheets:") == 0  # already gone
+    assert answers.get("answers_dictionary") == {"A1": 1}
+
+    backend.set("short", b"v", ttl=0.01)
+    backend.set("long", b"v", ttl=60)
+    time.sleep(0.05)
+    assert backend.sweep() == 1
+    assert backend.get("long") == b"v"
+
+
+def test_make_backend_kinds(tmp_path):
+    assert isinstance(make_backend("memory"), InProcessBackend)
+    assert isinstance(make_backend("sqlite", str(tmp_path / "c.sqlite")), SQLiteBackend)
+    assert isinstance(make_backend("memcache-local"), MemcacheBackend)
+    with pytest.raises(ValueError):
+        make_backend("redis")
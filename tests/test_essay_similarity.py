@@ -0,0 +1,49 @@
+import os
+import sys
+
+# Ensure project root is on the import path for local imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pytest
+
+from essay_similarity import CharNgramTfidf, essay_similarities, fold_text, rank_essays
+
+
+def test_fold_text_matches_umlaut_spelling():
+    assert fold_text("Grüße, Straße!") == fold_text("gruesse strasse")
+
+
+def test_rows_are_l2_normalised():
+    X = CharNgramTfidf().fit(["Ich wohne in Accra.", "Er spielt Fußball."]).transform(["Ich wohne in Accra.", ""])
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    assert norms[0] == pytest.approx(1.0)
+    assert norms[1] == 0.0
+
+
+def test_each_essay_is_compared_with_its_own_reference():
+    references = ["Ich wohne in Accra und arbeite als Lehrerin.", "Am Wochenende spiele ich gern Fußball."]
+    essays = [
+        "Ich wohne in Accra und ich arbeite als Lehrer.",
+        "Ich wohne in Accra und ich arbeite als Lehrer.",
+        "Am Wochenende spiele ich gern Fussball mit Freunden.",
+    ]
+    sims = essay_similarities(essays, references, [0, 1, 1])
+
+    assert sims[0] > 0.6
+    assert sims[1] < 0.3
+    assert sims[2] > 0.6
+
+
+def test_rank_essays_orders_and_skips_unknown_references():
+    references = {"A2 1.1 Small Talk": "Hallo, wie geht es dir? Mir geht es gut, danke."}
+    items = [
+        {"code": "a", "reference": "A2 1.1 Small Talk", "text": "Ich mag Pizza."},
+        {"code": "b", "reference": "A2 1.1 Small Talk", "text": "Hallo, wie geht es dir? Mir geht es gut."},
+        {"code": "c", "reference": None, "text": "Hallo"},
+    ]
+    ranked = rank_essays(items, references)
+
+    assert [r["code"] for r in ranked] == ["b", "a"]
+    assert [r["rank"] for r in ranked] == [1, 2]
+    assert 0 <= ranked[1]["similarity"] < ranked[0]["similarity"] <= 1
@@ -26,3 +26,49 @@ def test_save_row_to_firestore_success(monkeypatch):
     assert result == {'ok': True, 'message': 'Saved to Firestore'}
     assert added['collection'] == 'scores'
     assert added['row'] == {'foo': 'bar'}
+
+
+def test_client_is_created_once_per_process(monkeypatch):
+    created = []
+
+    monkeypatch.setattr(firebase_utils.firebase_admin, 'get_app', lambda: 'app')
+    monkeypatch.setattr(firebase_utils.firestore, 'client', lambda app: created.append(app) or object())
+    firebase_utils.reset_firestore_client()
+    try:
+        first = firebase_utils.get_firestore_client()
+        second = firebase_utils.get_firestore_client()
+        assert first is second
+        assert created == ['app']
+        assert firebase_utils.firestore_stats()['client_alive']
+    finally:
+        firebase_utils.reset_firestore_client()
+
+
+def test_health_check_reports_probe_result(monkeypatch):
+    class FakeQuery:
+        def __init__(self, fail):
+            self.fail = fail
+
+        def limit(self, n):
+            return self
+
+        def stream(self):
+            if self.fail:
+                raise RuntimeError('unavailable')
+            return iter([])
+
+    class FakeClient:
+        fail = False
+
+        def collection(self, name):
+            return FakeQuery(self.fail)
+
+    client = FakeClient()
+    monkeypatch.setattr(firebase_utils, 'get_firestore_client', lambda: client)
+
+    ok = firebase_utils.firestore_health()
+    assert ok['ok'] and ok['latency_ms'] >= 0
+
+    client.fail = True
+    assert firebase_utils.firestore_health() == {'ok': False, 'error': 'unavailable'}
+    assert firebase_utils.firestore_stats()['last_health']['error'] == 'unavailable'
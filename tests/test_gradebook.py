@@ -0,0 +1,60 @@
+import os
+import sys
+
+# Ensure project root is on import path if needed
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import io
+
+import pandas as pd
+import pytest
+
+from assignment_index import AssignmentIndex
+from gradebook import export_gradebook
+from reconcile import csv_chunks
+
+KEYS = ["A1 0.1 Begruessung", "A1 0.2 Zahlen", "A2 1.1 Small Talk"]
+ROSTER = pd.DataFrame(
+    {"studentcode": ["ama1", "kofi1", "esi2"], "name": ["Ama", "Kofi", "Esi"], "level": ["A1", "A1", "A2"]}
+)
+SCORES = (
+    "StudentCode,Name,Assignment,Score,Comments,Date,Level\n"
+    "ama1,Ama,A1 0.2,40,,2025-01-01,A1\n"
+    "AMA1,Ama,A1 0.1 Begrüßung,70,,2025-01-02,A1\n"
+    "ama1,Ama,A1 0.2 Zahlen,90,,2025-01-03,A1\n"  # re-marked: the later row wins
+    "yaw1,Yaw,Lesen und Horen 3,55,,2025-01-03,A1\n"  # not on the roster, unknown assignment
+    "esi2,Esi,A2 1.1,80,,2025-01-03,A2\n"
+).encode()
+
+
+def _export(fmt: str, level: str = "A1", chunk_size: int = 2) -> bytes:
+    out = io.BytesIO()
+    export_gradebook(
+        csv_chunks(SCORES, chunk_size), ROSTER, level, KEYS, AssignmentIndex(KEYS), fmt, out, chunk_size=2
+    )
+    return out.getvalue()
+
+
+def test_csv_gradebook_has_roster_then_dictionary_order_then_unresolved():
+    book = pd.read_csv(io.BytesIO(_export("csv")), dtype=str, keep_default_na=False)
+
+    assert list(book.columns) == ["studentcode", "name", "level"] + KEYS[:2] + ["Lesen und Horen 3", "average"]
+    assert book["studentcode"].tolist() == ["ama1", "kofi1", "yaw1"]
+    ama = book.iloc[0]
+    assert (ama["A1 0.1 Begruessung"], ama["A1 0.2 Zahlen"], ama["average"]) == ("70", "90", "80")
+    assert book.iloc[1]["average"] == ""
+    assert book.iloc[2]["name"] == "Yaw" and book.iloc[2]["Lesen und Horen 3"] == "55"
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "xlsx"])
+def test_binary_formats_match_csv(fmt):
+    expected = pd.read_csv(io.BytesIO(_export("csv")))
+    raw = io.BytesIO(_export(fmt))
+    book = pd.read_parquet(raw) if fmt == "parquet" else pd.read_excel(raw)
+    pd.testing.assert_frame_equal(book, expected, check_dtype=False)
+
+
+def test_whole_school_export_has_every_level():
+    book = pd.read_csv(io.BytesIO(_export("csv", level="")))
+    assert set(book["studentcode"]) == {"ama1", "kofi1", "esi2", "yaw1"}
+    assert book.loc[book["studentcode"] == "esi2", "A2 1.1 Small Talk"].item() == 80
@@ -0,0 +1,78 @@
+import os
+import sys
+
+# Ensure project root is on the import path for local imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import requests
+
+from fake_services import FakeAppsScriptServer, FakeFirestore
+from loadtest import LoadTestConfig, run_load_test, summarize
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def test_fake_firestore_query_and_write_counts():
+    db = FakeFirestore()
+    posts = db.collection("submissions").document("A1").collection("posts")
+    posts.add({"student_code": "a", "content": "hi"})
+    posts.add({"student_code": "b", "content": "yo"})
+
+    hits = [s.to_dict() for s in posts.where("student_code", "==", "a").stream()]
+    assert hits == [{"student_code": "a", "content": "hi"}]
+    assert db.writes == 2
+
+
+def test_fake_apps_script_enforces_quota():
+    with FakeAppsScriptServer(quota_per_min=2, token="t") as server:
+        codes = [
+            requests.post(server.url, json={"token": "t", "row": {"n": i}}, timeout=5).status_code
+            for i in range(3)
+        ]
+    assert codes == [200, 200, 429]
+    assert server.rows == [{"n": 0}, {"n": 1}]
+
+
+def test_load_test_reports_every_operation():
+    report = run_load_test(
+        LoadTestConfig(
+            sessions=3,
+            iterations=2,
+            webhook_latency=0,
+            firestore_latency=0,
+            rate_per_min=6000,
+            students_csv=os.path.join(ROOT, "students.csv"),
+        )
+    )
+
+    ops = {row["operation"]: row for row in report["operations"]}
+    assert set(ops) == {"load_sheet_csv", "fetch_submissions", "save_row"}
+    assert all(row["count"] == 6 and row["errors"] == 0 for row in ops.values())
+    assert report["rows received"] == 6
+    assert ops["save_row"]["p95 ms"] >= ops["save_row"]["p50 ms"]
+
+
+def test_summarize_counts_errors_and_throughput():
+    rows = summarize([("save_row", 0.1, True), ("save_row", 0.3, False)], wall_seconds=2)
+    assert rows[0]["count"] == 2 and rows[0]["errors"] == 1
+    assert rows[0]["per sec"] == 1.0
+    assert rows[0]["max ms"] == 300.0
+
+
+def test_load_test_with_dedup_upserts_one_row_per_student_assignment():
+    report = run_load_test(
+        LoadTestConfig(
+            sessions=3,
+            iterations=4,
+            webhook_latency=0,
+            firestore_latency=0,
+            rate_per_min=6000,
+            dedup=True,
+            students_csv=os.path.join(ROOT, "students.csv"),
+        )
+    )
+
+    index = report["save index"]
+    assert index["insert"] + index["update"] + index["skip"] == 2 * 12  # sheet + firestore
+    assert report["rows received"] == index["sheet rows"]
+    assert index["firestore rows"] == index["sheet rows"]
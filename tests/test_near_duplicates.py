@@ -0,0 +1,148 @@
+import os
+import sys
+import ast
+import random
+
+# Ensure project root is on import path if needed
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from near_duplicates import NearDuplicateIndex, shingle_hashes
+
+WORDS = (
+    "ich du wir wohne arbeite spiele gern Fußball Schule Lehrer Accra Wochenende "
+    "Familie Freunde Reise Urlaub Stadt Land heute morgen gestern kaufen essen trinken"
+).split()
+
+
+def _essay(rng: random.Random, n: int = 80) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def test_shingles_fold_case_and_umlauts():
+    assert set(shingle_hashes("Grüße aus Köln")) == set(shingle_hashes("gruesse aus koeln"))
+    assert set(shingle_hashes("Grüße aus Köln")) == set(shingle_hashes("GRÜSSE aus KÖLN"))
+    assert len(shingle_hashes("ja")) == 1
+    assert len(shingle_hashes("  ")) == 0
+
+
+def test_near_identical_texts_cluster_within_their_group_only():
+    rng = random.Random(3)
+    original = _essay(rng)
+    copied = original.replace("ich", "Ich", 1) + " danke"
+    index = NearDuplicateIndex()
+    index.add("a", original, group="A1 Brief")
+    index.add("b", copied, group="A1 Brief")
+    index.add("c", _essay(rng), group="A1 Brief")
+    index.add("d", original, group="A2 Brief")
+
+    clusters = index.clusters()
+
+    assert [c["keys"] for c in clusters] == [["a", "b"]]
+    assert clusters[0]["group"] == "A1 Brief"
+    assert clusters[0]["min_similarity"] >= 0.8
+    assert index.clusters(group="A2 Brief") == []
+
+
+def test_index_updates_incrementally():
+    rng = random.Random(5)
+    text = _essay(rng)
+    index = NearDuplicateIndex()
+    index.add("a", text)
+    index.add("b", text)
+    assert index.similar("a") == {"b": 1.0}
+
+    assert index.add("b", text) is False  # unchanged posts are skipped
+    index.add("b", _essay(rng))  # edited post no longer matches
+    assert index.similar("a") == {}
+
+    index.add("c", text)
+    index.remove("c")
+    assert index.clusters() == []
+    assert sorted(index.keys()) == ["a", "b"]
+
+
+def test_lsh_compares_few_pairs():
+    rng = random.Random(7)
+    index = NearDuplicateIndex()
+    docs = [_essay(rng) for _ in range(400)]
+    docs[1] = docs[0] + " ende"
+    for i, text in enumerate(docs):
+        index.add(i, text)
+
+    assert [c["keys"] for c in index.clusters()] == [[0, 1]]
+    assert index.comparisons < 400 * 399 // 2 // 10
+
+
+def _load_duplicate_entries():
+    path = os.path.join(os.path.dirname(__file__), "..", "app.py")
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename="app.py")
+    wanted = {
+        "duplicate_entries", "normalize_submission", "submission_ts_ms",
+        "extract_text_from_doc", "globalize_objective_numbers",
+    }
+    nodes = [node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name in wanted]
+    module = ast.Module(body=nodes, type_ignores=[])
+    namespace = {
+        "re": re, "Dict": Dict, "Any": Any, "List": List, "Tuple": Tuple, "Optional": Optional,
+        "datetime": datetime, "MIN_OBJECTIVE_ANSWERS": 5,
+    }
+    exec(compile(module, "app.py", "exec"), namespace)
+    return namespace["duplicate_entries"]
+
+
+def test_watched_level_indexes_text_and_objective_answers():
+    from fake_services import FakeFirestore
+
+    answers = "1. A\n2. C\n3. B\n4. D\n5. A\n6. falsch"
+    db = FakeFirestore()
+    posts = db.collection("submissions").document("A1").collection("posts")
+    posts.document("p1").set({"assignment": "A1 1.1", "student_name": "Ama",
+                              "content": answers + "\nIch heiße Ama und wohne in Accra."})
+    posts.document("p2").set({"assignment": "A1 1.1 ", "student_name": "Kofi",
+                              "content": answers + "\nMein Name ist Kofi, ich lebe in Kumasi."})
+    posts.document("p3").set({"assignment": "A1 1.2", "content": "1. A\n2. B"})
+
+    assert not NearDuplicateIndex().ready("A1")
+    index = NearDuplicateIndex().watch(db, "A1", _load_duplicate_entries())
+    assert index.ready("A1") and not index.ready("B1")
+
+    p = "submissions/A1/posts/"
+    assert sorted(index.keys()) == sorted([p + "p1#text", p + "p1#objective", p + "p2#text", p + "p2#objective", p + "p3#text"])
+    clusters = index.clusters()
+    assert [(c["group"], c["keys"]) for c in clusters] == [(("a1 1.1", "objective"), [p + "p1#objective", p + "p2#objective"])]
+    assert index.meta(p + "p2#objective")["student_name"] == "Kofi"
+
+    posts.document("p2").delete()
+    posts.document("p1").set({"assignment": "A1 1.1", "content": "Nur ein kurzer Text."})
+    assert sorted(index.keys()) == [p + "p1#text", p + "p3#text"]
+    assert index.clusters() == []
+    index.stop()
+    posts.document("p4").set({"content": "Noch ein Text."})
+    assert len(index) == 2
+
+
+def test_concurrent_replacements_leave_one_consistent_entry():
+    import threading
+
+    rng = random.Random(3)
+    texts = [_essay(rng) for _ in range(8)]
+    index = NearDuplicateIndex()
+
+    def churn(offset):
+        for i in range(40):
+            index.add("k", texts[(i + offset) % len(texts)], "g")
+
+    threads = [threading.Thread(target=churn, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    sig = index._entries["k"][2]
+    assert len(index) == 1
+    assert sorted(index._buckets) == sorted(index._bucket_keys("g", sig))
@@ -0,0 +1,45 @@
+import os
+import sys
+
+# Ensure project root is on the import path for local imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from perf_utils import TIMINGS_KEY, record_timing, timed, timing_report
+
+
+def test_record_timing_accumulates_per_section():
+    store = {}
+    record_timing("scoring form", 10.0, store)
+    record_timing("scoring form", 30.0, store)
+    record_timing("student picker", 5.0, store)
+
+    stats = store[TIMINGS_KEY]["scoring form"]
+    assert stats["runs"] == 2
+    assert stats["last_ms"] == 30.0
+    assert stats["max_ms"] == 30.0
+    assert stats["total_ms"] == 40.0
+
+    rows = timing_report(store)
+    assert [r["section"] for r in rows] == ["scoring form", "student picker"]
+    assert rows[0]["avg ms"] == 20.0
+
+
+def test_timed_records_even_when_block_raises():
+    store = {}
+    with pytest.raises(RuntimeError):
+        with timed("submission viewer", store):
+            raise RuntimeError("rerun")
+    assert store[TIMINGS_KEY]["submission viewer"]["runs"] == 1
+
+
+def test_memory_report_counts_shared_objects_once():
+    from perf_utils import deep_sizeof, memory_report
+
+    text = "x" * 10_000
+    assert deep_sizeof({"a": text, "b": text}) < 2 * deep_sizeof(text)
+
+    rows = memory_report({"ref_text": text})
+    assert [r["scope"] for r in rows] == ["this session", "process (RSS)"]
+    assert rows[1]["MiB"] > 0
@@ -0,0 +1,184 @@
+import os
+import sys
+import ast
+
+# Ensure project root is on import path if needed
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+import pytest
+
+from assignment_index import AssignmentIndex
+from prefetch import Prefetcher
+
+
+def _wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_prefetched_keys_are_hits_and_unknown_keys_misses():
+    loaded: List[str] = []
+    pf = Prefetcher(lambda k: loaded.append(k) or k.upper())
+
+    pf.want(["a", "b"])
+    _wait_until(lambda: pf.counters["prefetched"] == 2)
+
+    assert pf.get("a") == "A" and pf.get("b") == "B" and pf.get("c") == "C"
+    assert loaded == ["a", "b", "c"]
+    stats = pf.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1) and stats["hit_rate"] == round(2 / 3, 3)
+
+
+def test_get_waits_for_a_load_in_flight_instead_of_loading_twice():
+    started, release = threading.Event(), threading.Event()
+    calls: List[str] = []
+
+    def slow(key: str) -> str:
+        calls.append(key)
+        started.set()
+        release.wait(5)
+        return key * 2
+
+    pf = Prefetcher(slow)
+    pf.want(["x"])
+    assert started.wait(5)
+    threading.Timer(0.05, release.set).start()
+
+    assert pf.get("x") == "xx"
+    assert calls == ["x"] and pf.counters["waits"] == 1
+
+
+def test_loads_running_across_a_clear_are_not_stored():
+    started, release = threading.Event(), threading.Event()
+    version = ["old"]
+
+    def slow(key: str) -> str:
+        value = version[0]
+        if value == "old":
+            started.set()
+            release.wait(5)
+        return value
+
+    pf = Prefetcher(slow)
+    pf.want(["x"])
+    assert started.wait(5)
+    version[0] = "new"
+    pf.clear()
+    release.set()
+    _wait_until(lambda: pf.counters["stale"] == 1)
+
+    assert pf.get("x") == "new"  # loaded again, not the pre-clear value
+    assert pf.counters["prefetched"] == 0 and pf.counters["misses"] == 1
+    assert pf.get("x") == "new" and pf.counters["hits"] == 1
+
+
+def test_expired_values_are_reloaded_and_errors_fall_back_to_foreground():
+    now = [0.0]
+    attempts: Dict[str, int] = {}
+
+    def load(key: str) -> int:
+        attempts[key] = attempts.get(key, 0) + 1
+        if key == "bad" and attempts[key] == 1:
+            raise RuntimeError("offline")
+        return attempts[key]
+
+    pf = Prefetcher(load, ttl=10, clock=lambda: now[0])
+    pf.want(["k", "bad"])
+    _wait_until(lambda: pf.counters["prefetched"] + pf.counters["errors"] == 2)
+    assert pf.get("k") == 1
+    now[0] = 11
+    assert pf.get("k") == 2  # stale: loaded again
+    assert pf.get("bad") == 2 and pf.stats()["last_error"] == "offline"
+
+
+def _load_queue_helpers():
+    path = os.path.join(os.path.dirname(__file__), "..", "app.py")
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename="app.py")
+    wanted = {"unmarked_queue", "prepare_student", "extract_text_from_doc"}
+    nodes = [node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name in wanted]
+    module = ast.Module(body=nodes, type_ignores=[])
+    namespace = {
+        "pd": pd, "Dict": Dict, "Any": Any, "List": List, "Tuple": Tuple, "Optional": Optional,
+        "AssignmentIndex": AssignmentIndex,
+    }
+    exec(compile(module, "app.py", "exec"), namespace)
+    return namespace
+
+
+def test_unmarked_queue_skips_posts_with_a_saved_score():
+    ns = _load_queue_helpers()
+    index = AssignmentIndex(["A1 0.1 Begruessung", "A1 0.2 Zahlen"])
+    posts = [
+        {"student_code": "ama1", "student_name": "Ama", "level": "A1", "assignment": "0.2", "_path": "p2", "_ts_ms": 2},
+        {"student_code": "ama1", "student_name": "Ama", "level": "A1", "assignment": "0.1", "_path": "p1", "_ts_ms": 1},
+        {"student_code": "kofi1", "student_name": "Kofi", "level": "A1", "assignment": "0.1", "_path": "p3", "_ts_ms": 3},
+    ]
+    scores = pd.DataFrame({"studentcode": ["AMA1"], "assignment": ["A1 0.1 Begrüßung"]})
+
+    queue = ns["unmarked_queue"](posts, scores, index)
+
+    assert [(i["code"], i["post"]) for i in queue] == [("ama1", "p2"), ("kofi1", "p3")]
+
+
+def test_prepare_student_matches_references_and_extracts_text():
+    ns = _load_queue_helpers()
+    index = AssignmentIndex(["A1 0.1 Begruessung"])
+    subs = [{"id": "p1", "assignment": "Assignment 0.1", "content": " Hallo "}]
+
+    prepared = ns["prepare_student"]("A1", subs, index, {"p1": {"score": 80}})
+
+    assert prepared["texts"] == ["Hallo"]
+    assert prepared["refs"] == [("A1 0.1 Begruessung", "number")]
+    assert prepared["provisional"]["p1"]["score"] == 80
+
+
+def test_prepare_student_reuses_unchanged_posts_from_a_prefetched_result():
+    ns = _load_queue_helpers()
+    index = AssignmentIndex(["A1 0.1 Begruessung"])
+    old = [{"_path": "p1", "assignment": "0.1", "content": "Hallo"}, {"_path": "p2", "content": "alt"}]
+    previous = ns["prepare_student"]("A1", old, index, {})
+    previous["texts"][0] = "from the prefetch"
+
+    fresh = [old[0], {"_path": "p2", "content": "neu"}, {"_path": "p3", "content": "Tschuess"}]
+    prepared = ns["prepare_student"]("A1", fresh, index, {"p3": {"score": 90}}, previous)
+
+    assert prepared["texts"] == ["from the prefetch", "neu", "Tschuess"]
+    assert prepared["provisional"] == {"p3": {"score": 90}}  # never taken from the prefetch
+    other = ns["prepare_student"]("A1", fresh, AssignmentIndex(["A1 0.2 Zahlen"]), {}, previous)
+    assert other["texts"][0] == "Hallo"  # the answer keys changed
+
+
+def test_peek_never_loads():
+    pf = Prefetcher(lambda k: k.upper())
+    assert pf.peek("a") is None
+    pf.want(["a"])
+    _wait_until(lambda: pf.counters["prefetched"] == 1)
+    assert pf.peek("a") == "A" and (pf.counters["hits"], pf.counters["misses"]) == (1, 1)
+
+
+def test_failed_submission_reads_are_not_cached():
+    from cache_backends import InProcessBackend, SharedCache
+    from fake_services import FakeFirestore, FakeFirestoreError
+    from loadtest import load_app_functions
+
+    db = FakeFirestore(error_rate=1.0)
+    ns: Dict[str, Any] = {"Dict": Dict, "Any": Any, "List": List, "db": db, "normalize_submission": lambda d, i, lv: d}
+    fetch = load_app_functions(["fetch_submissions"], ns)["fetch_submissions"]
+    cache = SharedCache(InProcessBackend(), "submissions")
+
+    assert fetch("A1", "ama1") == []
+    pf = Prefetcher(lambda k: cache.get_or_load(k, lambda: fetch("A1", k, strict=True)))
+    with pytest.raises(FakeFirestoreError):
+        pf.get("ama1")
+    assert cache.get("ama1") is None and pf.stats()["cached"] == 0
+
+    db._faults.error_rate = 0.0
+    db.collection("submissions").document("A1").collection("posts").add({"student_code": "ama1"})
+    assert pf.get("ama1") == [{"student_code": "ama1"}]
@@ -0,0 +1,139 @@
+import os
+import sys
+from typing import List
+
+# Ensure project root is on import path if needed
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+
+from fake_services import FakeFirestore
+from reconcile import LATEST_KEY_COLUMNS, csv_chunks, firestore_chunks, reconcile, repair_csv, repair_firestore
+from save_index import idempotency_key
+
+BACKUP = os.path.join(os.path.dirname(__file__), "..", "scores_backup.csv")
+
+
+def _live(tmp_path) -> str:
+    backup = pd.read_csv(BACKUP, dtype=str, keep_default_na=False)
+    backup = backup[backup["Assignment"] != ""]
+    live = backup.copy()
+    live.loc[0, "Score"] = "78"  # changed
+    live = live.drop(index=[1, 2])  # missing from the live side
+    extra = {"StudentCode": "new1", "Name": "Neu", "Assignment": "A1 0.1", "Score": "50.0",
+             "Comments": "", "Date": "2025-07-01", "Level": "A1"}
+    live = pd.concat([live, backup.iloc[[5]], pd.DataFrame([extra])])  # one duplicate, one new
+    path = str(tmp_path / "live.csv")
+    live.to_csv(path, index=False)
+    return path
+
+
+def test_reconcile_finds_missing_changed_and_duplicate_rows(tmp_path):
+    out = str(tmp_path / "out")
+    # Tiny chunks and partitions force the re-partitioning path as well.
+    report = reconcile(
+        csv_chunks(BACKUP, 10), csv_chunks(_live(tmp_path), 10), out, right_name="sheet",
+        partitions=4, max_partition_rows=5, chunk_size=7,
+    )
+
+    assert report["missing in sheet"] == 2
+    assert report["missing in backup"] == 1
+    assert report["changed"] == 1
+    assert report["duplicate keys in sheet"] - report["duplicate keys in backup"] == 1
+    assert report["backup rows"] == 71  # the trailing end-of-file line is not a row
+    assert report["peak rows in memory"] <= 10
+    changed = pd.read_csv(os.path.join(out, "changed.csv"), dtype=str)
+    assert changed.loc[0, "score"] == "77" and changed.loc[0, "sheet_score"] == "78"
+    assert pd.read_csv(os.path.join(out, "missing_in_backup.csv"), dtype=str)["studentcode"].tolist() == ["new1"]
+
+
+def test_repairs_append_to_csv_and_batch_firestore_writes(tmp_path):
+    live = _live(tmp_path)
+    backup = str(tmp_path / "backup.csv")
+    with open(BACKUP, "rb") as src, open(backup, "wb") as dst:
+        dst.write(src.read())
+    out = str(tmp_path / "out")
+    reconcile(csv_chunks(backup), csv_chunks(live), out, right_name="sheet")
+
+    assert repair_csv(backup, os.path.join(out, "missing_in_backup.csv")) == 1
+    report = reconcile(csv_chunks(backup), csv_chunks(live), str(tmp_path / "again"), right_name="sheet")
+    assert report["missing in backup"] == 0
+
+    db = FakeFirestore()
+    stats = repair_firestore(db, os.path.join(out, "missing_in_sheet.csv"), batch_size=1)
+    assert stats == {"written": 2, "skipped older": 0, "batches": 2} and db.batches_committed == 2
+    docs = {s.id: s.to_dict() for s in db.collection("scores").stream()}
+    assert all(doc_id == idempotency_key(doc) for doc_id, doc in docs.items())
+    assert all(isinstance(doc["score"], int) for doc in docs.values())
+
+    report = reconcile(firestore_chunks(db, chunk_size=1), csv_chunks(live), str(tmp_path / "fs"), "firestore", "sheet")
+    assert report["missing in sheet"] == 2 and report["matched"] == 0
+
+
+def test_firestore_repair_never_replaces_a_later_mark_with_an_earlier_one(tmp_path):
+    columns = ["StudentCode", "Name", "Assignment", "Score", "Comments", "Date", "Level"]
+    backup = str(tmp_path / "backup.csv")
+    pd.DataFrame(
+        [["a1", "Ama", "A1 0.1", "40", "", "2025-01-10", "A1"],
+         ["a1", "Ama", "A1 0.1", "90", "", "2025-02-10", "A1"],
+         ["b2", "Ben", "A1 0.1", "70", "", "2025-01-10", "A1"]],
+        columns=columns,
+    ).to_csv(backup, index=False)
+    db = FakeFirestore()
+    latest = {"studentcode": "a1", "name": "Ama", "assignment": "A1 0.1", "score": 90, "comments": "",
+              "date": "2025-02-10", "level": "A1"}
+    db.collection("scores").document(idempotency_key(latest)).set(latest)
+
+    out = str(tmp_path / "out")
+    report = reconcile(csv_chunks(backup), firestore_chunks(db), out, right_name="firestore",
+                       key_columns=LATEST_KEY_COLUMNS)
+    assert (report["matched"], report["missing in firestore"], report["changed"]) == (1, 1, 0)
+
+    repair_firestore(db, os.path.join(out, "missing_in_firestore.csv"))
+    docs = {s.id: s.to_dict() for s in db.collection("scores").stream()}
+    assert docs[idempotency_key(latest)]["score"] == 90
+    assert len(docs) == 2
+
+    # A missing-rows file with both re-marks keeps the later one, as does an existing later doc.
+    rows = pd.read_csv(backup, dtype=str).rename(columns=str.lower)
+    rows.to_csv(str(tmp_path / "both.csv"), index=False)
+    stats = repair_firestore(db, str(tmp_path / "both.csv"))
+    assert stats["skipped older"] == 1
+    assert db.collection("scores").document(idempotency_key(latest)).get().to_dict()["score"] == 90
+    rows.iloc[[0]].to_csv(str(tmp_path / "older.csv"), index=False)
+    assert repair_firestore(db, str(tmp_path / "older.csv")) == {"written": 0, "skipped older": 1, "batches": 0}
+    assert db.collection("scores").document(idempotency_key(latest)).get().to_dict()["score"] == 90
+
+
+def test_firestore_repair_streams_partitions_in_bounded_batches(tmp_path):
+    rows = [
+        {"studentcode": f"s{i % 30}", "name": "", "assignment": "A1 0.1", "score": str(i),
+         "comments": "", "date": f"2025-01-{1 + i // 30:02d}", "level": "A1"}
+        for i in range(90)
+    ]
+    missing = str(tmp_path / "missing.csv")
+    pd.DataFrame(rows).to_csv(missing, index=False)
+    db = FakeFirestore()
+    committed: List[int] = []
+    batch = db.batch
+    db.batch = lambda: _CountingBatch(batch(), committed)
+
+    stats = repair_firestore(db, missing, batch_size=4, chunk_size=7, partitions=3)
+
+    assert stats["written"] == 30 and stats["skipped older"] == 60
+    assert max(committed) <= 4 and sum(committed) == 30
+    docs = [s.to_dict() for s in db.collection("scores").stream()]
+    assert sorted(d["score"] for d in docs) == list(range(60, 90))  # the latest re-mark of each student
+
+
+class _CountingBatch:
+    def __init__(self, batch, committed):
+        self._batch, self._committed, self._ops = batch, committed, 0
+
+    def set(self, *args, **kwargs):
+        self._ops += 1
+        self._batch.set(*args, **kwargs)
+
+    def commit(self):
+        self._committed.append(self._ops)
+        self._batch.commit()
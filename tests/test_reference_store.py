@@ -0,0 +1,54 @@
+import os
+import sys
+
+# Ensure project root is on import path if needed
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import dataclasses
+import threading
+from typing import Any, Dict, List
+
+import pytest
+
+from reference_store import EMPTY_REFERENCE, ReferenceStore
+
+
+def _store(calls: List[str]) -> ReferenceStore:
+    def build(row: Dict[str, Any]):
+        calls.append(row["answer_url"])
+        return "1. " + row["answers"]["Answer1"], row["answer_url"], row.get("format", "essay"), {1: row["answers"]["Answer1"]}
+
+    return ReferenceStore(build)
+
+
+def test_sessions_share_one_immutable_reference_per_key():
+    calls: List[str] = []
+    store = _store(calls)
+    row = {"format": "objective", "answers": {"Answer1": "B"}, "answer_url": "u1"}
+    refs: List[Any] = []
+    threads = [threading.Thread(target=lambda: refs.append(store.get("A1 Quiz", dict(row)))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert all(r is refs[0] for r in refs)
+    assert (refs[0].text, refs[0].link, refs[0].format, dict(refs[0].answers)) == ("1. B", "u1", "objective", {1: "B"})
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        refs[0].text = "changed"
+    with pytest.raises(TypeError):
+        refs[0].answers[1] = "C"
+    assert store.stats()["references"] == 1 and store.stats()["builds"] == 1
+
+
+def test_changed_rows_are_rebuilt_and_missing_keys_are_empty():
+    calls: List[str] = []
+    store = _store(calls)
+    first = store.get("A1 Quiz", {"answers": {"Answer1": "B"}, "answer_url": "u1"})
+    fixed = store.get("A1 Quiz", {"answers": {"Answer1": "C"}, "answer_url": "u1"})
+
+    assert fixed is not first and fixed.text == "1. C"
+    assert store.get("A1 Quiz", {"answers": {"Answer1": "C"}, "answer_url": "u1"}) is fixed
+    assert store.get("", {"answers": {}}) is EMPTY_REFERENCE
+    assert store.get("A1 Gone", None) is EMPTY_REFERENCE
+    assert len(calls) == 2
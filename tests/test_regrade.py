@@ -0,0 +1,143 @@
+import os
+import sys
+
+# Ensure project root is on import path if needed
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from typing import Any, Dict, List, Optional
+
+from auto_marker import PROVISIONAL_COLLECTION, provisional_id
+from fake_services import FakeFirestore
+from regrade import ANSWER_KEYS_COLLECTION, changed_questions, key_hash, regrade, save_keys
+
+OLD = {1: "B", 2: "ja", 3: "Bäckerei"}
+NEW = {1: "B", 2: "nein", 3: "Bäckerei"}
+OTHER = {1: "A"}
+
+
+def test_only_canonical_changes_count():
+    assert key_hash(OLD) == key_hash({"1": "b", "2": "J", "3": "baeckerei."})
+    assert changed_questions(OLD, {1: "b", 2: "nein", 3: "Bäckerei", 4: "C"}) == [2, 4]
+    assert changed_questions(OLD, {1: "B", 2: "Ja"}) == [3]
+
+
+def _marker(key: Dict[int, str], calls: List[str]):
+    def remark(level: str, post_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        calls.append(post_id)
+        if data.get("kind") == "essay":
+            return None
+        given = dict(enumerate(data["content"].split(), start=1))
+        score = sum(given.get(n, "").lower() == a.lower() for n, a in key.items()) * 100 // len(key)
+        return {"assignment": "A1 Quiz", "score": score, "feedback": f"{score}", "link": "", "answers_hash": key_hash(key)}
+
+    return remark
+
+
+def _setup() -> FakeFirestore:
+    db = FakeFirestore()
+    posts = {"p1": "B ja Bäckerei", "p2": "B nein Bäckerei", "p3": "A B x"}
+    remark = _marker(OLD, [])
+    for post_id, content in posts.items():
+        db.collection("submissions").document("A1").collection("posts").document(post_id).set({"content": content})
+        doc = dict(remark("A1", post_id, {"content": content}), level="A1", post_id=post_id, status="provisional")
+        db.collection(PROVISIONAL_COLLECTION).document(provisional_id("A1", post_id)).set(doc)
+    other = {"assignment": "A1 Other", "score": 50, "answers_hash": key_hash(OTHER), "level": "A1", "post_id": "q1"}
+    db.collection(PROVISIONAL_COLLECTION).document(provisional_id("A1", "q1")).set(other)
+    return db
+
+
+def test_key_fixed_before_any_regrade_is_found_by_the_marks_hash():
+    db = _setup()
+    calls: List[str] = []
+
+    plan = regrade(db, {"A1 Quiz": NEW, "A1 Other": OTHER}, _marker(NEW, []), dry_run=True)
+    assert (plan["stale"], plan["stale marks"], plan["changed questions"]) == (3, {"A1 Quiz": 3}, {"A1 Quiz": None})
+    assert db.collection(ANSWER_KEYS_COLLECTION).get() == []
+
+    report = regrade(db, {"A1 Quiz": NEW, "A1 Other": OTHER}, _marker(NEW, calls))
+
+    assert sorted(calls) == ["p1", "p2", "p3"] and report["rescored"] == 2
+    recorded = db.collection(ANSWER_KEYS_COLLECTION).document("A1 Quiz").get().to_dict()
+    assert recorded["answers_hash"] == key_hash(NEW)
+
+
+def test_key_change_remarks_only_stale_marks_of_that_assignment_in_batches():
+    db = _setup()
+    assert save_keys(db, {"A1 Quiz": OLD, "A1 Other": OTHER}) == 2
+    assert regrade(db, {"A1 Quiz": OLD, "A1 Other": OTHER}, _marker(OLD, []), dry_run=True)["stale"] == 0
+    calls: List[str] = []
+
+    assert regrade(db, {"A1 Quiz": NEW}, _marker(NEW, []), dry_run=True)["stale"] == 3
+    report = regrade(db, {"A1 Quiz": NEW, "A1 Other": OTHER}, _marker(NEW, calls), batch_size=2)
+
+    assert report["changed questions"] == {"A1 Quiz": [2]}
+    assert sorted(calls) == ["p1", "p2", "p3"]  # never the other assignment
+    assert (report["rescored"], report["unchanged"]) == (2, 1)
+    provisional = {s.id: s.to_dict() for s in db.collection(PROVISIONAL_COLLECTION).stream()}
+    p1, p2 = provisional[provisional_id("A1", "p1")], provisional[provisional_id("A1", "p2")]
+    assert (p1["score"], p1["previous_score"]) == (66, 100)
+    assert (p2["score"], p2["previous_score"]) == (100, 66)
+    assert all(d["answers_hash"] == key_hash(NEW) for k, d in provisional.items() if d["assignment"] == "A1 Quiz")
+    assert provisional[provisional_id("A1", "q1")]["score"] == 50
+
+    # Everything is up to date now: a second run re-marks nothing.
+    again: List[str] = []
+    assert regrade(db, {"A1 Quiz": NEW}, _marker(NEW, again))["stale"] == 0 and again == []
+
+
+def test_app_check_edit_check_finds_and_remarks_stale_marks(tmp_path, monkeypatch):
+    import json
+
+    import requests
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    import firebase_utils
+
+    app = os.path.join(os.path.dirname(__file__), "..", "app.py")
+    students = b"StudentCode,Name,Level\nama1,Ama,A1\n"
+
+    class Response:
+        status_code, content, text = 200, students, students.decode()
+
+        def raise_for_status(self):
+            pass
+
+    def write_key(answer2: str) -> None:
+        key = {"A1 Quiz": {"format": "objective", "answers": {"Answer1": "B", "Answer2": answer2}}}
+        (tmp_path / "answers_dictionary.json").write_text(json.dumps(key), encoding="utf-8")
+
+    db = FakeFirestore()
+    db.collection("submissions").document("A1").collection("posts").document("p1").set(
+        {"assignment": "A1 Quiz", "content": "1. B\n2. ja", "student_code": "ama1"}
+    )
+    mark = {"assignment": "A1 Quiz", "score": 100, "feedback": "ok", "link": "", "level": "A1", "post_id": "p1"}
+    db.collection(PROVISIONAL_COLLECTION).document(provisional_id("A1", "p1")).set(
+        dict(mark, answers_hash=key_hash({1: "B", 2: "ja"}))
+    )
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(requests, "get", lambda *a, **k: Response())
+    monkeypatch.setattr(firebase_utils, "get_firestore_client", lambda: db)
+    monkeypatch.setattr(firebase_utils, "warmup_firestore", lambda *a, **k: {})
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    write_key("ja")
+
+    at = AppTest.from_file(app, default_timeout=60)
+    at.secrets["AUTO_MARK"] = "off"
+    at.session_state["auth_ok"] = True
+    at.run()
+    at.button(key="regrade_check").click().run()
+    assert "Every provisional mark was made with the current answer keys." in [c.value for c in at.caption]
+    assert db.collection(ANSWER_KEYS_COLLECTION).document("A1 Quiz").get().exists  # baseline
+
+    write_key("nein")  # picked up without refreshing any cache
+    at.button(key="regrade_check").click().run()
+    table = at.dataframe[-1].value
+    assert table.to_dict("records") == [{"assignment": "A1 Quiz", "stale marks": 1, "changed questions": "2"}]
+
+    at.button(key="regrade_run").click().run()
+    assert not at.exception
+    stored = db.collection(PROVISIONAL_COLLECTION).document(provisional_id("A1", "p1")).get().to_dict()
+    assert (stored["score"], stored["previous_score"]) == (50, 100)
+    st.cache_resource.clear()
@@ -0,0 +1,112 @@
+import os
+import sys
+
+# Ensure project root is on import path if needed
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+
+import report_cards
+from report_cards import ReportCard, build_report_cards, render_card_to_file, render_report_cards, subset_font
+
+
+def _scores() -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            {"studentcode": "ama1", "name": "Ama", "assignment": "A1 0.1", "score": 80, "comments": "Gut", "date": "2024-01-02", "level": "A1"},
+            {"studentcode": "ama1", "name": "Ama", "assignment": "A1 0.2", "score": 40, "comments": "", "date": "2024-01-03", "level": "A1"},
+            {"studentcode": "kofi1", "name": "Kofi", "assignment": "A1 0.1", "score": 90, "comments": "Sehr gut", "date": "2024-01-02", "level": "a1"},
+            {"studentcode": "esi2", "name": "Esi", "assignment": "A2 1.1", "score": 70, "comments": "", "date": "2024-01-02", "level": "A2"},
+        ]
+    )
+
+
+def test_build_report_cards_groups_by_student_and_adds_roster():
+    students = pd.DataFrame([{"studentcode": "yaw1", "name": "Yaw", "level": "A1"}])
+    links = {"A1 0.1": "https://ref/0.1", "A1 0.2": "https://ref/0.2"}
+
+    cards = build_report_cards(_scores(), "A1", links, students)
+
+    assert [c.code for c in cards] == ["ama1", "kofi1", "yaw1"]
+    ama = cards[0]
+    assert ama.average == 60
+    assert [r["link"] for r in ama.rows] == ["https://ref/0.1", ""]  # no link below the pass mark
+    assert cards[2].rows == [] and cards[2].average is None
+
+
+def test_rows_without_a_student_code_get_no_card():
+    scores = pd.concat([_scores(), pd.DataFrame([{"studentcode": " ", "name": "?", "assignment": "A1 0.1",
+                                                  "score": 50, "comments": "", "date": "2024-01-04", "level": "A1"}])])
+    students = pd.DataFrame([{"studentcode": "", "name": "Nobody", "level": "A1"}])
+
+    assert [c.code for c in build_report_cards(scores, "A1", students=students)] == ["ama1", "kofi1"]
+
+
+def test_render_writes_pdfs_as_they_complete(tmp_path):
+    cards = build_report_cards(_scores(), "A1")
+    cards.append(ReportCard("x1", "Ɔdɔ ☃", "A1"))  # snowman is outside the subset
+
+    results = list(render_report_cards(cards, str(tmp_path), workers=2))
+    paths = [r["path"] for r in results if r["ok"]]
+
+    assert sorted(os.path.basename(p) for p in paths) == sorted(c.filename for c in cards)
+    for path in paths:
+        with open(path, "rb") as f:
+            assert f.read(5) == b"%PDF-"
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".tmp")]
+
+
+def test_subset_font_is_created_once(tmp_path):
+    path = subset_font(cache_dir=str(tmp_path))
+    mtime = os.path.getmtime(path)
+    assert os.path.getsize(path) < os.path.getsize(report_cards.FONT_PATH)
+    assert subset_font(cache_dir=str(tmp_path)) == path
+    assert os.path.getmtime(path) == mtime
+
+
+def test_worker_falls_back_to_full_font(tmp_path):
+    report_cards._init_worker(subset_font(cache_dir=str(tmp_path)), report_cards.FONT_PATH, "Report card")
+    try:
+        latin = os.path.getsize(render_card_to_file(ReportCard("a", "Ama", "A1"), str(tmp_path)))
+        other = os.path.getsize(render_card_to_file(ReportCard("b", "Ama ☃", "A1"), str(tmp_path)))
+    finally:
+        report_cards._WORKER.clear()
+    assert other > latin  # the full font's subset tables are bigger
+
+
+def test_renders_reuse_one_fully_started_pool(tmp_path):
+    cards = build_report_cards(_scores(), "A1")
+
+    first = list(render_report_cards(cards, str(tmp_path / "a"), workers=2))
+    pool = report_cards.worker_pool(2, subset_font(), report_cards.FONT_PATH, "Report card")
+    second = list(render_report_cards(cards, str(tmp_path / "b"), workers=2))
+
+    assert len(first) == len(second) == 2
+    assert all(r["ok"] for r in first + second)
+    assert report_cards.worker_pool(2, subset_font(), report_cards.FONT_PATH, "Report card") is pool
+    assert len(set(pool.pids)) == 2  # every worker was started with the pool
+
+
+def test_a_failing_card_is_reported_and_the_rest_are_rendered(tmp_path):
+    cards = build_report_cards(_scores(), "A1")
+    bad = ReportCard("bad1", "Bad", "A1", [{"assignment": "A1 0.1", "score": "n/a", "comments": "", "date": "", "link": ""}])
+
+    results = {r["code"]: r for r in render_report_cards(cards[:1] + [bad] + cards[1:], str(tmp_path), workers=2)}
+
+    assert results["bad1"]["ok"] is False and "TypeError" in results["bad1"]["error"]
+    assert all(results[c.code]["ok"] and os.path.exists(results[c.code]["path"]) for c in cards)
+
+
+def test_a_worker_that_exits_is_replaced(tmp_path):
+    cards = build_report_cards(_scores(), "A1")
+    pool = report_cards.worker_pool(2, subset_font(), report_cards.FONT_PATH, "Report card")
+    dead = pool.processes[0]
+    dead.kill()
+    dead.wait()
+
+    first = list(render_report_cards(cards * 2, str(tmp_path), workers=2))
+    second = list(render_report_cards(cards, str(tmp_path), workers=2))
+
+    assert [r["error"] for r in first if not r["ok"]] == ["worker process exited"]
+    assert all(r["ok"] for r in second)
+    assert dead.pid not in pool.pids and len(pool.pids) == 2
@@ -0,0 +1,82 @@
+import os
+import sys
+
+# Ensure project root is on import path if needed
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+import pytest
+
+from fake_services import FakeFirestore
+from roster_sync import RosterSyncError, field_name, read_student, sync_roster
+
+STUDENTS = os.path.join(os.path.dirname(__file__), "..", "students.csv")
+
+
+def _raw(df: pd.DataFrame) -> bytes:
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def _students() -> pd.DataFrame:
+    return pd.read_csv(STUDENTS, dtype=str, keep_default_na=False)
+
+
+def test_field_names_are_snake_case():
+    assert field_name("Emergency Contact (Phone Number)") == "emergency_contact_phone_number"
+    assert field_name(" StudentCode ") == "studentcode"
+
+
+def test_second_sync_only_writes_what_changed(tmp_path):
+    db = FakeFirestore()
+    manifest = str(tmp_path / "manifest.json")
+    students = _students()
+
+    first = sync_roster(db, _raw(students), manifest, batch_size=10)
+    assert first["added"] == first["students"] == first["writes"]
+    assert first["batches"] == -(-first["writes"] // 10)
+    assert read_student(db, "SANDRAA2")["name"] == "Sandra Oppong"
+
+    students.loc[0, "Balance"] = "0"
+    removed = students.loc[1, "StudentCode"]
+    students = students.drop(index=1)
+    writes_before = db.writes
+    second = sync_roster(db, _raw(students), manifest)
+
+    assert (second["changed"], second["removed"], second["added"]) == (1, 1, 0)
+    assert second["writes"] == 2 and second["batches"] == 1
+    assert db.writes - writes_before == 2
+    assert read_student(db, "sandraa2")["balance"] == "0"
+    assert read_student(db, removed) is None
+
+    assert sync_roster(db, _raw(students), manifest)["writes"] == 0
+
+
+def test_lost_manifest_is_rebuilt_from_documents(tmp_path):
+    db = FakeFirestore()
+    sync_roster(db, _raw(_students()), str(tmp_path / "a.json"))
+    writes_before = db.writes
+
+    report = sync_roster(db, _raw(_students()), str(tmp_path / "missing.json"))
+
+    assert report["manifest_rebuilt"] and report["writes"] == 0
+    assert db.writes == writes_before
+    assert os.path.exists(tmp_path / "missing.json")
+
+
+def test_broken_sheets_and_mass_deletes_are_refused(tmp_path):
+    db = FakeFirestore()
+    manifest = str(tmp_path / "manifest.json")
+    students = _students()
+    sync_roster(db, _raw(students), manifest)
+    writes_before = db.writes
+
+    with pytest.raises(RosterSyncError, match="student code column"):
+        sync_roster(db, _raw(students.rename(columns={"StudentCode": "Code"})), manifest)
+    with pytest.raises(RosterSyncError, match="no students"):
+        sync_roster(db, _raw(students.assign(StudentCode="")), manifest)
+    with pytest.raises(RosterSyncError, match="--allow-deletes"):
+        sync_roster(db, _raw(students.head(10)), manifest)
+    assert db.writes == writes_before
+
+    report = sync_roster(db, _raw(students.head(10)), manifest, allow_deletes=True)
+    assert report["removed"] == len(students) - 10 and read_student(db, students.loc[20, "StudentCode"]) is None
@@ -0,0 +1,115 @@
+import os
+import sys
+import ast
+
+# Ensure project root is on import path if needed
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from typing import Any, Dict, List
+
+from fake_services import FakeFirestore
+from firebase_utils import save_row_to_firestore
+from save_index import SaveIndex, content_hash, idempotency_key
+
+ROW = {
+    "studentcode": "a100",
+    "name": "Ama",
+    "assignment": "A1 1.1 Lesen",
+    "score": 72,
+    "comments": "Gut gemacht",
+    "date": "2026-01-05",
+    "level": "A1",
+    "link": "",
+}
+
+
+def test_key_ignores_case_and_spacing_and_hash_ignores_date():
+    assert idempotency_key(ROW) == idempotency_key(dict(ROW, studentcode="A100 ", assignment="a1  1.1 lesen"))
+    assert idempotency_key(ROW) != idempotency_key(dict(ROW, assignment="A1 1.2"))
+    assert content_hash(ROW) == content_hash(dict(ROW, date="2026-02-01"))
+    assert content_hash(ROW) != content_hash(dict(ROW, score=73))
+
+
+def test_plan_inserts_then_skips_then_updates(tmp_path):
+    index = SaveIndex(str(tmp_path / "saved.sqlite"))
+
+    op, key, digest = index.plan(ROW, "sheet")
+    assert op == "insert"
+    index.record(key, "sheet", digest)
+
+    assert index.plan(dict(ROW, date="2026-01-06"), "sheet")[0] == "skip"
+    assert index.plan(ROW, "firestore")[0] == "insert"  # targets are tracked separately
+    assert index.plan(dict(ROW, score=80), "sheet")[:2] == ("update", key)
+
+    reopened = SaveIndex(str(tmp_path / "saved.sqlite"))
+    assert reopened.plan(ROW, "sheet")[0] == "skip"
+    assert reopened.stats()["sheet rows"] == 1
+
+
+def test_firestore_save_with_doc_id_overwrites_one_document():
+    db = FakeFirestore()
+    key = idempotency_key(ROW)
+
+    save_row_to_firestore(ROW, db=db, doc_id=key)
+    save_row_to_firestore(dict(ROW, score=90), db=db, doc_id=key)
+
+    docs = db.collection("scores").get()
+    assert [(d.id, d.to_dict()["score"]) for d in docs] == [(key, 90)]
+
+
+def _load_save_row(calls: List[tuple], fail: tuple = ()):
+    path = os.path.join(os.path.dirname(__file__), "..", "app.py")
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename="app.py")
+    func_node = next(node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == "save_row")
+    module = ast.Module(body=[func_node], type_ignores=[])
+
+    def fake_scores(row):
+        calls.append(("sheet", row["score"]))
+        if "sheet" in fail:
+            return {"ok": False, "status": 500}
+        return {"ok": True, "message": "Saved to Scores sheet"}
+
+    def fake_firestore(row, doc_id=None):
+        calls.append(("firestore", doc_id))
+        if "firestore" in fail:
+            return {"ok": False, "error": "unavailable"}
+        return {"ok": True, "message": "Saved to Firestore"}
+
+    namespace = {
+        "Dict": Dict, "Any": Any, "List": List,
+        "save_row_to_scores": fake_scores,
+        "save_row_to_firestore": fake_firestore,
+    }
+    exec(compile(module, "app.py", "exec"), namespace)
+    return namespace["save_row"]
+
+
+def test_save_row_with_index_skips_unchanged_and_appends_changed(tmp_path):
+    calls: List[tuple] = []
+    save_row = _load_save_row(calls)
+    index = SaveIndex(str(tmp_path / "saved.sqlite"))
+    key = idempotency_key(ROW)
+
+    first = save_row(ROW, to_firestore=True, index=index)
+    again = save_row(dict(ROW, date="2026-01-09"), to_firestore=True, index=index)
+    changed = save_row(dict(ROW, score=85), to_firestore=False, index=index)
+
+    assert first["message"] == "Saved to Scores sheet and Firestore"
+    assert again == {"ok": True, "skipped": ["Scores sheet", "Firestore"], "message": "Already saved; nothing changed"}
+    assert changed["ok"] and "skipped" not in changed
+    assert calls == [("sheet", 72), ("firestore", key), ("sheet", 85)]  # the sheet only appends
+    assert index.stats() == {"insert": 2, "update": 1, "skip": 2, "sheet rows": 1, "firestore rows": 1}
+
+
+def test_failed_writes_are_not_recorded(tmp_path):
+    calls: List[tuple] = []
+    index = SaveIndex(str(tmp_path / "saved.sqlite"))
+
+    assert not _load_save_row(calls, fail=("sheet",))(ROW, index=index)["ok"]
+    assert not _load_save_row(calls, fail=("firestore",))(ROW, to_sheet=False, to_firestore=True, index=index)["ok"]
+    assert index.plan(ROW, "sheet")[0] == "insert" and index.plan(ROW, "firestore")[0] == "insert"
+    assert index.stats() == {"insert": 0, "update": 0, "skip": 0}
+
+    assert _load_save_row(calls)(ROW, index=index)["ok"]
+    assert len(calls) == 3 and index.stats()["insert"] == 1
@@ -5,9 +5,12 @@ import ast
 # Ensure project root is on import path if needed
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import pytest
 import requests
 from typing import Any, Dict, List
 
+from webhook_utils import CircuitOpenError, WebhookClient
+
 
 def _load_save_row_to_scores():
     path = os.path.join(os.path.dirname(__file__), "..", "app.py")
@@ -19,6 +22,8 @@ def _load_save_row_to_scores():
         "requests": requests,
         "WEBHOOK_URL": "https://example.com",
         "WEBHOOK_TOKEN": "token",
+        "WEBHOOK_CLIENT": WebhookClient("https://example.com", sleep=lambda s: None),
+        "CircuitOpenError": CircuitOpenError,
     }
     exec(compile(module, "app.py", "exec"), namespace)
     return namespace["save_row_to_scores"]
@@ -125,3 +130,15 @@ def test_save_row_keeps_reference_link_at_sixty_or_higher():
 
     assert res["ok"]
     assert captured["sheet"]["link"] == "https://example.com"
+
+
+def test_save_row_to_scores_reports_open_circuit(monkeypatch):
+    save_row_to_scores = _load_save_row_to_scores()
+    client = save_row_to_scores.__globals__["WEBHOOK_CLIENT"]
+    client.breaker.opened_at = client.breaker._clock()
+
+    monkeypatch.setattr(requests, "post", lambda *a, **k: pytest.fail("webhook must not be called"))
+
+    result = save_row_to_scores({"foo": "bar"})
+    assert result["ok"] is False
+    assert result["why"] == "circuit_open"
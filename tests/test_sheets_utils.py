@@ -0,0 +1,49 @@
+import os
+import sys
+
+# Ensure project root is on the import path for local imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+
+from sheets_utils import column_letter, compact_dtypes, frame_memory_report, gviz_csv_url, select_query
+
+
+def test_column_letters():
+    assert [column_letter(i) for i in (0, 1, 25, 26, 27, 51, 52)] == ["A", "B", "Z", "AA", "AB", "AZ", "BA"]
+
+
+def test_select_query_projects_by_header_name():
+    header = ["Name", "Phone", "Level", "Balance", "StudentCode", "Emergency Contact (Phone Number)"]
+    assert select_query(header, ["student_code", "name", "level"]) == "select A, C, E limit 100000"
+    assert select_query(header, ["missing"]) == "select * limit 100000"
+    assert select_query([]) == "select * limit 100000"
+
+
+def test_gviz_url_quotes_tab_and_query():
+    url = gviz_csv_url("abc", "My Tab", "select A, C limit 5")
+    assert url.endswith("?tqx=out:csv&sheet=My%20Tab&tq=select%20A%2C%20C%20limit%205")
+
+
+def test_compact_dtypes_and_memory_report():
+    df = pd.DataFrame(
+        {
+            "name": ["Ama", "Kofi", "Esi"],
+            "level": ["A1", "A1 ", "B1"],
+            "status": ["Enrolled"] * 3,
+            "balance": ["1,500", "0", ""],
+        },
+        dtype=str,
+    )
+    compact_dtypes(df)
+
+    assert isinstance(df["level"].dtype, pd.CategoricalDtype)
+    assert list(df["level"].cat.categories) == ["A1", "B1"]
+    assert df["balance"].tolist()[:2] == [1500, 0]
+    assert pd.isna(df["balance"].iloc[2])
+    assert df["name"].dtype == object
+
+    report = frame_memory_report({"students": df})
+    assert report[0]["frame"] == "students"
+    assert report[0]["rows"] == 3 and report[0]["columns"] == 4
+    assert report[0]["memory kB"] > 0
@@ -0,0 +1,126 @@
+import os
+import sys
+
+# Ensure project root is on the import path for local imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+
+from sheets_utils import parse_sheet_csv
+from snapshot_utils import SnapshotStore
+
+
+class FakeSheet:
+    def __init__(self, body):
+        self.body = body
+        self.fetches = 0
+        self.parses = 0
+
+    def fetch(self):
+        self.fetches += 1
+        return self.body
+
+    def parse(self, raw):
+        self.parses += 1
+        return parse_sheet_csv(raw)
+
+
+def test_first_load_fetches_and_persists(tmp_path):
+    sheet = FakeSheet(b"Name,Level\nAma,A1\n")
+    store = SnapshotStore(str(tmp_path))
+
+    df = store.load("students", sheet.fetch, sheet.parse)
+
+    assert df["name"].tolist() == ["Ama"]
+    assert sheet.fetches == 1 and sheet.parses == 1
+    assert any(p.suffix == ".parquet" for p in tmp_path.iterdir())
+
+
+def test_restart_serves_snapshot_and_skips_parse_when_unchanged(tmp_path):
+    sheet = FakeSheet(b"Name,Level\nAma,A1\n")
+    SnapshotStore(str(tmp_path)).load("students", sheet.fetch, sheet.parse)
+
+    changes = []
+    restarted = SnapshotStore(str(tmp_path), on_change=changes.append)
+    sheet.body = b"Name,Level\nAma,A1\n"
+    df = restarted.load("students", sheet.fetch, sheet.parse)
+    restarted.wait()
+
+    assert df["name"].tolist() == ["Ama"]
+    assert isinstance(df["level"].dtype, pd.CategoricalDtype)
+    assert sheet.fetches == 2  # one background revalidation after restart
+    assert sheet.parses == 1  # same hash, nothing re-parsed
+    assert changes == []
+
+
+def test_background_revalidation_picks_up_changes(tmp_path):
+    sheet = FakeSheet(b"Name,Level\nAma,A1\n")
+    SnapshotStore(str(tmp_path)).load("students", sheet.fetch, sheet.parse)
+
+    changes = []
+    store = SnapshotStore(str(tmp_path), on_change=changes.append)
+    sheet.body = b"Name,Level\nAma,A1\nKofi,B1\n"
+    stale = store.load("students", sheet.fetch, sheet.parse)
+    store.wait()
+
+    assert stale["name"].tolist() == ["Ama"]
+    assert changes == ["students"]
+    assert store.load("students", sheet.fetch, sheet.parse)["name"].tolist() == ["Ama", "Kofi"]
+
+
+def test_failed_revalidation_keeps_old_snapshot(tmp_path):
+    sheet = FakeSheet(b"Name\nAma\n")
+    SnapshotStore(str(tmp_path)).load("students", sheet.fetch, sheet.parse)
+
+    def broken():
+        raise OSError("offline")
+
+    store = SnapshotStore(str(tmp_path))
+    df = store.load("students", broken, sheet.parse)
+    store.wait()
+
+    assert df["name"].tolist() == ["Ama"]
+    assert store.errors["students"] == "offline"
+
+
+def test_concurrent_cold_loads_share_one_download(tmp_path):
+    import threading
+    import time
+
+    sheet = FakeSheet(b"Name\nAma\n")
+
+    def slow_fetch():
+        time.sleep(0.05)
+        return sheet.fetch()
+
+    store = SnapshotStore(str(tmp_path))
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(store.load("students", slow_fetch, sheet.parse)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(results) == 8
+    assert sheet.fetches == 1
+
+
+def test_invalidated_key_is_downloaded_again_and_cached_copy_only_seeds_cold_loads(tmp_path):
+    sheet = FakeSheet(b"Name\nAma\n")
+    shared = {"raw": b"Name\nAma\nKofi\n"}  # what another replica downloaded
+    store = SnapshotStore(str(tmp_path), max_age=300)
+
+    cold = store.load("scores", sheet.fetch, sheet.parse, cached=lambda: shared["raw"])
+    assert cold["name"].tolist() == ["Ama", "Kofi"] and sheet.fetches == 0
+
+    # Saving a row: the next load re-downloads even though the snapshot is fresh.
+    sheet.body = b"Name\nAma\nKofi\nEsi\n"
+    assert store.load("scores", sheet.fetch, sheet.parse, cached=lambda: shared["raw"])["name"].tolist() == ["Ama", "Kofi"]
+    store.invalidate("scores")
+    fresh = store.load("scores", sheet.fetch, sheet.parse, cached=lambda: shared["raw"])
+    assert fresh["name"].tolist() == ["Ama", "Kofi", "Esi"] and sheet.fetches == 1
+    assert store.load("scores", sheet.fetch, sheet.parse)["name"].tolist() == ["Ama", "Kofi", "Esi"]
+    assert sheet.fetches == 1
@@ -0,0 +1,45 @@
+import os
+import sys
+import ast
+
+# Ensure project root is on import path if needed
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+from typing import Any, Dict
+
+
+def _load_picker_helpers():
+    path = os.path.join(os.path.dirname(__file__), "..", "app.py")
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename="app.py")
+    wanted = {"build_student_labels", "picker_page"}
+    nodes = [node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name in wanted]
+    module = ast.Module(body=nodes, type_ignores=[])
+    namespace = {"pd": pd, "Dict": Dict, "Any": Any, "PICKER_PAGE_SIZE": 2}
+    exec(compile(module, "app.py", "exec"), namespace)
+    return namespace["build_student_labels"], namespace["picker_page"]
+
+
+def test_labels_keep_row_ids_and_blank_missing_values():
+    build_student_labels, _ = _load_picker_helpers()
+    df = pd.DataFrame(
+        {"studentcode": ["a1", "b2"], "name": ["Ama", None], "level": ["A1", "B1"]},
+        index=[10, 42],
+    )
+
+    labels = build_student_labels(df, "studentcode", "name", "level")
+
+    assert list(labels.index) == [10, 42]
+    assert labels[10] == "a1 — Ama (A1)"
+    assert labels[42] == "b2 —  (B1)"
+
+
+def test_picker_page_returns_one_page_keyed_by_row_id():
+    build_student_labels, picker_page = _load_picker_helpers()
+    df = pd.DataFrame({"studentcode": list("abcde"), "name": list("vwxyz"), "level": ["A1"] * 5})
+    labels = build_student_labels(df, "studentcode", "name", "level")
+
+    assert picker_page(labels, 1) == {0: "a — v (A1)", 1: "b — w (A1)"}
+    assert list(picker_page(labels, 3)) == [4]
+    assert list(picker_page(labels, 0)) == [0, 1]
@@ -0,0 +1,105 @@
+import os
+import sys
+
+# Ensure project root is on import path if needed
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from types import SimpleNamespace
+
+from submission_search import SubmissionIndex, fold_umlauts, fts_query
+
+
+def _meta(level: str, code: str, assignment: str = "A1 0.1", ts_ms: int = 1):
+    return {"level": level, "student_code": code, "student_name": code.title(), "assignment": assignment, "ts_ms": ts_ms}
+
+
+def _index(tmp_path) -> SubmissionIndex:
+    index = SubmissionIndex(str(tmp_path / "search.sqlite"))
+    index.upsert_many(
+        [
+            ("submissions/A1/posts/p1", "Viele Grüße aus Accra. Ich heiße Ama.", _meta("A1", "ama1")),
+            ("submissions/A1/posts/p2", "Ich wohne in Kumasi und lerne Deutsch.", _meta("A1", "kofi1")),
+            ("submissions/B1/posts/p3", "Liebe Gruesse, ich schreibe über meine Reise nach Accra.", _meta("B1", "esi2", "B1 2.3")),
+        ]
+    )
+    return index
+
+
+def test_queries_are_folded_like_the_objective_marker():
+    assert fold_umlauts("Straße ÜBER Bären") == "strasse ueber baeren"
+    assert fts_query('Grüße "ich heiße" lern*') == '"gruesse" "ich heisse" "lern"*'
+    assert fts_query('AND OR "') == '"and" "or"'
+
+
+def test_search_ranks_hits_across_levels_and_filters(tmp_path):
+    index = _index(tmp_path)
+
+    hits = index.search("grüße accra")
+    assert {h["student_code"] for h in hits} == {"ama1", "esi2"}
+    assert "[gruesse]" in hits[0]["snippet"] and hits[0]["rank"] <= hits[-1]["rank"]
+
+    assert [h["student_code"] for h in index.search("grüße", level="B1")] == ["esi2"]
+    assert [h["path"] for h in index.search('"ich heisse"')] == ["submissions/A1/posts/p1"]
+    assert [h["student_code"] for h in index.search("deut*", assignment="0.1")] == ["kofi1"]
+    assert index.search("   ") == []
+
+
+def test_unchanged_posts_are_skipped_and_edits_replace_the_text(tmp_path):
+    index = _index(tmp_path)
+    path = "submissions/A1/posts/p2"
+
+    assert index.upsert(path, "Ich wohne in Kumasi und lerne Deutsch.", _meta("A1", "kofi1")) is False
+    assert index.upsert(path, "Ich wohne jetzt in Tamale.", _meta("A1", "kofi1", ts_ms=2)) is True
+
+    assert index.search("kumasi") == []
+    assert index.search("tamale")[0]["ts_ms"] == 2
+    assert index.remove_many([path, "submissions/A1/posts/missing"]) == 1
+    assert len(index) == 2 and index.search("tamale") == []
+
+
+def test_listener_applies_added_modified_and_removed_changes(tmp_path):
+    index = SubmissionIndex(str(tmp_path / "search.sqlite"))
+
+    def prepare(level, post_id, data):
+        if data.get("broken"):
+            raise ValueError("unreadable post")
+        return data["content"], _meta(level, data["student_code"])
+
+    def change(kind, post_id, data=None):
+        doc = SimpleNamespace(id=post_id, to_dict=lambda: data)
+        return SimpleNamespace(type=SimpleNamespace(name=kind), document=doc)
+
+    listener = index._listener("A2", prepare)
+    assert not index.ready("A2")  # real listeners deliver the first snapshot later
+    listener(None, [
+        change("ADDED", "p1", {"content": "Mein Urlaub in Berlin", "student_code": "yaw1"}),
+        change("ADDED", "p2", {"broken": True}),
+    ], None)
+    listener(None, [
+        change("MODIFIED", "p1", {"content": "Mein Urlaub in München", "student_code": "yaw1"}),
+        change("ADDED", "p3", {"content": "München ist schön", "student_code": "abena1"}),
+    ], None)
+    listener(None, [change("REMOVED", "p3")], None)
+
+    assert index.ready("A2") and not index.ready("B1")
+    assert [h["path"] for h in index.search("muenchen")] == ["submissions/A2/posts/p1"]
+    stats = index.stats()
+    assert (stats["posts"], stats["errors"], stats["last_error"]) == (1, 1, "unreadable post")
+
+
+def test_posts_deleted_while_not_watching_are_dropped_on_the_first_snapshot(tmp_path):
+    from fake_services import FakeFirestore
+
+    index = _index(tmp_path)
+    db = FakeFirestore()
+    db.collection("submissions").document("A1").collection("posts").document("p1").set(
+        {"content": "Viele Grüße aus Accra.", "student_code": "ama1"}
+    )
+
+    index.watch(db, ["A1"], lambda level, post_id, data: (data["content"], _meta(level, data["student_code"])))
+
+    assert index.paths(prefix="submissions/A1/posts/") == ["submissions/A1/posts/p1"]
+    assert index.paths(level="B1") == ["submissions/B1/posts/p3"]  # other levels are left alone
+    db.collection("submissions").document("A1").collection("posts").document("p1").delete()
+    assert len(index) == 1
+    index.stop()
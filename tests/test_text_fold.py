@@ -0,0 +1,23 @@
+import os
+import sys
+
+# Ensure project root is on import path if needed
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from assignment_index import fold
+from essay_similarity import fold_text
+from submission_search import fts_query
+from text_fold import canonical_answer, fold_umlauts
+
+
+def test_canonical_answers():
+    assert canonical_answer(" b ") == "B"
+    assert canonical_answer("Ja") == canonical_answer("yes") == "true"
+    assert canonical_answer("Nein!") == "nein"  # punctuation is only dropped after the yes/no check
+    assert canonical_answer("Grüße.") == canonical_answer("gruesse") == "gruesse"
+    assert canonical_answer("") == ""
+
+
+def test_every_comparison_folds_umlauts_the_same_way():
+    assert fold_umlauts("Straße ÜBER Bären") == "strasse ueber baeren"
+    assert fold_text("Grüße!").strip() == fold("Grüße!") == fts_query("Grüße").strip('"') == "gruesse"
@@ -0,0 +1,200 @@
+import os
+import sys
+
+# Ensure project root is on the import path for local imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import threading
+import time
+
+import pytest
+import requests
+
+from webhook_utils import CircuitBreaker, CircuitOpenError, TokenBucket, WebhookBusyError, WebhookClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = str(status_code)
+
+
+class FakeWebhook:
+    """Answers with the scripted status codes (or raises exceptions) in order."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+
+    def __call__(self, url, json=None, timeout=None):
+        self.calls += 1
+        item = self.script.pop(0) if self.script else 200
+        if isinstance(item, Exception):
+            raise item
+        return item if isinstance(item, FakeResponse) else FakeResponse(item)
+
+
+def _client(webhook, clock, **kwargs):
+    return WebhookClient(
+        "https://example.com", post=webhook, clock=clock, sleep=clock.sleep, rng=lambda: 1.0, **kwargs
+    )
+
+
+def test_retries_5xx_of_idempotent_requests_with_backoff_then_succeeds():
+    clock = FakeClock()
+    webhook = FakeWebhook(503, 502, 200)
+    client = _client(webhook, clock, backoff=0.5)
+
+    assert client.post({"row": 1}, idempotent=True).status_code == 200
+    assert webhook.calls == 3
+    assert client.counters["retries"] == 2
+    assert clock.now == pytest.approx(0.5 + 1.0)
+
+
+def test_429_honours_retry_after_and_slows_the_bucket():
+    clock = FakeClock()
+    webhook = FakeWebhook(FakeResponse(429, {"Retry-After": "3"}), 200)
+    client = _client(webhook, clock, rate_per_min=60)
+
+    assert client.post({}).status_code == 200
+    assert clock.now == pytest.approx(3)
+    assert client.counters["throttled"] == 1
+    assert client.stats()["rate_per_min"] < 60
+
+
+def test_5xx_and_read_timeouts_are_not_retried_unless_idempotent():
+    clock = FakeClock()
+    webhook = FakeWebhook(503)
+    assert _client(webhook, clock).post({}).status_code == 503
+    assert webhook.calls == 1
+
+    webhook = FakeWebhook(requests.ReadTimeout("slow"))
+    with pytest.raises(requests.ReadTimeout):
+        _client(webhook, clock).post({})
+    assert webhook.calls == 1
+
+    webhook = FakeWebhook(requests.ConnectTimeout("no route"), 200)
+    assert _client(webhook, clock).post({}).status_code == 200
+    assert webhook.calls == 2
+
+
+def test_retries_stop_at_the_total_time_cap():
+    clock = FakeClock()
+    webhook = FakeWebhook(*[FakeResponse(429, {"Retry-After": "8"})] * 5)
+    client = _client(webhook, clock, retries=4, max_total=20)
+
+    assert client.post({}).status_code == 429
+    assert webhook.calls == 3 and clock.now == pytest.approx(16)
+
+
+def test_client_errors_are_not_retried():
+    clock = FakeClock()
+    webhook = FakeWebhook(400)
+    assert _client(webhook, clock).post({}).status_code == 400
+    assert webhook.calls == 1
+
+
+def test_network_error_is_raised_after_retries():
+    clock = FakeClock()
+    webhook = FakeWebhook(*[requests.ConnectionError("down")] * 3)
+    with pytest.raises(requests.ConnectionError):
+        _client(webhook, clock, retries=2).post({})
+    assert webhook.calls == 3
+
+
+def test_breaker_fails_fast_then_lets_a_trial_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    webhook = FakeWebhook(*[500] * 4)
+    client = _client(webhook, clock, retries=1, breaker=breaker)
+
+    assert client.post({}, idempotent=True).status_code == 500
+    assert client.post({}, idempotent=True).status_code == 500
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        client.post({})
+    assert webhook.calls == 4
+
+    clock.now += 30
+    assert breaker.state == "half-open"
+    assert client.post({}).status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_token_bucket_spaces_requests_after_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate_per_min=60, burst=2, clock=clock, sleep=clock.sleep)
+    waits = [bucket.acquire() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(1.0)
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_unexpected_error_ends_the_half_open_trial():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    webhook = FakeWebhook(500, ValueError("bad payload"), 200)
+    client = _client(webhook, clock, breaker=breaker)
+
+    client.post({})
+    clock.now += 30
+    with pytest.raises(ValueError):
+        client.post({})
+    assert breaker.state == "open"
+    clock.now += 30
+    assert client.post({}).status_code == 200 and breaker.state == "closed"
+
+
+def test_contended_saves_give_up_before_sending_once_the_wait_budget_is_spent():
+    timeouts = []
+
+    def webhook(url, json=None, timeout=None):
+        timeouts.append(timeout)
+        return FakeResponse(200)
+
+    client = WebhookClient("https://example.com", rate_per_min=600, burst=1, max_total=0.5, post=webhook)
+    outcomes, blocked = [], []
+
+    def save():
+        start = time.monotonic()
+        try:
+            outcomes.append(client.post({}, timeout=15).status_code)
+        except WebhookBusyError:
+            outcomes.append("busy")
+        blocked.append(time.monotonic() - start)
+
+    threads = [threading.Thread(target=save) for _ in range(25)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+
+    assert max(blocked) < 0.5 + 0.25
+    assert 1 <= outcomes.count(200) <= 8 and outcomes.count("busy") == 25 - outcomes.count(200)
+    assert set(timeouts) == {15} and len(timeouts) == outcomes.count(200)
+    assert client.counters["busy"] == outcomes.count("busy")
+
+
+def test_a_busy_half_open_trial_is_given_back():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    client = _client(FakeWebhook(500, 200), clock, breaker=breaker, burst=1, rate_per_min=1, max_total=1)
+
+    client.post({})
+    clock.now += 30
+    with pytest.raises(WebhookBusyError):
+        client.post({})  # no token for another 30 s
+    assert breaker.state == "half-open" and breaker.allow()
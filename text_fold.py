@@ -0,0 +1,51 @@
+"""How German text is folded before it is compared, indexed or matched.
+
+Students type umlauts in every way (``ä``, ``ae``, ``a``) and answer keys
+are edited by hand, so everything that compares text folds it first.
+:func:`fold_umlauts` is the common step: lower case, and ``ä`` -> ``ae``,
+``ö`` -> ``oe``, ``ü`` -> ``ue``, ``ß`` -> ``ss``.  The search index, the
+essay and near-duplicate comparisons and the assignment matcher all build
+on it, so "Grüße" and "gruesse" are the same word everywhere.
+
+:func:`canonical_answer` is one objective answer as the marker compares
+it.  Answer-key hashes (:mod:`regrade`) use it too, so a key edit that
+the marker cannot see does not make any mark stale.
+"""
+
+from __future__ import annotations
+
+import re
+
+TRUE_ANSWERS = frozenset({"t", "true", "ja", "j", "y", "yes"})
+FALSE_ANSWERS = frozenset({"f", "false", "nein", "n", "no"})
+
+
+def fold_umlauts(text: str) -> str:
+    """Lower-case and spell out umlauts and ß."""
+    return (
+        (text or "").lower()
+        .replace("ä", "ae")
+        .replace("ö", "oe")
+        .replace("ü", "ue")
+        .replace("ß", "ss")
+    )
+
+
+def canonical_answer(s: str) -> str:
+    """One objective answer as the marker compares it.
+
+    A single letter A-D is an option and keeps its (upper) case; yes/no
+    words in English or German become ``"true"``/``"false"``; anything
+    else is folded and stripped of non-word characters.
+    """
+    s = (s or "").strip()
+    if not s:
+        return ""
+    if re.fullmatch(r"[a-dA-D]", s):
+        return s.upper()
+    s = fold_umlauts(s)
+    if s in TRUE_ANSWERS:
+        return "true"
+    if s in FALSE_ANSWERS:
+        return "false"
+    return re.sub(r"[^\w]+", "", s)
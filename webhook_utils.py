@@ -0,0 +1,313 @@
+"""Client-side flow control for the Apps Script webhook.
+
+Apps Script limits how many executions a script may run per minute and
+at once.  :class:`WebhookClient` keeps the dashboard inside those limits
+instead of letting saves fail in bursts:
+
+* a :class:`TokenBucket` spaces requests out, and halves its rate whenever
+  the script answers 429 before slowly growing it back;
+* an :class:`AdaptiveConcurrency` limit caps requests in flight using the
+  same additive-increase / multiplicative-decrease rule;
+* 429 and connection failures - where the script never ran - are retried
+  with jittered exponential backoff (honouring ``Retry-After``); 5xx and
+  read timeouts, after which the row may already be saved, only for
+  requests marked idempotent.  Waiting for a token, a free slot or the
+  next retry is bounded by ``max_total`` seconds so a save never blocks
+  the page for long; once it runs out nothing more is sent (before the
+  first attempt, :class:`WebhookBusyError` says so);
+* a :class:`CircuitBreaker` fails fast while the script keeps failing and
+  lets a single trial request through once the cool-down has passed.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Failures after which the request may have reached the script
+UNSAFE_RETRY_STATUSES = RETRY_STATUSES - {429}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the webhook while the breaker is open."""
+
+
+class WebhookBusyError(RuntimeError):
+    """Raised, before anything is sent, when no token or slot frees up within the wait budget."""
+
+
+class TokenBucket:
+    """Token bucket whose refill rate adapts to throttling responses."""
+
+    def __init__(
+        self,
+        rate_per_min: float,
+        burst: int,
+        min_rate_per_min: float = 6,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.max_rate = rate_per_min / 60.0
+        self.min_rate = min_rate_per_min / 60.0
+        self.rate = self.max_rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """Take one token, sleeping until one is available; returns the wait.
+
+        Raises :class:`WebhookBusyError` instead of waiting past ``timeout``.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            if timeout is not None and waited + delay > timeout:
+                raise WebhookBusyError("Scores webhook is busy (rate limit); not sent")
+            self._sleep(delay)
+            waited += delay
+
+    def throttled(self) -> None:
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on the number of requests in flight."""
+
+    def __init__(self, initial: int, maximum: int) -> None:
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> None:
+        """Take a slot; raises :class:`WebhookBusyError` if none frees up within ``timeout``."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise WebhookBusyError("Scores webhook is busy (too many saves at once); not sent")
+                self._cond.wait(remaining)
+            self.in_flight += 1
+
+    def release(self, ok: bool) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if ok:
+                self.limit = min(self.maximum, self.limit + 1 / max(self.limit, 1))
+            else:
+                self.limit = max(1.0, self.limit / 2)
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures for ``reset_timeout`` seconds."""
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def cancel(self) -> None:
+        """Give back a trial that :meth:`allow` granted but that was never sent."""
+        with self._lock:
+            self._trial_running = False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._trial_running = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = self._clock()
+
+
+class WebhookClient:
+    """POST JSON to the webhook under rate, concurrency and breaker control."""
+
+    def __init__(
+        self,
+        url: str,
+        rate_per_min: float = 90,
+        burst: int = 10,
+        max_concurrency: int = 8,
+        retries: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 8,
+        max_total: float = 30,
+        breaker: Optional[CircuitBreaker] = None,
+        post: Optional[Callable[..., Any]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        rng: Callable[[], float] = random.random,
+    ) -> None:
+        self.url = url
+        self.bucket = TokenBucket(rate_per_min, burst, clock=clock, sleep=sleep)
+        self.concurrency = AdaptiveConcurrency(min(2, max_concurrency), max_concurrency)
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_total = max_total
+        self._post = post
+        self._clock = clock
+        self._sleep = sleep
+        self._rng = rng
+        self.counters = {"requests": 0, "retries": 0, "throttled": 0, "failed": 0, "rejected": 0, "busy": 0}
+
+    def _send(self, payload: Dict[str, Any], timeout: float) -> Any:
+        post = self._post or requests.post
+        return post(self.url, json=payload, timeout=timeout)
+
+    def _delay(self, attempt: int, response: Any = None) -> float:
+        retry_after = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass
+        # "Full jitter": uniform between zero and the exponential ceiling
+        return self._rng() * min(self.max_backoff, self.backoff * 2 ** attempt)
+
+    def _retryable(self, response: Any, error: Optional[Exception], idempotent: bool) -> bool:
+        if error is not None:
+            # A refused or timed-out connection never reached the script.
+            return idempotent or isinstance(error, requests.ConnectionError)
+        if response.status_code == 429:
+            return True
+        return idempotent and response.status_code in UNSAFE_RETRY_STATUSES
+
+    def post(self, payload: Dict[str, Any], timeout: float = 15, idempotent: bool = False) -> Any:
+        """Send ``payload`` and return the final response.
+
+        Only 429 responses and connection errors are retried, unless the
+        caller marks the request ``idempotent`` (the script would not save
+        it twice), which also retries 5xx responses and read timeouts.
+        Waiting for the rate limit, for a free slot and between retries
+        stops once ``max_total`` seconds have passed; an attempt that is
+        sent always gets the full ``timeout``.
+
+        Raises :class:`CircuitOpenError` without calling the webhook while
+        the breaker is open, :class:`WebhookBusyError` when the first
+        attempt cannot start within ``max_total``, and re-raises the last
+        network error once the retries are exhausted.  A final 429/5xx
+        response is returned as is.
+        """
+        if not self.breaker.allow():
+            self.counters["rejected"] += 1
+            raise CircuitOpenError("Scores webhook is failing; not sending for now")
+
+        deadline = self._clock() + self.max_total
+        for attempt in range(self.retries + 1):
+            try:
+                self._acquire(deadline)
+            except WebhookBusyError:
+                if attempt:
+                    break  # report the previous attempt's outcome
+                self.counters["busy"] += 1
+                self.breaker.cancel()
+                raise
+            self.counters["requests"] += 1
+            response, error = None, None
+            try:
+                response = self._send(payload, timeout)
+            except requests.RequestException as e:
+                error = e
+            except Exception:
+                self.concurrency.release(ok=False)
+                self.breaker.record(ok=False)  # also ends a half-open trial
+                raise
+            failed = error is not None or response.status_code in RETRY_STATUSES
+            self.concurrency.release(ok=not failed)
+
+            if response is not None and response.status_code == 429:
+                self.counters["throttled"] += 1
+                self.bucket.throttled()
+            elif not failed:
+                self.bucket.succeeded()
+
+            if not failed:
+                self.breaker.record(ok=True)
+                return response
+            if attempt == self.retries or not self._retryable(response, error, idempotent):
+                break
+            delay = self._delay(attempt, response)
+            if self._clock() + delay >= deadline:
+                break
+            self.counters["retries"] += 1
+            self._sleep(delay)
+
+        self.counters["failed"] += 1
+        self.breaker.record(ok=False)
+        if error is not None:
+            raise error
+        return response
+
+    def _acquire(self, deadline: float) -> None:
+        """A rate-limit token and a concurrency slot, both before ``deadline``."""
+        self.bucket.acquire(timeout=max(0.0, deadline - self._clock()))
+        self.concurrency.acquire(timeout=max(0.0, deadline - self._clock()))
+
+    def stats(self) -> Dict[str, Any]:
+        """Current limits and counters for the diagnostics panel."""
+        return dict(
+            self.counters,
+            rate_per_min=round(self.bucket.rate * 60, 1),
+            concurrency_limit=int(self.concurrency.limit),
+            in_flight=self.concurrency.in_flight,
+            breaker=self.breaker.state,
+        )